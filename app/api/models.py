@@ -67,6 +67,13 @@ class ChatCompletionRequest(BaseModel):
     frequency_penalty: Optional[float] = 0.0
     user: Optional[str] = None
     stream: Optional[bool] = False
+    # {"include_usage": true}이면 스트림 마지막에 토큰 사용량 청크를 전송
+    stream_options: Optional[Dict[str, Any]] = None
+    # 이미지 전처리 픽셀 범위 (서버 설정 범위 안에서만 적용)
+    min_pixels: Optional[int] = None
+    max_pixels: Optional[int] = None
+    # 추측 디코딩 방식 (draft: 초안 모델, prompt_lookup: 프롬프트 n-gram 조회, off: 사용 안 함, 없으면 서버 기본값)
+    speculative: Optional[Literal["draft", "prompt_lookup", "off"]] = None
 
 class ChatCompletionResponseChoice(BaseModel):
     """
@@ -91,7 +98,7 @@ class ChatCompletionResponse(BaseModel):
     created: int
     model: str
     choices: List[ChatCompletionResponseChoice]
-    usage: Dict[str, int]
+    usage: Dict[str, Any]
 
 class ModelList(BaseModel):
     """
@@ -7,42 +7,47 @@ import time
 import uuid
 import json
 import logging
+import asyncio
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Union
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
-import uvicorn
-
-# 모델 및 유틸리티 임포트
-# MLX-VLM 임포트 - simple_openai_api_server.py 방식으로 변경
-try:
-    from mlx_vlm import load as load_vlm
-    from mlx_vlm import generate
-    from mlx_vlm.prompt_utils import apply_chat_template
-    try:
-        from mlx_vlm.utils import load_config
-    except ImportError:
-        load_config = None
-    
-    HAS_GENERATE = True
-    logger = logging.getLogger(__name__)
-    logger.info("mlx_vlm 패키지가 generate 기능과 함께 로드되었습니다.")
-except ImportError:
-    from mlx_vlm import load as load_vlm
-    HAS_GENERATE = False
-    load_config = None
-    logger = logging.getLogger(__name__)
-    logger.warning("mlx_vlm 패키지가 generate 기능 없이 로드되었습니다.")
-
-from app.api.models import (
-    ChatMessage, 
-    ChatCompletionRequest, 
-    ChatCompletionResponse,
-    ChatCompletionResponseChoice,
-    ModelList
-)
-from app.utils.image_utils import process_image_from_data_url, create_empty_image
+from importlib import metadata
+
+from app.engine.startup import STARTUP_PROFILE
+
+# 웹 프레임워크와 내부 모듈 임포트 시간을 기록 (mlx_vlm과 uvicorn은 실제로 필요할 때 임포트)
+with STARTUP_PROFILE.phase("fastapi", kind="import"):
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+
+with STARTUP_PROFILE.phase("app.api.models", kind="import"):
+    from app.api.models import (
+        ChatMessage, 
+        ChatCompletionRequest, 
+        ChatCompletionResponse,
+        ChatCompletionResponseChoice,
+        ModelList
+    )
+
+with STARTUP_PROFILE.phase("app.utils", kind="import"):
+    from app.utils.image_utils import (
+        load_images, MIN_PIXELS, MAX_PIXELS
+    )
+    from app.utils.image_fetch import ImageFetcher
+    from app.utils.lru_cache import ByteLRUCache
+    from app.utils.metrics import MetricsRegistry, THROUGHPUT_BUCKETS
+
+from app.engine.executor import InferenceExecutor, ExecutorBusyError
+from app.engine.scheduler import BatchScheduler, merge_usage
+from app.engine.backend import GenerationRequest, DEFAULT_MAX_TOKENS
+from app.engine.mlx_backend import MLXBackend, release_memory
+from app.engine.admission import AdmissionController, AdmissionRejected
+from app.engine.prefix_cache import PrefixCache
+from app.engine.session import ModelSession
+from app.engine.registry import ModelRegistry, ModelUnavailable
+from app.engine.model_index import ModelIndex
+from app.engine.shard_loader import ShardedSafetensors
 
 # 로깅 설정
 logging.basicConfig(
@@ -55,11 +60,189 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # 전역 변수
-MODEL = None
-PROCESSOR = None
+# 기본 모델 ID (요청의 model이 알 수 없는 값일 때 사용)
 MODEL_ID = None
 MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(os.getcwd(), "models"))
 
+# 모델마다 모델을 소유하고 추론을 실행하는 전용 워커를 두며, 워커별 작업 대기열 크기
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", "32"))
+# 동시에 메모리에 올려 둘 모델 가중치 합계 한도 (초과 시 사용 중이 아닌 모델을 LRU 순서로 내림)
+MODEL_MEMORY_BUDGET = int(os.environ.get("MODEL_MEMORY_BUDGET", str(32 * 1024 ** 3)))
+# 로드 중인 모델을 요청한 경우 대기할 최대 시간(초)과 모델별 최대 대기 요청 수 (초과 시 503)
+MODEL_LOAD_MAX_WAIT = float(os.environ.get("MODEL_LOAD_MAX_WAIT", "300"))
+MODEL_LOAD_MAX_PARKED = int(os.environ.get("MODEL_LOAD_MAX_PARKED", "64"))
+MODEL_LOAD_RETRY_AFTER = int(os.environ.get("MODEL_LOAD_RETRY_AFTER", "10"))
+# 모델 로드 전에 가중치 샤드를 동시에 읽어 들일 스레드 수 (0이면 사용 안 함)
+WEIGHT_LOAD_WORKERS = int(os.environ.get("WEIGHT_LOAD_WORKERS", "4"))
+# 추측 디코딩: "대상 모델 ID=초안 모델 ID" 쌍을 쉼표로 구분 (예: qwen2.5-vl-32B-mlx=qwen2.5-vl-3B-mlx)
+# 초안 모델은 대상 모델과 같은 워커에 함께 올라가며 메모리 예산에도 함께 계산됨
+SPECULATIVE_DRAFT_MODELS = dict(
+    pair.split("=", 1) for pair in os.environ.get("SPECULATIVE_DRAFT_MODELS", "").replace(" ", "").split(",") if "=" in pair
+)
+# 초안 길이 초기값과 최대값, 채택률에 따라 초안 길이를 조절할지 여부 (0이면 고정)
+SPECULATIVE_DRAFT_TOKENS = int(os.environ.get("SPECULATIVE_DRAFT_TOKENS", "4"))
+SPECULATIVE_MAX_DRAFT_TOKENS = int(os.environ.get("SPECULATIVE_MAX_DRAFT_TOKENS", "8"))
+SPECULATIVE_ADAPTIVE = os.environ.get("SPECULATIVE_ADAPTIVE", "1") != "0"
+# 요청이 speculative를 지정하지 않았을 때의 방식 (draft, prompt_lookup, off / 없으면 초안 모델이 있는 모델만 draft)
+SPECULATIVE_DEFAULT = os.environ.get("SPECULATIVE_DEFAULT") or None
+# 프롬프트 n-gram 조회: 조회할 최대 n-gram 길이, 한 번에 제안할 최대 토큰 수, 제안을 잠시 멈추는 채택률
+PROMPT_LOOKUP_MAX_NGRAM = int(os.environ.get("PROMPT_LOOKUP_MAX_NGRAM", "3"))
+PROMPT_LOOKUP_NUM_TOKENS = int(os.environ.get("PROMPT_LOOKUP_NUM_TOKENS", "10"))
+PROMPT_LOOKUP_MIN_ACCEPTANCE = float(os.environ.get("PROMPT_LOOKUP_MIN_ACCEPTANCE", "0.3"))
+# 생성 중 클라이언트 연결 종료를 확인하는 간격 (초, 연결이 끊기면 생성을 취소)
+DISCONNECT_CHECK_INTERVAL = float(os.environ.get("DISCONNECT_CHECK_INTERVAL", "0.5"))
+# 동시에 디코딩할 최대 시퀀스 수
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "8"))
+# 대기열 깊이, 처리 중 토큰 수, 이미지 픽셀 수 한도 (초과 시 429/503으로 조기 거절)
+ADMISSION = AdmissionController.from_env(os.environ)
+# 멀티턴 대화의 KV 상태를 재사용하기 위한 접두사 캐시 메모리 예산 (모델별, 바이트)
+PREFIX_CACHE_MAX_BYTES = int(os.environ.get("PREFIX_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+# 같은 이미지에 대한 반복 질문을 위한 디코딩 이미지 캐시 (모든 모델 공유)와 비전 인코더 출력 캐시 예산 (모델별)
+IMAGE_CACHE = ByteLRUCache(int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 ** 2))), name="image")
+VISION_CACHE_MAX_BYTES = int(os.environ.get("VISION_CACHE_MAX_BYTES", str(1024 ** 3)))
+# http(s) 이미지 URL 비동기 다운로드 (공유 연결 풀, 호스트별 동시 요청 제한, 조건부 요청 디스크 캐시)
+IMAGE_FETCHER = ImageFetcher.from_env(os.environ)
+# 이미지 전처리 픽셀 범위 (요청의 min_pixels/max_pixels는 이 범위 안으로 제한됨)
+IMAGE_MIN_PIXELS = int(os.environ.get("IMAGE_MIN_PIXELS", str(MIN_PIXELS)))
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", str(MAX_PIXELS)))
+# 요청 하나의 여러 이미지를 병렬로 디코딩하는 스레드 풀 (PIL 디코더는 GIL을 해제함)
+IMAGE_DECODE_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("IMAGE_DECODE_WORKERS", "4")),
+    thread_name_prefix="image-decode"
+)
+
+# 지표 (/metrics, Prometheus 텍스트 형식)
+METRICS = MetricsRegistry(prefix="qwen_vl_")
+REQUESTS_TOTAL = METRICS.counter("http_requests_total", "HTTP 요청 수 (라우트 경로 템플릿, 상태 코드별)", ("path", "status"))
+SEQUENCES_TOTAL = METRICS.counter("sequences_total", "완료된 생성 시퀀스 수 (종료 이유별)", ("finish_reason",))
+TOKENS_TOTAL = METRICS.counter("tokens_total", "처리한 토큰 수 (prompt, cached, image, completion)", ("kind",))
+TIME_TO_FIRST_TOKEN = METRICS.histogram("time_to_first_token_seconds", "요청 제출부터 첫 토큰까지 시간")
+TIME_PER_OUTPUT_TOKEN = METRICS.histogram(
+    "time_per_output_token_seconds", "첫 토큰 이후 출력 토큰당 시간",
+    buckets=(0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0)
+)
+PREFILL_THROUGHPUT = METRICS.histogram("prefill_tokens_per_second", "요청별 프리필 처리량", buckets=THROUGHPUT_BUCKETS)
+DECODE_THROUGHPUT = METRICS.histogram("decode_tokens_per_second", "요청별 디코딩 처리량", buckets=THROUGHPUT_BUCKETS)
+QUEUE_WAIT = METRICS.histogram("queue_wait_seconds", "배치 합류까지 대기 시간")
+CANCELLED_TOKENS_SAVED = METRICS.counter(
+    "cancelled_tokens_saved_total", "클라이언트 연결 종료로 생성을 취소해 디코딩하지 않은 토큰 수 (max_tokens까지 남은 토큰 기준)"
+)
+IMAGE_DECODE_TIME = METRICS.histogram("image_decode_seconds", "이미지 한 장의 디코딩/전처리 시간 (캐시 적중 포함)")
+METRICS.gauge_function("in_flight_requests", "배치에서 생성 중인 요청 수", lambda: ADMISSION.stats()["in_flight"])
+METRICS.gauge_function("queue_depth", "배치 합류를 기다리는 요청 수", lambda: ADMISSION.queue_depth)
+METRICS.gauge_function(
+    "inference_queue_depth", "추론 워커 작업 대기열 길이 (모델별)",
+    lambda: {(h.model_id,): h.executor.queue_depth for h in _ready_handles()}, ("model",)
+)
+METRICS.gauge_function(
+    "model_resident_bytes", "메모리에 올라간 모델 가중치 크기 (모델별)",
+    lambda: {(h.model_id,): h.nbytes for h in _ready_handles()}, ("model",)
+)
+METRICS.counter_function("model_evictions_total", "메모리 예산 때문에 내려간 모델 수", lambda: REGISTRY.evictions)
+METRICS.gauge_function(
+    "model_load_progress", "모델 로드 진행률 (0~1, 모델별)",
+    lambda: {(h.model_id,): h.progress for h in REGISTRY.handles.values()}, ("model",)
+)
+METRICS.gauge_function(
+    "model_parked_requests", "모델 로드 완료를 기다리는 요청 수 (모델별)",
+    lambda: {(h.model_id,): h.parked for h in REGISTRY.handles.values()}, ("model",)
+)
+METRICS.counter_function("model_park_timeouts_total", "모델 로드 대기 시간 초과로 거절된 요청 수", lambda: REGISTRY.park_timeouts)
+METRICS.counter_function(
+    "admission_rejected_total", "승인 제어로 거절된 요청 수 (상태 코드별)",
+    lambda: {(code,): count for code, count in ADMISSION.stats()["rejected"].items()}, ("status",)
+)
+
+def _ready_handles():
+    return [h for h in REGISTRY.handles.values() if h.state == "ready"]
+
+def _speculation_stats():
+    """{모델 ID: {방식: 추측 디코딩 통계}} (추측 디코딩을 한 번이라도 사용한 모델만)"""
+    stats = {}
+    for handle in _ready_handles():
+        backend = getattr(handle.executor.scheduler, "backend", None)
+        speculation = getattr(backend, "speculation", None)
+        if speculation is not None:
+            methods = speculation.stats()
+            if methods:
+                stats[handle.model_id] = methods
+    return stats
+
+def _speculation_metric(field):
+    """{(모델 ID, 방식): 통계 값} (값이 없는 항목 제외)"""
+    return {
+        (model, method): st[field]
+        for model, methods in _speculation_stats().items()
+        for method, st in methods.items()
+        if st[field] is not None
+    }
+
+METRICS.counter_function(
+    "speculative_drafted_tokens_total", "추측 디코딩으로 제안된 초안 토큰 수 (모델, 방식별)",
+    lambda: _speculation_metric("drafted_tokens"), ("model", "method")
+)
+METRICS.counter_function(
+    "speculative_accepted_tokens_total", "검증을 통과해 채택된 초안 토큰 수 (모델, 방식별)",
+    lambda: _speculation_metric("accepted_tokens"), ("model", "method")
+)
+METRICS.gauge_function(
+    "speculative_acceptance_rate", "초안 토큰 채택률 (모델, 방식별)",
+    lambda: _speculation_metric("acceptance_rate"), ("model", "method")
+)
+METRICS.gauge_function(
+    "speculative_tokens_per_round", "대상 모델 검증 한 번에 확정된 평균 토큰 수 (모델, 방식별)",
+    lambda: _speculation_metric("tokens_per_round"), ("model", "method")
+)
+METRICS.gauge_function(
+    "speculative_speedup", "추측 없이 토큰 하나씩 디코딩할 때 대비 토큰 처리 속도 배수 (모델, 방식별)",
+    lambda: _speculation_metric("speedup"), ("model", "method")
+)
+
+def _cache_stats():
+    """{(캐시 이름, 모델 ID): 통계} (이미지 캐시는 모든 모델이 공유)"""
+    stats = {("image", ""): IMAGE_CACHE.stats()}
+    for handle in _ready_handles():
+        for name, cache in handle.caches.items():
+            stats[(name, handle.model_id)] = cache.stats()
+    return stats
+
+METRICS.gauge_function(
+    "cache_hit_rate", "캐시 적중률", lambda: {k: st["hit_rate"] for k, st in _cache_stats().items()}, ("cache", "model")
+)
+METRICS.counter_function(
+    "cache_hits_total", "캐시 적중 수", lambda: {k: st["hits"] for k, st in _cache_stats().items()}, ("cache", "model")
+)
+METRICS.counter_function(
+    "cache_misses_total", "캐시 실패 수", lambda: {k: st["misses"] for k, st in _cache_stats().items()}, ("cache", "model")
+)
+METRICS.gauge_function(
+    "cache_bytes", "캐시 메모리 사용량", lambda: {k: st["bytes"] for k, st in _cache_stats().items()}, ("cache", "model")
+)
+
+def _record_sequence_metrics(seq):
+    """시퀀스 완료 시 추론 워커 스레드에서 호출되어 지연 시간/처리량 지표를 기록"""
+    stats = seq.latency()
+    usage = seq.usage()
+    SEQUENCES_TOTAL.labels(seq.finish_reason).inc()
+    QUEUE_WAIT.observe(stats["queue_wait"])
+    if stats["time_to_first_token"] is not None:
+        TIME_TO_FIRST_TOKEN.observe(stats["time_to_first_token"])
+    TOKENS_TOTAL.labels("prompt").inc(usage["prompt_tokens"])
+    TOKENS_TOTAL.labels("cached").inc(usage["prompt_tokens_details"]["cached_tokens"])
+    TOKENS_TOTAL.labels("image").inc(usage["prompt_tokens_details"]["image_tokens"])
+    TOKENS_TOTAL.labels("completion").inc(usage["completion_tokens"])
+    if seq.finish_reason == "cancelled":
+        CANCELLED_TOKENS_SAVED.inc(max(seq.request.max_tokens - usage["completion_tokens"], 0))
+    if seq.first_token_at is None:
+        return
+    prefill_time = seq.first_token_at - (seq.admitted_at or seq.submitted_at)
+    if usage["prefill_tokens"] and prefill_time > 0:
+        PREFILL_THROUGHPUT.observe(usage["prefill_tokens"] / prefill_time)
+    decode_time = (seq.finished_at or seq.first_token_at) - seq.first_token_at
+    if usage["decode_tokens"] and decode_time > 0:
+        TIME_PER_OUTPUT_TOKEN.observe(decode_time / usage["decode_tokens"])
+        DECODE_THROUGHPUT.observe(usage["decode_tokens"] / decode_time)
+
 # FastAPI 앱 생성
 app = FastAPI(title="Qwen-VL OpenAI Compatible API Server")
 
@@ -72,191 +255,520 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-async def load_model_func():
-    """모델과 프로세서를 로드하는 함수"""
-    global MODEL, PROCESSOR, MODEL_ID
+def _route_label(request):
+    """
+    요청 수 지표의 경로 레이블 (일치한 라우트의 경로 템플릿)
+
+    실제 요청 경로를 그대로 쓰면 404 탐색 요청마다 시계열이 늘어나므로,
+    어떤 라우트와도 일치하지 않은 요청은 "other" 하나로 모읍니다.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "other"
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    """경로와 상태 코드별 요청 수 기록"""
+    try:
+        response = await call_next(request)
+    except Exception:
+        REQUESTS_TOTAL.labels(_route_label(request), 500).inc()
+        raise
+    REQUESTS_TOTAL.labels(_route_label(request), response.status_code).inc()
+    return response
+
+def _sse_chunk(completion_id, created, model_id, delta, finish_reason=None, index=0):
+    """OpenAI 호환 스트리밍 청크를 SSE 프레임 문자열로 변환"""
+    chunk = {
+        'id': completion_id,
+        'object': 'chat.completion.chunk',
+        'created': created,
+        'model': model_id,
+        'choices': [{'index': index, 'delta': delta, 'finish_reason': finish_reason}]
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+def _sse_usage_chunk(completion_id, created, model_id, usage):
+    """stream_options.include_usage 요청 시 마지막에 보내는 토큰 사용량 청크"""
+    chunk = {
+        'id': completion_id,
+        'object': 'chat.completion.chunk',
+        'created': created,
+        'model': model_id,
+        'choices': [],
+        'usage': usage
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+async def _merge_streams(sequences):
+    """
+    여러 시퀀스(n > 1)의 텍스트 조각 묶음을 도착 순서대로 (선택지 번호, 묶음)으로 반환하는 비동기 이터레이터
+
+    시퀀스 하나가 실패하면 그 오류를 다시 발생시킵니다.
+    """
+    queue = asyncio.Queue()
+
+    async def pump(index, sequence):
+        try:
+            async for batch in sequence.stream():
+                await queue.put((index, batch, None))
+        except Exception as e:
+            await queue.put((index, None, e))
+            return
+        await queue.put((index, None, None))
+
+    tasks = [asyncio.create_task(pump(index, sequence)) for index, sequence in enumerate(sequences)]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            index, batch, error = await queue.get()
+            if error is not None:
+                raise error
+            if batch is None:
+                remaining -= 1
+                continue
+            yield index, batch
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _cancel_on_disconnect(raw_request, sequences):
+    """
+    생성이 끝날 때까지 클라이언트 연결을 주기적으로 확인하고, 끊기면 모든 시퀀스를 취소
+
+    취소된 시퀀스는 대기 중이면 배치에 합류하지 않고, 디코딩 중이면 다음 토큰 경계에서 끝나며 KV 캐시가 해제됩니다.
+    """
+    while not all(seq.done for seq in sequences):
+        await asyncio.sleep(DISCONNECT_CHECK_INTERVAL)
+        if await raw_request.is_disconnected():
+            logger.info(f"클라이언트 연결 종료, 생성 취소: {sequences[0].id}")
+            for seq in sequences:
+                seq.cancel()
+            return
+
+def _cancel_sequences(sequences):
+    """끝나지 않은 시퀀스 취소 (응답을 끝까지 보내지 못한 경우)"""
+    for seq in sequences:
+        if not seq.done:
+            seq.cancel()
+
+def _finish_reason(sequence):
+    """OpenAI 형식의 종료 이유 (최대 토큰 도달 시 "length", 그 외 "stop")"""
+    return "length" if sequence.finish_reason == "length" else "stop"
+
+def _message_fields(msg):
+    """메시지 객체(ChatMessage 또는 dict)에서 역할과 내용 추출"""
+    if isinstance(msg, dict):
+        return msg.get("role"), msg.get("content")
+    return msg.role, msg.content
+
+def _build_conversation(messages):
+    """
+    요청 메시지 전체를 채팅 템플릿 형식으로 변환합니다.
+    
+    대화 전체를 매 턴 같은 형태로 만들어야 이전 턴과 프롬프트 접두사가 일치하여 KV 캐시를 재사용할 수 있습니다.
+    이미지는 메시지 안의 위치에 자리 표시자로 남기고, URL은 등장 순서대로 따로 모읍니다.
+    
+    Returns:
+        tuple: (채팅 메시지 목록, 이미지 URL 목록)
+    """
+    conversation = []
+    image_urls = []
+    for msg in messages:
+        role, content = _message_fields(msg)
+        parts = []
+        if isinstance(content, list):
+            for content_item in content:
+                if isinstance(content_item, dict):
+                    if content_item.get("type") == "text":
+                        parts.append({"type": "text", "text": content_item.get("text", "")})
+                    elif content_item.get("type") == "image_url":
+                        image_url = (content_item.get("image_url") or {}).get("url", "")
+                        if image_url:
+                            image_urls.append(image_url)
+                            parts.append({"type": "image"})
+                else:
+                    parts.append({"type": "text", "text": str(content_item)})
+        else:
+            parts.append({"type": "text", "text": content or ""})
+        conversation.append({"role": role, "content": parts})
+    return conversation, image_urls
+
+def _message_text(message):
+    """채팅 메시지의 텍스트 부분만 이어 붙임"""
+    return "".join(part.get("text", "") for part in message["content"] if part["type"] == "text")
+
+def _image_preprocess_params(request):
+    """
+    요청과 서버 설정으로 이미지 전처리 픽셀 범위를 결정합니다.
+    
+    요청 값은 서버 범위 [IMAGE_MIN_PIXELS, IMAGE_MAX_PIXELS] 안으로 제한되므로,
+    이미지당 시각 토큰 수의 상한은 항상 서버 설정을 따릅니다.
+    """
+    max_pixels = min(request.max_pixels or IMAGE_MAX_PIXELS, IMAGE_MAX_PIXELS)
+    min_pixels = max(request.min_pixels or IMAGE_MIN_PIXELS, IMAGE_MIN_PIXELS)
+    max_pixels = max(max_pixels, IMAGE_MIN_PIXELS)
+    return {"min_pixels": min(min_pixels, max_pixels), "max_pixels": max_pixels}
+
+async def _load_images(image_urls, preprocess):
+    """
+    요청의 모든 이미지를 디코딩 스레드 풀에서 병렬로 처리합니다 (실패한 이미지는 빈 이미지).
+    
+    Args:
+        image_urls (list): 대화에 등장한 순서대로의 이미지 URL
+        preprocess (dict): 이미지 전처리 매개변수 (min_pixels, max_pixels)
+        
+    Returns:
+        list: PIL 이미지 목록 (입력과 같은 순서)
+    """
+    return await load_images(
+        image_urls, IMAGE_DECODE_POOL, cache=IMAGE_CACHE, fetcher=IMAGE_FETCHER,
+        observe=IMAGE_DECODE_TIME.observe, **preprocess
+    )
+
+def _estimate_request_tokens(request):
+    """승인 제어에 사용할 요청의 예상 토큰 수 (텍스트 길이 기반 추정 + 최대 생성 토큰)"""
+    chars = 0
+    for msg in request.messages:
+        content = msg.get("content") if isinstance(msg, dict) else msg.content
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for item in content:
+                if isinstance(item, dict) and item.get("type") == "text":
+                    chars += len(item.get("text") or "")
+    max_tokens = request.max_tokens if request.max_tokens is not None else DEFAULT_MAX_TOKENS
+    return chars // 2 + max_tokens * max(request.n or 1, 1)
+
+def _discover_models():
+    """
+    사용 가능한 MLX 모델 디렉토리를 검색합니다.
+    
+    MODEL_DIR/mlx_models, MODEL_DIR 순서로 이름이 -mlx로 끝나는 디렉토리를 찾습니다.
+    환경 변수 MODEL_ID로 지정한 모델은 이름과 관계없이 가장 앞에 둡니다.
+    
+    Returns:
+        dict: {모델 ID: 절대 경로}
+    """
+    mlx_models_dir = os.path.join(MODEL_DIR, "mlx_models")
+    models = {}
+    
+    model_id = os.environ.get("MODEL_ID", None)
+    if model_id:
+        for base in (MODEL_DIR, mlx_models_dir):
+            model_path = os.path.join(base, model_id)
+            if os.path.isdir(model_path):
+                models[model_id] = os.path.abspath(model_path)
+                break
+        else:
+            logger.warning(f"지정된 모델 경로가 존재하지 않습니다: {model_id}")
+    
+    for base in (mlx_models_dir, MODEL_DIR):
+        if not os.path.isdir(base):
+            continue
+        for name in sorted(os.listdir(base)):
+            model_path = os.path.join(base, name)
+            if name.endswith("-mlx") and os.path.isdir(model_path) and name not in models:
+                models[name] = os.path.abspath(model_path)
+    return models
+
+def _import_mlx_vlm():
+    """
+    mlx_vlm 로더를 임포트합니다 (서버 시작 시가 아니라 첫 모델 로드 시 추론 워커에서 호출).
+    
+    Returns:
+        tuple: (load, load_config) - load_config가 없는 버전이면 None
+    """
+    mlx_vlm = STARTUP_PROFILE.import_module("mlx_vlm")
+    try:
+        load_config = STARTUP_PROFILE.import_module("mlx_vlm.utils").load_config
+    except (ImportError, AttributeError):
+        load_config = None
+    
+    # MLX-VLM 패키지 버전 확인 (pkg_resources보다 훨씬 빠른 importlib.metadata 사용)
+    try:
+        logger.info(f"MLX-VLM 버전: {metadata.version('mlx-vlm')}")
+    except metadata.PackageNotFoundError as e:
+        logger.warning(f"MLX-VLM 버전 확인 실패: {e}")
+    return mlx_vlm.load, load_config
+
+def _physical_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def _prefetch_weights(model_id, path):
+    """
+    가중치 샤드를 스레드 풀에서 동시에 읽어 페이지 캐시에 올려 둡니다.
+    
+    mlx_vlm은 샤드를 하나씩 순서대로 읽으므로, 미리 병렬로 읽어 두면 이후 로드는
+    디스크 대신 메모리에서 읽게 되어 전체 로드 시간이 디스크 대역폭에 맞춰 줄어듭니다.
+    가중치가 물리 메모리에 다 들어가지 않으면 캐시가 서로 밀어내므로 건너뜁니다.
+    """
+    total_bytes = MODEL_INDEX.scan(path)["total_bytes"]
+    memory = _physical_memory()
+    if memory is not None and total_bytes > memory * 0.8:
+        logger.info(f"가중치가 물리 메모리보다 커서 병렬 미리 읽기를 건너뜁니다 ({model_id})")
+        return
+    try:
+        with ShardedSafetensors(path) as weights:
+            for timing in weights.load(max_workers=WEIGHT_LOAD_WORKERS):
+                STARTUP_PROFILE.record("phase", f"{model_id}: read {timing['file']}", timing["seconds"])
+    except (OSError, ValueError) as e:
+        logger.warning(f"가중치 병렬 미리 읽기 실패 ({model_id}): {e}")
+
+def _load_weights(model_id, path):
+    """추론 워커 스레드에서 실행: mlx_vlm 임포트 후 가중치 로드"""
+    load_vlm, load_config = _import_mlx_vlm()
+    if WEIGHT_LOAD_WORKERS > 0:
+        with STARTUP_PROFILE.phase(f"{model_id}: prefetch"):
+            _prefetch_weights(model_id, path)
+    with STARTUP_PROFILE.phase(f"{model_id}: weights"):
+        result = load_vlm(path)
+    return result, load_config
+
+def _draft_model_for(model_id):
+    """
+    대상 모델의 추측 디코딩 초안 모델 (ID, 경로)
+
+    초안 모델이 설정되지 않았거나 찾을 수 없으면 None
+    """
+    draft_id = SPECULATIVE_DRAFT_MODELS.get(model_id)
+    if draft_id is None or draft_id == model_id:
+        return None
+    draft_path = REGISTRY.available.get(draft_id)
+    if draft_path is None:
+        logger.warning(f"초안 모델을 찾을 수 없어 추측 디코딩을 사용하지 않습니다: {draft_id} ({model_id})")
+        return None
+    return draft_id, draft_path
+
+def _draft_bytes(model_id):
+    """레지스트리 메모리 예산에 더할 초안 모델 가중치 크기"""
+    draft = _draft_model_for(model_id)
+    return MODEL_INDEX.scan(draft[1])["total_bytes"] if draft is not None else 0
+
+def _create_session(model_id, path, model, processor, load_config):
+    with STARTUP_PROFILE.phase(f"{model_id}: session"):
+        return ModelSession.create(model_id, path, model, processor, load_config)
+
+async def _load_model_handle(handle):
+    """
+    레지스트리 로더: 모델 전용 추론 실행기를 만들고 그 스레드에서 모델을 로드합니다.
+    
+    모델, 세션, 접두사/비전 캐시, 배치 스케줄러가 모두 이 핸들에 속하므로
+    다른 모델의 로드나 추론과 서로 기다리지 않습니다.
+    """
+    logger.info(f"모델 로드 중: {handle.path}")
+    
+    handle.report("executor", 0.05)
+    executor = InferenceExecutor(max_queue_size=INFERENCE_QUEUE_SIZE, name=f"inference-{handle.model_id}")
+    executor.start()
+    handle.executor = executor
+    
+    # 모델은 추론 워커 스레드에서 로드하여 해당 스레드가 소유하도록 함
+    handle.report("weights", 0.1)
+    result, load_config = await executor.run(_load_weights, handle.model_id, handle.path)
+    
+    if not isinstance(result, tuple) or len(result) < 2:
+        logger.error(f"모델 로드 실패: 예상한 튜플이 아닙니다. 반환 타입: {type(result)}")
+        raise ValueError(f"모델 로드 오류: 예상 타입이 아닙니다.")
+    
+    model, processor = result[0], result[1]
+    if model is None or processor is None:
+        logger.error("모델 또는 프로세서가 None입니다.")
+        raise ValueError("모델 또는 프로세서가 None입니다.")
+    
+    executor.model, executor.processor = model, processor
+    
+    # 추측 디코딩 초안 모델 (같은 워커 스레드가 소유, 프로세서는 대상 모델 것을 함께 사용)
+    draft_model = None
+    draft = _draft_model_for(handle.model_id)
+    if draft is not None:
+        handle.report("draft", 0.7)
+        draft_result, _ = await executor.run(_load_weights, draft[0], draft[1])
+        draft_model = draft_result[0]
+        logger.info(f"추측 디코딩 초안 모델 로드 완료: {draft[0]} ({handle.model_id})")
+    
+    handle.report("session", 0.85)
+    session = await executor.run(_create_session, handle.model_id, handle.path, model, processor, load_config)
+    handle.report("scheduler", 0.95)
+    with STARTUP_PROFILE.phase(f"{handle.model_id}: scheduler"):
+        handle.caches = {
+            "prefix": PrefixCache(max_bytes=PREFIX_CACHE_MAX_BYTES),
+            "vision": ByteLRUCache(VISION_CACHE_MAX_BYTES, name=f"vision:{handle.model_id}")
+        }
+        executor.attach_scheduler(BatchScheduler(
+            MLXBackend(
+                model, processor, prefix_cache=handle.caches["prefix"], vision_cache=handle.caches["vision"],
+                stop_token_ids=session.stop_token_ids, draft_model=draft_model,
+                num_draft_tokens=SPECULATIVE_DRAFT_TOKENS, max_draft_tokens=SPECULATIVE_MAX_DRAFT_TOKENS,
+                adaptive_draft=SPECULATIVE_ADAPTIVE, default_speculation=SPECULATIVE_DEFAULT,
+                lookup_max_ngram=PROMPT_LOOKUP_MAX_NGRAM, lookup_num_tokens=PROMPT_LOOKUP_NUM_TOKENS,
+                lookup_min_acceptance=PROMPT_LOOKUP_MIN_ACCEPTANCE
+            ),
+            max_batch_size=MAX_BATCH_SIZE,
+            on_admit=lambda seq: ADMISSION.mark_started(seq.id),
+            on_finish=_record_sequence_metrics
+        ))
+    handle.session = session
+    logger.info(f"모델 타입: {type(model)}")
+    logger.info(f"프로세서 타입: {type(processor)}")
+
+def _unload_model_handle(handle):
+    """레지스트리 언로더: 모델 전용 워커를 멈추고 모델 메모리를 반환 (요청 처리 중에는 스레드 풀에서 호출됨)"""
+    executor = handle.executor
+    if executor is not None:
+        executor.shutdown(timeout=5)
+        executor.scheduler = None
+        executor.model = None
+        executor.processor = None
+    handle.session = None
+    handle.caches = {}
+    release_memory()
+
+# safetensors 헤더 인덱스 (모델 목록 메타데이터와 로드 전 검증에 사용, 파일 수정 시각 기준 캐시)
+MODEL_INDEX = ModelIndex()
+
+REGISTRY = ModelRegistry(
+    _discover_models,
+    _load_model_handle,
+    unloader=_unload_model_handle,
+    memory_budget=MODEL_MEMORY_BUDGET,
+    default_model=os.environ.get("MODEL_ID", None),
+    retry_after=MODEL_LOAD_RETRY_AFTER,
+    max_wait=MODEL_LOAD_MAX_WAIT,
+    max_parked=MODEL_LOAD_MAX_PARKED,
+    index=MODEL_INDEX,
+    extra_bytes=_draft_bytes
+)
+
+def start_model_loading():
+    """
+    기본 모델 로드를 백그라운드 작업으로 시작합니다 (완료를 기다리지 않음).
+    
+    로드 진행 상황은 /health/ready와 /v1/registry에서 확인할 수 있고,
+    로드가 끝나기 전에 들어온 요청은 MODEL_LOAD_MAX_WAIT초까지 대기합니다.
+    """
+    global MODEL_ID
     
     # 모델 디렉토리 확인
     if not os.path.exists(MODEL_DIR):
         logger.error(f"모델 디렉토리가 존재하지 않습니다: {MODEL_DIR}")
         raise FileNotFoundError(f"모델 디렉토리가 존재하지 않습니다: {MODEL_DIR}")
     
-    try:
-        # MODEL_ID가 환경 변수로 설정된 경우
-        model_id = os.environ.get("MODEL_ID", None)
-        if model_id:
-            MODEL_ID = model_id
-            
-            # 먼저 모델 디렉토리 내에서 직접 확인
-            model_path = os.path.join(MODEL_DIR, MODEL_ID)
-            
-            # 모델 경로가 존재하지 않으면 mlx_models 디렉토리 내에서 확인
-            if not os.path.exists(model_path):
-                mlx_models_dir = os.path.join(MODEL_DIR, "mlx_models")
-                if os.path.exists(mlx_models_dir):
-                    model_path = os.path.join(mlx_models_dir, MODEL_ID)
-                    logger.info(f"mlx_models 디렉토리에서 모델 확인: {model_path}")
-            
-            # 그래도 모델 경로가 존재하지 않으면 대체 모델 찾기
-            if not os.path.exists(model_path):
-                logger.warning(f"지정된 모델 경로가 존재하지 않습니다: {model_path}")
-                
-                # 먼저 mlx_models 디렉토리에서 찾기
-                mlx_models_dir = os.path.join(MODEL_DIR, "mlx_models")
-                if os.path.exists(mlx_models_dir):
-                    mlx_models = [d for d in os.listdir(mlx_models_dir) 
-                                if os.path.isdir(os.path.join(mlx_models_dir, d)) and d.endswith("-mlx")]
-                    
-                    if mlx_models:
-                        MODEL_ID = mlx_models[0]  # 첫 번째 발견된 모델 사용
-                        model_path = os.path.join(mlx_models_dir, MODEL_ID)
-                        logger.info(f"mlx_models 디렉토리에서 대체 모델을 찾았습니다: {MODEL_ID}")
-                        logger.info(f"대체 모델 경로: {model_path}")
-                        
-                # mlx_models에서 찾지 못한 경우 모델 디렉토리 전체에서 검색
-                if not os.path.exists(model_path):
-                    # 사용 가능한 모델 디렉토리 찾기
-                    models = [d for d in os.listdir(MODEL_DIR) 
-                             if os.path.isdir(os.path.join(MODEL_DIR, d)) and d.endswith("-mlx")]
-                    
-                    if models:
-                        MODEL_ID = models[0]  # 첫 번째 발견된 모델 사용
-                        model_path = os.path.join(MODEL_DIR, MODEL_ID)
-                        logger.info(f"대체 모델을 사용합니다: {MODEL_ID}")
-                    else:
-                        logger.error(f"사용 가능한 모델이 없습니다.")
-                        raise FileNotFoundError("사용 가능한 모델이 없습니다.")
-        else:
-            # 모델 ID가 지정되지 않은 경우 자동 검색
-            logger.info("모델 ID가 지정되지 않았습니다. 자동으로 모델을 검색합니다.")
-            
-            # 먼저 mlx_models 디렉토리에서 검색
-            mlx_models_dir = os.path.join(MODEL_DIR, "mlx_models")
-            if os.path.exists(mlx_models_dir):
-                mlx_models = [d for d in os.listdir(mlx_models_dir) 
-                            if os.path.isdir(os.path.join(mlx_models_dir, d)) and d.endswith("-mlx")]
-                
-                if mlx_models:
-                    MODEL_ID = mlx_models[0]  # 첫 번째 발견된 모델 사용
-                    model_path = os.path.join(mlx_models_dir, MODEL_ID)
-                    logger.info(f"mlx_models 디렉토리에서 모델을 찾았습니다: {MODEL_ID}")
-                    logger.info(f"모델 경로: {model_path}")
-            
-            # mlx_models에서 찾지 못한 경우
-            if not MODEL_ID:
-                # 사용 가능한 모델 디렉토리 찾기
-                models = [d for d in os.listdir(MODEL_DIR) 
-                         if os.path.isdir(os.path.join(MODEL_DIR, d)) and d.endswith("-mlx")]
-                
-                if models:
-                    MODEL_ID = models[0]  # 첫 번째 발견된 모델 사용
-                    model_path = os.path.join(MODEL_DIR, MODEL_ID)
-                    logger.info(f"첫 번째 발견된 모델을 사용합니다: {MODEL_ID}")
-                else:
-                    logger.error(f"사용 가능한 모델이 없습니다.")
-                    raise FileNotFoundError("사용 가능한 모델이 없습니다.")
-        
-        # 절대 경로로 변환
-        abs_model_path = os.path.abspath(model_path)
-        logger.info(f"절대 경로: {abs_model_path}")
-        
-        # Python 환경 정보 출력
-        logger.info(f"Python 실행 경로: {sys.executable}")
-        logger.info(f"Python 버전: {sys.version}")
-        logger.info(f"작업 디렉토리: {os.getcwd()}")
-        
-        # 모델 디렉토리 확인
-        if os.path.isdir(abs_model_path):
-            logger.info(f"모델 디렉토리 존재함: {abs_model_path}")
-            # 디렉토리 내용 확인
-            try:
-                files = os.listdir(abs_model_path)
-                logger.info(f"디렉토리 파일: {files[:10]} ..." if len(files) > 10 else f"디렉토리 파일: {files}")
-            except Exception as e:
-                logger.warning(f"디렉토리 내용 확인 실패: {e}")
-        else:
-            logger.warning(f"모델 경로가 디렉토리가 아님: {abs_model_path}")
-        
-        # 모델 로드
-        logger.info(f"모델 로드 중: {abs_model_path}")
-        
-        try:
-            # MLX-VLM 패키지 버전 확인
-            try:
-                import pkg_resources
-                mlx_vlm_version = pkg_resources.get_distribution("mlx-vlm").version
-                logger.info(f"MLX-VLM 버전: {mlx_vlm_version}")
-            except Exception as e:
-                logger.warning(f"MLX-VLM 버전 확인 실패: {e}")
-            
-            result = load_vlm(abs_model_path)
-            
-            if not isinstance(result, tuple) or len(result) < 2:
-                logger.error(f"모델 로드 실패: 예상한 튜플이 아닙니다. 반환 타입: {type(result)}")
-                raise ValueError(f"모델 로드 오류: 예상 타입이 아닙니다.")
-            
-            MODEL, PROCESSOR = result
-            logger.info(f"모델 로드 완료: {MODEL_ID}")
-            logger.info(f"모델 타입: {type(MODEL)}")
-            logger.info(f"프로세서 타입: {type(PROCESSOR)}")
-            
-            if MODEL is None or PROCESSOR is None:
-                logger.error("모델 또는 프로세서가 None입니다.")
-                raise ValueError("모델 또는 프로세서가 None입니다.")
-            
-            # 모델 로드 성공
-            logger.info("모델과 프로세서가 성공적으로 로드되었습니다.")
-            return True
-        
-        except Exception as e:
-            logger.error(f"모델 로드 오류: {e}")
-            logger.error(traceback.format_exc())
-            raise
-        
-    except Exception as e:
-        logger.error(f"모델 로드 중 오류 발생: {e}")
-        logger.error(traceback.format_exc())
-        raise
+    REGISTRY.refresh()
+    MODEL_ID = REGISTRY.default_model
+    if MODEL_ID is None:
+        logger.error(f"사용 가능한 모델이 없습니다.")
+        raise FileNotFoundError("사용 가능한 모델이 없습니다.")
+    
+    handle = REGISTRY.preload(MODEL_ID)
+    # 첫 모델 로드가 끝나면 임포트/로드 단계별 시간을 한 번 보고
+    handle.ready.add_done_callback(lambda _: STARTUP_PROFILE.log("서버 시작 시간 분석"))
+    return handle
 
 @app.on_event("startup")
 async def startup_event():
     """서버 시작 시 이벤트 핸들러"""
-    global MODEL_ID
-    
     try:
-        logger.info("서버 시작: 모델 로드 중...")
-        await load_model_func()
-        logger.info(f"서버 준비 완료. 모델 ID: {MODEL_ID}")
+        # Python 환경 정보 출력
+        logger.info(f"Python 실행 경로: {sys.executable}")
+        logger.info(f"Python 버전: {sys.version}")
+        logger.info(f"작업 디렉토리: {os.getcwd()}")
+        # 모델 로드를 기다리지 않고 바로 요청을 받기 시작 (준비 여부는 /health/ready)
+        with STARTUP_PROFILE.phase("startup_event"):
+            start_model_loading()
+        logger.info(f"서버 시작: 백그라운드에서 모델 로드 중 ({MODEL_ID})")
     except Exception as e:
         logger.error(f"서버 시작 오류: {e}")
         logger.error(traceback.format_exc())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """서버 종료 시 이벤트 핸들러"""
+    REGISTRY.shutdown()
+    IMAGE_FETCHER.close()
+    IMAGE_DECODE_POOL.shutdown(wait=False)
+
 @app.get("/", response_class=JSONResponse)
 async def root():
     """루트 엔드포인트 - 서버 상태 확인"""
-    return {"status": "online", "model": MODEL_ID or "로드되지 않음"}
+    return {
+        "status": "online",
+        "model": MODEL_ID or "로드되지 않음",
+        "models": {model_id: handle.state for model_id, handle in REGISTRY.handles.items()},
+        "inference_queue_depth": sum(handle.executor.queue_depth for handle in _ready_handles()),
+        "queue_depth": ADMISSION.queue_depth
+    }
+
+@app.get("/v1/queue", response_class=JSONResponse)
+async def queue_stats():
+    """요청 대기열 상태 (대기열 깊이, 대기 시간, 거절 횟수)"""
+    return ADMISSION.stats()
+
+@app.get("/v1/cache", response_class=JSONResponse)
+async def cache_stats():
+    """캐시 상태 (항목 수, 메모리 사용량, 적중률)"""
+    return {
+        "image_cache": IMAGE_CACHE.stats(),
+        "image_fetch": dict(IMAGE_FETCHER.stats),
+        "models": {
+            handle.model_id: {f"{name}_cache": cache.stats() for name, cache in handle.caches.items()}
+            for handle in _ready_handles()
+        }
+    }
+
+@app.get("/health/live", response_class=JSONResponse)
+async def health_live():
+    """프로세스 생존 확인 (모델 로드 여부와 관계없이 이벤트 루프가 응답하면 200)"""
+    return {"status": "alive"}
+
+@app.get("/health/ready", response_class=JSONResponse)
+async def health_ready():
+    """요청 처리 준비 확인 (로드가 끝난 모델이 하나 이상이면 200, 아니면 503과 로드 진행 상황)"""
+    models = {model_id: handle.info() for model_id, handle in REGISTRY.handles.items()}
+    if _ready_handles():
+        return {"status": "ready", "default_model": REGISTRY.default_model, "models": models}
+    return JSONResponse(
+        status_code=503,
+        content={"status": "loading" if models else "not_ready", "default_model": REGISTRY.default_model, "models": models},
+        headers={"Retry-After": str(REGISTRY.retry_after)}
+    )
+
+@app.get("/v1/registry", response_class=JSONResponse)
+async def registry_stats():
+    """모델 레지스트리 상태 (상주 모델, 메모리 사용량, 로드 시간, 추측 디코딩 채택률, 시작 시간 분석)"""
+    return {**REGISTRY.stats(), "speculative": _speculation_stats(), "startup": STARTUP_PROFILE.report()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 형식 지표 (TTFT, 토큰당 시간, 처리량, 대기 시간, 캐시 적중률 등)"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/v1/models", response_model=ModelList, response_class=JSONResponse)
 async def list_models():
-    """OpenAI API와 호환되는 모델 목록 엔드포인트"""
-    global MODEL_ID
-    
-    if not MODEL_ID:
-        try:
-            await load_model_func()
-        except Exception as e:
-            logger.error(f"모델 로드 오류: {e}")
-            raise HTTPException(status_code=500, detail=f"모델 로드 오류: {str(e)}")
-    
+    """OpenAI API와 호환되는 모델 목록 엔드포인트 (상주 여부와 관계없이 사용 가능한 모델 전체)"""
     try:
-        # 모델 정보 구성
+        REGISTRY.refresh()
         models_data = []
-        models_data.append({
-            "id": MODEL_ID,
-            "object": "model",
-            "created": int(time.time()),
-            "owned_by": "user"
-        })
+        for model_id, model_path in REGISTRY.available.items():
+            handle = REGISTRY.handles.get(model_id)
+            # 헤더만 읽고 파일 수정 시각 기준으로 캐시하므로 가중치 크기와 관계없이 빠름
+            info = MODEL_INDEX.scan(model_path)
+            state = handle.state if handle is not None else ("available" if info["valid"] else "invalid")
+            models_data.append({
+                "id": model_id,
+                "object": "model",
+                "created": int(time.time()),
+                "owned_by": "user",
+                "state": state,
+                "model_type": info["model_type"],
+                "parameters": info["parameters"],
+                "quantization": info["quantization"],
+                "dtypes": info["dtypes"],
+                "size": info["total_bytes"],
+                "errors": info["errors"]
+            })
         
         return {"object": "list", "data": models_data}
     except Exception as e:
@@ -266,56 +778,55 @@ async def list_models():
 @app.post("/v1/chat/completions", response_model=ChatCompletionResponse, response_class=JSONResponse)
 async def chat_completions(request: ChatCompletionRequest, raw_request: Request):
     """OpenAI API와 호환되는 채팅 완료 엔드포인트"""
-    global MODEL, PROCESSOR, MODEL_ID
-    
     logger.info(f"채팅 완료 요청. 모델: {request.model}, 메시지 수: {len(request.messages)}, 스트림: {request.stream}")
+    ticket = None
+    handle = None
+    watcher = None
+    sequences = []
     
     try:
-        if not MODEL or not PROCESSOR:
-            logger.info("모델이 로드되지 않았습니다. 로드를 시도합니다.")
-            await load_model_func()
+        # 대화 전체 변환 (이전 턴의 텍스트와 이미지 포함)
+        conversation, image_urls = _build_conversation(request.messages)
+        user_messages = [m for m in conversation if m["role"] == "user"]
         
-        # 사용자 메시지 추출
-        last_user_msg = None
+        if not user_messages:
+            raise HTTPException(status_code=400, detail="사용자 메시지가 없습니다")
         
-        for msg in reversed(request.messages):
-            if msg.role == "user":
-                last_user_msg = msg
-                break
+        # n개 응답은 프리필을 공유하며 한 배치로 함께 디코딩되므로 배치 크기까지만 허용
+        n = request.n or 1
+        if not 1 <= n <= MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"n은 1 이상 {MAX_BATCH_SIZE} 이하여야 합니다")
         
-        if not last_user_msg:
-            raise HTTPException(status_code=400, detail="사용자 메시지가 없습니다")
+        # 요청의 model로 모델 선택 (로드 중이면 최대 MODEL_LOAD_MAX_WAIT초 대기, 다른 모델은 계속 처리)
+        handle = await REGISTRY.acquire(request.model)
+        model_id = handle.model_id
         
-        # 이미지 처리 로직
-        img = None
-        text_prompt = ""
+        # 이미지 다운로드/디코딩 전에 승인 여부 확인 (거절 시 429/503)
+        ticket = ADMISSION.acquire(_estimate_request_tokens(request))
+        # 전처리 후 이미지 한 장은 max_pixels를 넘지 않으므로 그 상한으로 픽셀 예산을 먼저 점유
+        preprocess = _image_preprocess_params(request)
+        ADMISSION.reserve_pixels(ticket, len(image_urls) * preprocess["max_pixels"])
         
-        # 메시지 형식에 따라 처리
-        if isinstance(last_user_msg.content, list):
-            for content_item in last_user_msg.content:
-                if isinstance(content_item, dict):
-                    if content_item.get("type") == "text":
-                        text_prompt += content_item.get("text", "")
-                    elif content_item.get("type") == "image_url":
-                        image_url = content_item.get("image_url", {}).get("url", "")
-                        if image_url:
-                            logger.info(f"이미지 URL 처리 중: {image_url[:100]}...")
-                            try:
-                                img = process_image_from_data_url(image_url)
-                                if img is None:
-                                    logger.warning("이미지 처리 실패, 빈 이미지 생성")
-                                    img = create_empty_image()
-                            except Exception as img_err:
-                                logger.error(f"이미지 처리 오류: {img_err}")
-                                img = create_empty_image()
-                else:
-                    text_prompt += str(content_item)
-        else:
-            text_prompt = last_user_msg.content
+        # 대화 전체의 이미지를 병렬로 다운로드/디코딩 (등장 순서 유지)
+        images = await _load_images(image_urls, preprocess)
+        ADMISSION.settle_pixels(ticket, sum(image.width * image.height for image in images))
         
         # 모델을 통한 텍스트 생성
+        text_prompt = _message_text(user_messages[-1])
         logger.info(f"프롬프트: {text_prompt[:100]}{'...' if len(text_prompt) > 100 else ''}")
         
+        try:
+            # 로드 시 컴파일해 둔 템플릿 사용 (프로세서를 건드리지 않으므로 워커를 거치지 않음)
+            formatted_prompt = handle.session.format_conversation(conversation)
+            logger.info(f"포맷된 프롬프트: {formatted_prompt[:100]}..." if len(formatted_prompt) > 100 else f"포맷된 프롬프트: {formatted_prompt}")
+            sequence = handle.executor.generate(GenerationRequest.from_chat_request(request, formatted_prompt, images, request_id=ticket.id))
+            sequences = [sequence] + sequence.forks
+            # 클라이언트가 연결을 끊으면 (중지 버튼, 탭 닫기) 남은 생성을 취소
+            watcher = asyncio.create_task(_cancel_on_disconnect(raw_request, sequences))
+        except ExecutorBusyError as e:
+            logger.warning(f"추론 대기열 포화: {e}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(ADMISSION.retry_after)})
+        
         # 스트리밍 모드 처리
         if request.stream:
             logger.info("스트리밍 모드로 응답 생성")
@@ -326,126 +837,60 @@ async def chat_completions(request: ChatCompletionRequest, raw_request: Request)
                 created = int(time.time())
                 
                 try:
-                    # 시스템 프롬프트 처리
-                    system_prompt = None
-                    for msg in request.messages:
-                        if isinstance(msg, dict) and msg.get("role") == "system":
-                            system_prompt = msg.get("content")
-                            break
-                        elif hasattr(msg, "role") and msg.role == "system":
-                            system_prompt = msg.content
-                            break
-                    
-                    # 설정 로드 시도
-                    config = None
-                    if load_config:
-                        try:
-                            # Qwen 모델 설정 파일 로드
-                            abs_model_path = os.path.abspath(os.path.join(MODEL_DIR, "mlx_models", MODEL_ID))
-                            config = load_config(abs_model_path)
-                        except Exception as e:
-                            logger.warning(f"모델 설정 로드 실패: {e}")
-                            config = {"chat_template": "simple"}
-                    else:
-                        config = {"chat_template": "simple"}
-                    
-                    # 포맷된 프롬프트 생성
+                    # 백엔드가 생성하는 토큰을 즉시 전송 (클라이언트가 뒤처지면 여러 토큰을 한 프레임으로 묶음)
                     try:
-                        formatted_prompt = apply_chat_template(
-                            PROCESSOR, 
-                            config, 
-                            text_prompt, 
-                            system=system_prompt, 
-                            num_images=1 if img is not None else 0
-                        )
-                    except Exception as e:
-                        logger.warning(f"포맷된 프롬프트 생성 실패: {e}, 원본 프롬프트 사용")
-                        formatted_prompt = text_prompt
-                    
-                    logger.info(f"스트리밍 포맷된 프롬프트: {formatted_prompt[:100]}..." if len(formatted_prompt) > 100 else f"포맷된 프롬프트: {formatted_prompt}")
-                    
-                    # 전체 텍스트를 한 번에 생성
-                    try:
-                        logger.info("전체 텍스트 생성 시작...")
+                        logger.info("스트리밍 텍스트 생성 시작...")
                         start_time = time.time()
+                        first_token_time = None
+                        started = set()
+                        chars = 0
                         
-                        if img is not None:
-                            response_text = generate(
-                                MODEL, 
-                                PROCESSOR, 
-                                formatted_prompt, 
-                                [img],
-                                max_tokens=request.max_tokens,
-                                temperature=request.temperature,
-                                top_p=request.top_p if hasattr(request, 'top_p') and request.top_p is not None else 0.95,
-                                verbose=False
-                            )
-                        else:
-                            response_text = generate(
-                                MODEL, 
-                                PROCESSOR, 
-                                formatted_prompt,
-                                max_tokens=request.max_tokens,
-                                temperature=request.temperature,
-                                top_p=request.top_p if hasattr(request, 'top_p') and request.top_p is not None else 0.95,
-                                verbose=False
-                            )
-                        
-                        # 리스트 반환값 처리
-                        if isinstance(response_text, list) and len(response_text) > 0:
-                            response_text = response_text[0]
+                        # n > 1이면 선택지마다 index를 붙여 도착 순서대로 전송
+                        async for index, batch in _merge_streams(sequences):
+                            delta = {'content': "".join(batch)}
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                            if index not in started:
+                                started.add(index)
+                                delta = {'role': 'assistant', **delta}
+                            chars += len(delta['content'])
+                            yield _sse_chunk(completion_id, created, model_id, delta, index=index)
                         
                         end_time = time.time()
-                        logger.info(f"전체 텍스트 생성 완료: {end_time - start_time:.2f}초")
-                        logger.info(f"생성된 텍스트 길이: {len(response_text)} 문자, {len(response_text.split())} 토큰")
-                        logger.info(f"응답: {response_text[:100]}..." if len(response_text) > 100 else f"응답: {response_text}")
-                        
-                        # 계속 질문 추가 여부 확인
-                        tokens_used = len(response_text.split())
-                        add_continue_question = tokens_used >= int(request.max_tokens * 0.8)
-                        
-                        if add_continue_question:
-                            # 문장 끝 찾기
-                            last_sentence_end = max(
-                                response_text.rfind('.'), 
-                                response_text.rfind('!'), 
-                                response_text.rfind('?')
-                            )
-                            
-                            # 적절한 위치에 질문 추가
-                            if last_sentence_end > 0 and last_sentence_end < len(response_text) - 10:
-                                # 문장 끝 다음부터의 텍스트 제거
-                                response_text = response_text[:last_sentence_end+1]
-                                response_text += "\n\n계속해서 더 들려드릴까요?"
-                                logger.info("계속 질문이 추가됨")
-                        
-                        # 첫 글자에 role 추가
-                        if response_text:
-                            # 첫 글자만 전송 (role 포함)
-                            yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': MODEL_ID, 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': response_text[0]}, 'finish_reason': None}]})}\n\n"
-                            
-                            # 나머지 글자들 한 글자씩 전송 (적절한 지연 적용)
-                            for char in response_text[1:]:
-                                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': MODEL_ID, 'choices': [{'index': 0, 'delta': {'content': char}, 'finish_reason': None}]})}\n\n"
-                                # 매우 짧은 지연으로 자연스러운 타이핑 효과 제공
-                                time.sleep(0.01)
+                        if first_token_time is not None:
+                            logger.info(f"첫 토큰까지 걸린 시간: {first_token_time - start_time:.2f}초")
+                        logger.info(f"스트리밍 텍스트 생성 완료: {end_time - start_time:.2f}초")
+                        logger.info(f"생성된 텍스트 길이: {chars} 문자, {sum(len(s.tokens) for s in sequences)} 토큰")
                     
                     except Exception as e:
                         logger.error(f"텍스트 생성 실패: {e}")
                         logger.error(traceback.format_exc())
-                        yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': MODEL_ID, 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': f'텍스트 생성 중 오류가 발생했습니다: {str(e)}'}, 'finish_reason': None}]})}\n\n"
+                        yield _sse_chunk(completion_id, created, model_id, {'role': 'assistant', 'content': f'텍스트 생성 중 오류가 발생했습니다: {str(e)}'})
                     
                     # 종료 청크 전송
-                    yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': MODEL_ID, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+                    for index, seq in enumerate(sequences):
+                        yield _sse_chunk(completion_id, created, model_id, {}, _finish_reason(seq), index=index)
+                    if (request.stream_options or {}).get("include_usage"):
+                        yield _sse_usage_chunk(completion_id, created, model_id, merge_usage(sequences))
                     yield "data: [DONE]\n\n"
                     
                 except Exception as e:
                     logger.error(f"스트리밍 생성 오류: {e}")
                     logger.error(traceback.format_exc())
                     # 오류 발생 시 오류 메시지 전송
-                    yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': MODEL_ID, 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': f'스트리밍 처리 중 오류가 발생했습니다: {str(e)}'}, 'finish_reason': 'error'}]})}\n\n"
+                    yield _sse_chunk(completion_id, created, model_id, {'role': 'assistant', 'content': f'스트리밍 처리 중 오류가 발생했습니다: {str(e)}'}, 'error')
                     yield "data: [DONE]\n\n"
+                finally:
+                    # 스트림이 중간에 닫히면 (연결 종료로 응답 태스크가 취소되는 경우 포함) 생성도 취소
+                    _cancel_sequences(sequences)
+                    stream_watcher.cancel()
+                    ADMISSION.release(stream_ticket)
+                    REGISTRY.release(stream_handle)
             
+            # 승인 자원 반환과 모델 사용 종료, 연결 확인 종료는 스트림 종료 시점으로 넘김
+            stream_ticket, ticket = ticket, None
+            stream_handle, handle = handle, None
+            stream_watcher, watcher = watcher, None
             return StreamingResponse(generate_stream(), media_type="text/event-stream")
         
         # 일반 모드 (스트리밍 아닌 경우)
@@ -453,146 +898,15 @@ async def chat_completions(request: ChatCompletionRequest, raw_request: Request)
             start_time = time.time()
             
             try:
-                # 시스템 프롬프트 처리
-                system_prompt = None
-                for msg in request.messages:
-                    if isinstance(msg, dict) and msg.get("role") == "system":
-                        system_prompt = msg.get("content")
-                        break
-                    elif hasattr(msg, "role") and msg.role == "system":
-                        system_prompt = msg.content
-                        break
-                
-                # 텍스트 생성
-                if img is not None:
-                    try:
-                        # 설정 로드 시도
-                        config = None
-                        if load_config:
-                            try:
-                                # Qwen 모델 설정 파일 로드
-                                abs_model_path = os.path.abspath(os.path.join(MODEL_DIR, "mlx_models", MODEL_ID))
-                                config = load_config(abs_model_path)
-                                logger.info(f"모델 설정 로드됨: {config.get('model_type', 'unknown')}")
-                            except Exception as e:
-                                logger.warning(f"모델 설정 로드 실패: {e}")
-                                config = {"chat_template": "simple"}
-                        else:
-                            config = {"chat_template": "simple"}
-                            
-                        # 포맷된 프롬프트 생성
-                        try:
-                            formatted_prompt = apply_chat_template(
-                                PROCESSOR, 
-                                config, 
-                                text_prompt, 
-                                system=system_prompt, 
-                                num_images=1
-                            )
-                            logger.info(f"스트리밍 모드 포맷된 프롬프트: {formatted_prompt[:100]}..." if len(formatted_prompt) > 100 else f"포맷된 프롬프트: {formatted_prompt}")
-                            
-                            # 생성 매개변수 정확히 설정
-                            response_text = generate(
-                                MODEL, 
-                                PROCESSOR, 
-                                formatted_prompt, 
-                                [img],
-                                max_tokens=request.max_tokens,
-                                temperature=request.temperature,
-                                top_p=request.top_p if hasattr(request, 'top_p') and request.top_p is not None else 0.95,
-                                verbose=False
-                            )
-                        except Exception as e:
-                            logger.warning(f"스트리밍 모드에서 포맷된 프롬프트 처리 실패: {e}, 직접 프롬프트 전달")
-                            response_text = generate(
-                                MODEL, 
-                                PROCESSOR, 
-                                text_prompt, 
-                                [img],
-                                max_tokens=request.max_tokens,
-                                temperature=request.temperature
-                            )
-                    except Exception as e:
-                        logger.error(f"스트리밍 모드에서 이미지와 텍스트 생성 실패: {e}")
-                        response_text = generate(
-                            MODEL, 
-                            PROCESSOR, 
-                            text_prompt,
-                            max_tokens=request.max_tokens,
-                            temperature=request.temperature
-                        )
-                else:
-                    try:
-                        # 설정 로드 시도
-                        config = None
-                        if load_config:
-                            try:
-                                # Qwen 모델 설정 파일 로드
-                                abs_model_path = os.path.abspath(os.path.join(MODEL_DIR, "mlx_models", MODEL_ID))
-                                config = load_config(abs_model_path)
-                                logger.info(f"모델 설정 로드됨: {config.get('model_type', 'unknown')}")
-                            except Exception as e:
-                                logger.warning(f"모델 설정 로드 실패: {e}")
-                                config = {"chat_template": "simple"}
-                        else:
-                            config = {"chat_template": "simple"}
-                            
-                        # 포맷된 프롬프트 생성
-                        try:
-                            formatted_prompt = apply_chat_template(
-                                PROCESSOR, 
-                                config, 
-                                text_prompt, 
-                                system=system_prompt, 
-                                num_images=0
-                            )
-                            logger.info(f"스트리밍 모드 포맷된 프롬프트: {formatted_prompt[:100]}..." if len(formatted_prompt) > 100 else f"포맷된 프롬프트: {formatted_prompt}")
-                            
-                            # 생성 매개변수 정확히 설정
-                            response_text = generate(
-                                MODEL, 
-                                PROCESSOR, 
-                                formatted_prompt,
-                                max_tokens=request.max_tokens,
-                                temperature=request.temperature,
-                                top_p=request.top_p if hasattr(request, 'top_p') and request.top_p is not None else 0.95,
-                                verbose=False
-                            )
-                        except Exception as e:
-                            logger.warning(f"스트리밍 모드에서 포맷된 프롬프트 처리 실패: {e}, 직접 프롬프트 전달")
-                            response_text = generate(
-                                MODEL, 
-                                PROCESSOR, 
-                                text_prompt,
-                                max_tokens=request.max_tokens,
-                                temperature=request.temperature
-                            )
-                        except Exception as e:
-                            logger.error(f"스트리밍 모드에서 텍스트 생성 실패: {e}")
-                            # 오류 발생 시 간단한 방식 시도
-                            response_text = generate(
-                                MODEL, 
-                                PROCESSOR, 
-                                text_prompt,
-                                max_tokens=request.max_tokens,
-                                temperature=request.temperature
-                            )
-                    except Exception as e:
-                        logger.error(f"스트리밍 모드에서 텍스트 생성 실패: {e}")
-                        # 오류 발생 시 간단한 방식 시도
-                        response_text = generate(
-                            MODEL, 
-                            PROCESSOR, 
-                            text_prompt,
-                            max_tokens=request.max_tokens,
-                            temperature=request.temperature
-                        )
-                
-                # 리스트 반환값 처리
-                if isinstance(response_text, list) and len(response_text) > 0:
-                    response_text = response_text[0]
-                
+                # 텍스트 생성은 추론 실행기의 배치 스케줄러에서 수행 (n개 응답은 한 배치로 함께 디코딩)
+                texts = await asyncio.gather(*(seq.wait() for seq in sequences))
+                if any(seq.finish_reason == "cancelled" for seq in sequences):
+                    # 응답을 받을 클라이언트가 없음 (nginx 관례의 499)
+                    raise HTTPException(status_code=499, detail="클라이언트 연결이 종료되어 생성을 취소했습니다")
+                response_text = texts[0]
                 logger.info(f"생성 완료: {response_text[:100]}..." if len(response_text) > 100 else f"생성 완료: {response_text}")
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"채팅 완료 처리 오류: {e}")
                 logger.error(traceback.format_exc())
@@ -602,39 +916,50 @@ async def chat_completions(request: ChatCompletionRequest, raw_request: Request)
             logger.info(f"생성 시간: {end_time - start_time:.2f}초")
             logger.info(f"응답: {response_text[:100]}{'...' if len(response_text) > 100 else ''}")
             
-            # 응답 구성
+            # 응답 구성 (토큰 수는 백엔드가 실제로 처리/생성한 토큰 기준)
             completion_id = f"chatcmpl-{str(uuid.uuid4())}"
-            input_tokens = len(text_prompt.split())
-            output_tokens = len(response_text.split())
             
             response = ChatCompletionResponse(
                 id=completion_id,
                 object="chat.completion",
                 created=int(time.time()),
-                model=MODEL_ID,
+                model=model_id,
                 choices=[
                     ChatCompletionResponseChoice(
-                        index=0,
+                        index=index,
                         message=ChatMessage(
                             role="assistant",
-                            content=response_text
+                            content=text
                         ),
-                        finish_reason="stop"
+                        finish_reason=_finish_reason(seq)
                     )
+                    for index, (seq, text) in enumerate(zip(sequences, texts))
                 ],
-                usage={
-                    "prompt_tokens": input_tokens,
-                    "completion_tokens": output_tokens,
-                    "total_tokens": input_tokens + output_tokens
-                }
+                usage=merge_usage(sequences)
             )
             
             return response
-        
+    
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ModelUnavailable as e:
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"채팅 완료 오류: {e}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"채팅 완료 오류: {str(e)}")
+    finally:
+        if watcher is not None:
+            # 응답 전에 요청 처리가 끝나면 (오류, 핸들러 취소) 남은 생성도 취소
+            watcher.cancel()
+            _cancel_sequences(sequences)
+        if ticket is not None:
+            ADMISSION.release(ticket)
+        if handle is not None:
+            REGISTRY.release(handle)
 
 if __name__ == "__main__":
     import argparse
@@ -647,14 +972,16 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
-    # 환경 변수 설정
-    os.environ["MODEL_DIR"] = args.model_dir
+    # 환경 변수 설정 (모듈 전역 값은 임포트 시점에 이미 읽었으므로 함께 갱신)
+    os.environ["MODEL_DIR"] = MODEL_DIR = args.model_dir
     if args.model_id:
         os.environ["MODEL_ID"] = args.model_id
+        REGISTRY.default_model = args.model_id
     
     logger.info(f"API 서버 시작: {args.host}:{args.port}")
     logger.info(f"모델 디렉토리: {args.model_dir}")
     if args.model_id:
         logger.info(f"모델 ID: {args.model_id}")
     
+    uvicorn = STARTUP_PROFILE.import_module("uvicorn")
     uvicorn.run(app, host=args.host, port=args.port) 
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+추론 엔진 패키지
+
+이 패키지는 API 계층과 MLX 모델 사이에서 동작하는 추론 관련 구성 요소를 제공합니다.
+"""
+
+from .streaming import AsyncChannel
+from .backend import GenerationRequest, TokenOutput
+from .scheduler import Sequence, BatchScheduler, merge_usage
+from .stop_sequences import StopSequenceMatcher
+from .executor import InferenceExecutor, ExecutorBusyError
+from .admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from .prefix_cache import PrefixCache
+from .session import ModelSession
+from .registry import ModelRegistry, ModelUnavailable
+from .startup import StartupProfiler, STARTUP_PROFILE
+from .model_index import ModelIndex, SafetensorsError, read_safetensors_header, find_weight_files
+from .shard_loader import SafetensorsShard, ShardedSafetensors
+from .conversion import StreamingConverter, convert_model
+from .quantization import GroupQuantizer
+
+__all__ = [
+    'AsyncChannel',
+    'GenerationRequest',
+    'TokenOutput',
+    'Sequence',
+    'BatchScheduler',
+    'merge_usage',
+    'StopSequenceMatcher',
+    'InferenceExecutor',
+    'ExecutorBusyError',
+    'AdmissionController',
+    'AdmissionRejected',
+    'AdmissionTicket',
+    'PrefixCache',
+    'ModelSession',
+    'ModelRegistry',
+    'ModelUnavailable',
+    'StartupProfiler',
+    'STARTUP_PROFILE',
+    'ModelIndex',
+    'SafetensorsError',
+    'read_safetensors_header',
+    'find_weight_files',
+    'SafetensorsShard',
+    'ShardedSafetensors',
+    'StreamingConverter',
+    'convert_model',
+    'GroupQuantizer'
+]
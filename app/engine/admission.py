@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import time
+import uuid
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """
+    요청을 받아들일 수 없을 때 발생하는 예외
+
+    Attributes:
+        status_code (int): 클라이언트에 돌려줄 HTTP 상태 코드 (429 또는 503)
+        retry_after (int): 다시 시도하기까지 권장 대기 시간(초)
+    """
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class AdmissionTicket:
+    """승인된 요청 하나가 점유한 자원"""
+
+    def __init__(self, tokens):
+        self.id = f"gen-{uuid.uuid4().hex[:12]}"
+        self.tokens = tokens
+        self.pixels = 0
+        self.acquired_at = time.monotonic()
+        self.started_at = None
+
+class AdmissionController:
+    """
+    요청 승인 제어기
+
+    대기 중인 요청 수, 처리 중인 요청의 예상 토큰 수, 메모리에 올라간 이미지 픽셀 수를 제한합니다.
+    한도를 넘으면 이미지 디코딩이나 모델 대기 전에 요청을 거절하여 메모리 고갈을 막습니다.
+    - 대기열이 가득 찬 경우: 429 Too Many Requests
+    - 토큰/픽셀 예산이 부족한 경우: 503 Service Unavailable
+
+    처리 중인 요청이 하나도 없으면 예산보다 큰 요청도 단독으로 승인합니다.
+    """
+
+    def __init__(self, max_queue_depth=32, max_inflight_tokens=65536, max_image_pixels=64 * 1024 * 1024, retry_after=2):
+        self.max_queue_depth = max_queue_depth
+        self.max_inflight_tokens = max_inflight_tokens
+        self.max_image_pixels = max_image_pixels
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._tickets = {}
+        self._inflight_tokens = 0
+        self._inflight_pixels = 0
+        self._rejected = {429: 0, 503: 0}
+        self._admitted = 0
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_wait = 0.0
+
+    @classmethod
+    def from_env(cls, environ):
+        """환경 변수에서 한도를 읽어 제어기 생성"""
+        return cls(
+            max_queue_depth=int(environ.get("ADMISSION_MAX_QUEUE_DEPTH", "32")),
+            max_inflight_tokens=int(environ.get("ADMISSION_MAX_INFLIGHT_TOKENS", "65536")),
+            max_image_pixels=int(environ.get("ADMISSION_MAX_IMAGE_PIXELS", str(64 * 1024 * 1024))),
+            retry_after=int(environ.get("ADMISSION_RETRY_AFTER", "2"))
+        )
+
+    @property
+    def queue_depth(self):
+        """승인되었지만 아직 디코딩 배치에 들어가지 못한 요청 수"""
+        with self._lock:
+            return sum(1 for ticket in self._tickets.values() if ticket.started_at is None)
+
+    def _retry_after(self):
+        # 최근 대기 시간을 기준으로 재시도 시간 추정
+        return max(self.retry_after, int(math.ceil(self._recent_wait)))
+
+    def _reject(self, message, status_code):
+        self._rejected[status_code] += 1
+        retry_after = self._retry_after()
+        logger.warning(f"요청 거절 ({status_code}): {message}, {retry_after}초 후 재시도 권장")
+        raise AdmissionRejected(message, status_code, retry_after)
+
+    def acquire(self, tokens):
+        """
+        요청을 승인하고 대기열 자리와 토큰 예산을 점유합니다.
+
+        Args:
+            tokens (int): 요청이 사용할 것으로 예상되는 토큰 수 (프롬프트 + 최대 생성 토큰)
+
+        Returns:
+            AdmissionTicket: 점유한 자원 (완료 후 release 필요)
+
+        Raises:
+            AdmissionRejected: 한도를 넘은 경우
+        """
+        with self._lock:
+            waiting = sum(1 for ticket in self._tickets.values() if ticket.started_at is None)
+            if waiting >= self.max_queue_depth:
+                self._reject(f"대기열이 가득 찼습니다 (대기 {waiting}/{self.max_queue_depth})", 429)
+            if self._tickets and self._inflight_tokens + tokens > self.max_inflight_tokens:
+                self._reject(f"토큰 예산 초과 ({self._inflight_tokens + tokens}/{self.max_inflight_tokens})", 503)
+
+            ticket = AdmissionTicket(tokens)
+            self._tickets[ticket.id] = ticket
+            self._inflight_tokens += tokens
+            self._admitted += 1
+            return ticket
+
+    def reserve_pixels(self, ticket, pixels):
+        """
+        디코딩된 이미지가 차지할 픽셀 예산을 점유합니다.
+
+        이미지를 디코딩하기 전에 상한 추정치(이미지 수 x 최대 픽셀 수)로 호출하고,
+        디코딩 후 settle_pixels로 실제 값에 맞춥니다.
+
+        Raises:
+            AdmissionRejected: 픽셀 예산을 넘은 경우 (티켓은 호출자가 release해야 함)
+        """
+        with self._lock:
+            others = len(self._tickets) > 1
+            if others and self._inflight_pixels + pixels > self.max_image_pixels:
+                self._reject(f"이미지 픽셀 예산 초과 ({self._inflight_pixels + pixels}/{self.max_image_pixels})", 503)
+            ticket.pixels += pixels
+            self._inflight_pixels += pixels
+
+    def settle_pixels(self, ticket, pixels):
+        """
+        점유한 픽셀 예산을 디코딩된 이미지의 실제 픽셀 수로 맞춥니다 (이미 승인된 요청이므로 거절하지 않음).
+
+        Args:
+            ticket (AdmissionTicket): reserve_pixels로 점유한 티켓
+            pixels (int): 디코딩된 이미지 픽셀 수 합계
+        """
+        with self._lock:
+            if ticket.id not in self._tickets:
+                return
+            self._inflight_pixels += pixels - ticket.pixels
+            ticket.pixels = pixels
+
+    def mark_started(self, ticket_id):
+        """요청이 디코딩 배치에 들어간 시점 기록 (워커 스레드에서 호출됨)"""
+        with self._lock:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None or ticket.started_at is not None:
+                return
+            ticket.started_at = time.monotonic()
+            wait = ticket.started_at - ticket.acquired_at
+            self._wait_count += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._recent_wait = 0.8 * self._recent_wait + 0.2 * wait
+
+    def release(self, ticket):
+        """요청이 점유한 자원 반환 (여러 번 호출해도 안전)"""
+        with self._lock:
+            if self._tickets.pop(ticket.id, None) is None:
+                return
+            self._inflight_tokens -= ticket.tokens
+            self._inflight_pixels -= ticket.pixels
+
+    def stats(self):
+        """대기열 깊이와 대기 시간 등 현재 상태"""
+        with self._lock:
+            waiting = sum(1 for ticket in self._tickets.values() if ticket.started_at is None)
+            return {
+                "queue_depth": waiting,
+                "in_flight": len(self._tickets) - waiting,
+                "in_flight_tokens": self._inflight_tokens,
+                "in_flight_image_pixels": self._inflight_pixels,
+                "admitted": self._admitted,
+                "rejected": dict(self._rejected),
+                "wait_seconds_avg": self._wait_total / self._wait_count if self._wait_count else 0.0,
+                "wait_seconds_max": self._wait_max,
+                "limits": {
+                    "max_queue_depth": self.max_queue_depth,
+                    "max_inflight_tokens": self.max_inflight_tokens,
+                    "max_image_pixels": self.max_image_pixels
+                }
+            }
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+스케줄러 백엔드 인터페이스
+
+BatchScheduler는 다음 메서드를 가진 백엔드 객체를 사용합니다.
+
+    prefill(request) -> (state, TokenOutput | None)
+        프롬프트(및 이미지)를 처리하고 시퀀스 상태와 첫 토큰을 반환합니다.
+    decode(states) -> list[TokenOutput | list[TokenOutput | None] | None]
+        실행 중인 모든 시퀀스에 대해 토큰 하나씩을 생성합니다.
+        None은 해당 시퀀스가 EOS에 도달했음을 의미합니다.
+        추측 디코딩처럼 한 번에 여러 토큰을 확정한 시퀀스는 토큰 목록을 반환할 수 있으며,
+        목록 안의 None은 그 위치에서 EOS에 도달했음을 의미합니다.
+    release(state)
+        시퀀스가 끝났을 때 상태(KV 캐시 등)를 해제합니다.
+    fork(state) -> (state, TokenOutput | None) | None   (선택)
+        프리필을 마친 상태를 복제해 같은 프롬프트에서 갈라지는 새 시퀀스를 만들고 그 첫 토큰을 반환합니다.
+        n > 1 요청에서 사용하며, 없거나 None을 반환하면 스케줄러가 프리필을 다시 수행합니다.
+
+시퀀스 상태는 선택적으로 prompt_tokens(프롬프트 토큰 수), image_tokens(그중 이미지 토큰 수),
+cached_tokens(접두사 캐시로 프리필을 건너뛴 토큰 수) 속성을 가질 수 있으며,
+스케줄러는 프리필 직후 이 값을 시퀀스의 토큰 사용량으로 기록합니다.
+
+모든 메서드는 추론 실행기의 워커 스레드에서만 호출됩니다.
+"""
+
+import uuid
+from collections import namedtuple
+
+# 디코딩된 토큰 하나 (token: 토큰 ID, text: 이번 토큰으로 새로 확정된 텍스트 조각)
+TokenOutput = namedtuple("TokenOutput", ["token", "text"])
+
+# 요청에서 생략되거나 null로 온 샘플링 매개변수의 기본값
+DEFAULT_MAX_TOKENS = 800
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_TOP_P = 0.95
+
+class GenerationRequest:
+    """
+    생성 요청
+
+    채팅 템플릿이 적용된 프롬프트와 이미지, 샘플링 매개변수를 담습니다.
+    speculation은 추측 디코딩 방식(draft, prompt_lookup, off)이며 None이면 백엔드 기본값을 사용합니다.
+    n은 같은 프롬프트에서 샘플링할 응답 수, stop은 나타나면 생성을 끝낼 중단 문자열 목록입니다.
+    """
+
+    def __init__(self, prompt, images=None, max_tokens=DEFAULT_MAX_TOKENS, temperature=DEFAULT_TEMPERATURE,
+                 top_p=DEFAULT_TOP_P, request_id=None,
+                 speculation=None, n=1, stop=None):
+        self.prompt = prompt
+        self.images = images or []
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.speculation = speculation
+        self.n = max(1, n)
+        self.stop = [stop] if isinstance(stop, str) else list(stop or [])
+        self.request_id = request_id or f"gen-{uuid.uuid4().hex[:12]}"
+
+    @classmethod
+    def from_chat_request(cls, request, prompt, images=None, request_id=None):
+        """ChatCompletionRequest의 샘플링 매개변수로 생성 요청 구성"""
+        return cls(
+            prompt,
+            images=images,
+            request_id=request_id,
+            max_tokens=request.max_tokens if request.max_tokens is not None else DEFAULT_MAX_TOKENS,
+            temperature=request.temperature if request.temperature is not None else DEFAULT_TEMPERATURE,
+            top_p=request.top_p if request.top_p is not None else DEFAULT_TOP_P,
+            speculation=getattr(request, "speculative", None),
+            n=request.n or 1,
+            stop=request.stop
+        )
@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .model_index import DTYPE_BITS, SHARD_INDEX_FILE, find_weight_files
+from .shard_loader import ShardedSafetensors
+
+logger = logging.getLogger(__name__)
+
+# 변환 진행 상황 기록 파일 (완료된 출력 샤드 목록, 중단 후 이어서 변환할 때 사용)
+STATE_FILE = ".conversion_state.json"
+# 양자화 오차 보고서 (텐서별, 이어서 변환하면 이전 실행의 결과와 합침)
+REPORT_FILE = "quantization_report.json"
+# 출력 샤드 하나의 최대 크기
+DEFAULT_SHARD_BYTES = 5 * 1024 ** 3
+# 출력 디렉토리로 복사하지 않는 파일 (가중치는 변환해서 새로 씀)
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".gguf", ".partial")
+SKIP_FILES = (SHARD_INDEX_FILE, "pytorch_model.bin.index.json", STATE_FILE)
+# 변환하지 않고 버리는 텐서 (로드할 때 다시 계산됨)
+SKIP_TENSOR_SUFFIXES = ("position_ids", "rotary_emb.inv_freq")
+# --dtype 옵션 이름 -> safetensors 자료형
+DTYPE_NAMES = {"float16": "F16", "bfloat16": "BF16", "float32": "F32"}
+FLOAT_DTYPES = ("F16", "BF16", "F32", "F64")
+
+# 출력 텐서 하나 (source: 원본 텐서 이름)
+OutputTensor = namedtuple("OutputTensor", ["name", "dtype", "shape", "nbytes"])
+# 원본 텐서 하나에서 나오는 출력 텐서 묶음 (양자화하면 weight/scales/biases 세 개)
+TensorTask = namedtuple("TensorTask", ["source", "outputs", "transpose", "dtype"])
+
+def mlx_tensor_name(name):
+    """
+    HF Qwen2.5-VL 텐서 이름을 mlx_vlm 모델의 이름으로 바꿉니다 (mlx_vlm sanitize와 같은 규칙).
+
+    구버전(model.*, visual.*)과 신버전(model.language_model.*, model.visual.*) transformers 이름을 모두 처리합니다.
+    """
+    for prefix, replacement in (
+        ("model.visual.", "vision_tower."),
+        ("visual.", "vision_tower."),
+        ("model.language_model.", "language_model.model."),
+        ("model.", "language_model.model."),
+        ("lm_head.", "language_model.lm_head."),
+    ):
+        if name.startswith(prefix):
+            return replacement + name[len(prefix):]
+    return name
+
+def _needs_transpose(name, shape):
+    """PyTorch 합성곱 가중치([out, in, (t,) h, w])를 MLX 배치([out, (t,) h, w, in])로 바꿔야 하는지"""
+    return name.endswith(".weight") and len(shape) in (4, 5) and shape[-1] == shape[-2] and shape[1] != shape[-1]
+
+def _numpy_dtype(dtype):
+    import numpy as np
+    return {
+        "F64": np.float64, "F32": np.float32, "F16": np.float16, "BF16": np.uint16,
+        "I64": np.int64, "I32": np.int32, "I16": np.int16, "I8": np.int8,
+        "U64": np.uint64, "U32": np.uint32, "U16": np.uint16, "U8": np.uint8, "BOOL": np.bool_
+    }[dtype]
+
+def to_float32(array, dtype):
+    """safetensors 자료형의 배열을 float32로 (BF16은 uint16 원본 비트로 전달)"""
+    import numpy as np
+    if dtype == "BF16":
+        return (array.astype(np.uint32) << 16).view(np.float32)
+    return array.astype(np.float32)
+
+def from_float32(array, dtype):
+    """float32 배열을 safetensors 자료형으로 (BF16은 최근접 짝수 반올림 후 uint16 비트로 반환)"""
+    import numpy as np
+    if dtype == "BF16":
+        bits = np.ascontiguousarray(array, dtype=np.float32).view(np.uint32)
+        return ((bits + 0x7FFF + ((bits >> 16) & 1)) >> 16).astype(np.uint16)
+    return array.astype(_numpy_dtype(dtype))
+
+def load_array(view, dtype, shape):
+    """메모리 매핑된 텐서 바이트를 복사 없이 NumPy 배열로"""
+    import numpy as np
+    return np.frombuffer(view, dtype=_numpy_dtype(dtype)).reshape(shape)
+
+class StreamingConverter:
+    """
+    HF safetensors 모델을 MLX 형식으로 변환하는 스트리밍 변환기
+
+    - 입력 샤드를 메모리 매핑하고 텐서 하나씩 변환하므로 모델 전체를 메모리에 올리지 않습니다.
+      작업자마다 변환 중인 텐서 하나만 메모리에 있습니다.
+    - 출력 샤드의 구성(텐서 배치, 헤더)을 미리 계획하고, 샤드들을 스레드 풀에서 동시에 씁니다.
+    - 샤드가 끝날 때마다 진행 상황을 기록하므로, 중단된 변환을 다시 실행하면 끝난 샤드는 건너뜁니다.
+
+    Args:
+        input_path (str): HF 모델 디렉토리
+        output_path (str): MLX 모델을 저장할 디렉토리
+        dtype (str, optional): 부동소수점 가중치의 출력 자료형 (float16, bfloat16, float32). None이면 유지
+        quantizer (optional): plan(name, dtype, shape)/apply(name, array, dtype)/config()를 가진 양자화기
+            (report()가 있으면 텐서별 오차를 quantization_report.json으로 기록, 예: GroupQuantizer)
+        max_shard_bytes (int): 출력 샤드 하나의 최대 크기
+        max_workers (int): 동시에 쓰는 출력 샤드 수
+
+    Raises:
+        ValueError: 출력 디렉토리가 입력 디렉토리와 같거나 그 안에 있는 경우
+    """
+
+    def __init__(self, input_path, output_path, dtype=None, quantizer=None, max_shard_bytes=DEFAULT_SHARD_BYTES,
+                 max_workers=4):
+        if dtype is not None and dtype not in DTYPE_NAMES:
+            raise ValueError(f"지원하지 않는 자료형입니다: {dtype} (가능: {', '.join(DTYPE_NAMES)})")
+        self.input_path = os.path.abspath(input_path)
+        self.output_path = os.path.abspath(output_path)
+        # 변환은 출력 디렉토리의 이전 가중치를 지우므로 원본 샤드를 지우지 않도록 막음
+        source = os.path.realpath(self.input_path)
+        target = os.path.realpath(self.output_path)
+        if target == source or target.startswith(source.rstrip(os.sep) + os.sep):
+            raise ValueError(f"출력 디렉토리는 입력 디렉토리와 같거나 그 안에 있을 수 없습니다: {self.output_path}")
+        self.dtype = DTYPE_NAMES.get(dtype)
+        self.quantizer = quantizer
+        self.max_shard_bytes = max_shard_bytes
+        self.max_workers = max_workers
+        self._state_lock = threading.Lock()
+
+    def plan(self, weights):
+        """
+        출력 샤드 구성
+
+        원본 순서대로 텐서를 샤드에 채워 넣어 입력 파일을 거의 순차적으로 읽도록 합니다.
+
+        Returns:
+            list: 샤드별 TensorTask 목록
+        """
+        tasks = []
+        for path in weights.paths:
+            shard = weights.shard(os.path.basename(path))
+            for info in sorted(shard.tensors.values(), key=lambda t: t.offset):
+                task = self._plan_tensor(info)
+                if task is not None:
+                    tasks.append(task)
+
+        shards, current, current_bytes = [], [], 0
+        for task in tasks:
+            nbytes = sum(output.nbytes for output in task.outputs)
+            if current and current_bytes + nbytes > self.max_shard_bytes:
+                shards.append(current)
+                current, current_bytes = [], 0
+            current.append(task)
+            current_bytes += nbytes
+        if current:
+            shards.append(current)
+        return shards
+
+    def _plan_tensor(self, info):
+        if info.name.endswith(SKIP_TENSOR_SUFFIXES):
+            return None
+        name = mlx_tensor_name(info.name)
+        shape = info.shape
+        transpose = None
+        if _needs_transpose(name, shape):
+            transpose = (0,) + tuple(range(2, len(shape))) + (1,)
+            shape = tuple(shape[i] for i in transpose)
+        dtype = self.dtype if self.dtype is not None and info.dtype in FLOAT_DTYPES else info.dtype
+
+        if self.quantizer is not None:
+            outputs = [OutputTensor(n, d, tuple(s), _nbytes(d, s)) for n, d, s in self.quantizer.plan(name, dtype, shape)]
+        else:
+            outputs = [OutputTensor(name, dtype, shape, _nbytes(dtype, shape))]
+        return TensorTask(info, outputs, transpose, dtype)
+
+    def run(self, resume=True):
+        """
+        변환을 실행합니다.
+
+        Args:
+            resume (bool): 이전에 중단된 같은 설정의 변환이 있으면 끝난 샤드를 건너뜀
+
+        Returns:
+            dict: shards, skipped, bytes, seconds, report(양자화했을 때 텐서별 오차)
+        """
+        started = time.perf_counter()
+        os.makedirs(self.output_path, exist_ok=True)
+        with ShardedSafetensors(self.input_path) as weights:
+            # 작업자들이 동시에 샤드를 열지 않도록 미리 메모리 매핑만 해 둠
+            weights.load(max_workers=self.max_workers, read=False)
+            shards = self.plan(weights)
+            names = _shard_names(len(shards))
+            state = self._load_state(weights, names, resume)
+
+            pending = [(name, tasks) for name, tasks in zip(names, shards) if not self._is_done(state, name)]
+            skipped = len(shards) - len(pending)
+            if skipped:
+                logger.info(f"이전 변환에서 완료된 샤드 {skipped}개를 건너뜁니다")
+            logger.info(
+                f"변환 시작: {self.input_path} -> {self.output_path} "
+                f"(출력 샤드 {len(shards)}개, 작업 {len(pending)}개, 작업자 {self.max_workers}개)"
+            )
+
+            workers = max(1, min(self.max_workers, len(pending) or 1))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="convert") as pool:
+                futures = [pool.submit(self._write_shard, weights, name, tasks, state) for name, tasks in pending]
+                written = sum(future.result() for future in futures)
+
+        weight_map = {output.name: name for name, tasks in zip(names, shards) for task in tasks for output in task.outputs}
+        total_size = sum(output.nbytes for tasks in shards for task in tasks for output in task.outputs)
+        index_path = os.path.join(self.output_path, SHARD_INDEX_FILE)
+        if len(names) > 1:
+            _write_json(index_path, {"metadata": {"total_size": total_size}, "weight_map": weight_map})
+        elif os.path.exists(index_path):
+            os.remove(index_path)
+        self._copy_support_files()
+        report = self._write_report()
+
+        state["complete"] = True
+        self._save_state(state)
+        seconds = time.perf_counter() - started
+        logger.info(
+            f"변환 완료: {total_size / 1024 ** 3:.2f}GiB, {seconds:.1f}초 "
+            f"(이번 실행에서 {written / 1024 ** 3:.2f}GiB 기록)"
+        )
+        stats = {"shards": len(shards), "skipped": skipped, "bytes": written, "seconds": seconds}
+        if report is not None:
+            stats["report"] = report
+        return stats
+
+    def _write_shard(self, weights, name, tasks, state):
+        """출력 샤드 하나를 임시 파일에 쓴 뒤 이름을 바꿈 (중단되어도 완성된 샤드만 남음)"""
+        started = time.perf_counter()
+        header = {"__metadata__": {"format": "mlx"}}
+        offset = 0
+        for task in tasks:
+            for output in task.outputs:
+                header[output.name] = {
+                    "dtype": output.dtype, "shape": list(output.shape), "data_offsets": [offset, offset + output.nbytes]
+                }
+                offset += output.nbytes
+        raw = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        # 텐서 데이터가 8바이트 경계에서 시작하도록 헤더를 공백으로 채움
+        raw += b" " * (-len(raw) % 8)
+
+        path = os.path.join(self.output_path, name)
+        partial = path + ".partial"
+        with open(partial, "wb") as f:
+            f.write(len(raw).to_bytes(8, "little"))
+            f.write(raw)
+            for task in tasks:
+                for output, data in zip(task.outputs, self._convert(weights, task)):
+                    data = _as_bytes(data)
+                    if data.nbytes != output.nbytes:
+                        raise ValueError(f"{output.name}: 변환 결과 크기 {data.nbytes}바이트, 예상 {output.nbytes}바이트")
+                    f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+
+        size = os.path.getsize(path)
+        with self._state_lock:
+            state["completed"][name] = {"bytes": size}
+            self._save_state(state)
+        seconds = time.perf_counter() - started
+        logger.info(f"샤드 완료: {name} ({size / 1024 ** 2:.0f}MB, {seconds:.1f}초, "
+                    f"{size / 1024 ** 2 / max(seconds, 1e-9):.0f}MB/s)")
+        return size
+
+    def _convert(self, weights, task):
+        """원본 텐서 하나를 변환해 출력 텐서 데이터 목록으로 (변환할 것이 없으면 복사 없이 그대로 전달)"""
+        info = task.source
+        view = weights.shard(info.file).tensor(info.name)
+        if task.transpose is None and task.dtype == info.dtype and self.quantizer is None:
+            return [view]
+
+        array = load_array(view, info.dtype, info.shape)
+        if task.transpose is not None:
+            array = array.transpose(task.transpose)
+        if task.dtype != info.dtype:
+            array = from_float32(to_float32(array, info.dtype), task.dtype)
+        if self.quantizer is not None:
+            return self.quantizer.apply(task.outputs[0].name, array, task.dtype)
+        return [array]
+
+    def _source_signature(self, weights):
+        files = []
+        for path in weights.paths:
+            stat = os.stat(path)
+            files.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        options = {"dtype": self.dtype, "max_shard_bytes": self.max_shard_bytes}
+        if self.quantizer is not None:
+            options["quantization"] = self.quantizer.config()
+        return {"files": files, "options": options}
+
+    def _load_state(self, weights, names, resume):
+        """
+        진행 상황 불러오기 (같은 설정의 이전 변환이 있으면 이어서, 없으면 처음부터)
+
+        처음부터 다시 변환할 때는 이전 변환이 기록해 둔 파일만 지웁니다. 기록이 없는 디렉토리에 파일이
+        있으면 다른 모델(원본, 다른 도구로 변환한 모델 등)일 수 있으므로 아무것도 지우지 않고 중단합니다.
+
+        Raises:
+            FileExistsError: 출력 디렉토리가 비어 있지 않은데 이전 변환 기록이 없는 경우
+        """
+        signature = self._source_signature(weights)
+        previous = None
+        try:
+            with open(os.path.join(self.output_path, STATE_FILE), "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = None
+        if resume and previous is not None and previous.get("source") == signature:
+            return previous
+
+        if previous is None:
+            if os.listdir(self.output_path):
+                raise FileExistsError(
+                    f"출력 디렉토리가 비어 있지 않고 이전 변환 기록({STATE_FILE})이 없습니다: {self.output_path} "
+                    f"(빈 디렉토리나 새 경로를 지정하세요)"
+                )
+        else:
+            # 이전 실행이 쓴 가중치 파일은 샤드 구성이 다를 수 있으므로 지움 (기록된 파일만)
+            for name in previous.get("files", list(previous.get("completed", {}))):
+                for path in (name, name + ".partial"):
+                    path = os.path.join(self.output_path, os.path.basename(path))
+                    if os.path.isfile(path):
+                        os.remove(path)
+        files = list(names) + ([REPORT_FILE] if self.quantizer is not None else [])
+        state = {"source": signature, "files": files, "completed": {}, "complete": False}
+        self._save_state(state)
+        return state
+
+    def _is_done(self, state, name):
+        done = state["completed"].get(name)
+        path = os.path.join(self.output_path, name)
+        return done is not None and os.path.exists(path) and os.path.getsize(path) == done["bytes"]
+
+    def _save_state(self, state):
+        _write_json(os.path.join(self.output_path, STATE_FILE), state)
+
+    def _write_report(self):
+        """양자화기의 텐서별 오차 보고서를 출력 디렉토리에 기록 (양자화하지 않으면 None)"""
+        if self.quantizer is None or not hasattr(self.quantizer, "report"):
+            return None
+        path = os.path.join(self.output_path, REPORT_FILE)
+        report = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            pass
+        report.update(self.quantizer.report())
+        _write_json(path, report, indent=2)
+        return report
+
+    def _copy_support_files(self):
+        """설정/토크나이저/프로세서 파일 복사 (양자화하면 config.json에 양자화 설정 추가)"""
+        for entry in os.scandir(self.input_path):
+            if not entry.is_file() or entry.name.endswith(WEIGHT_SUFFIXES) or entry.name in SKIP_FILES:
+                continue
+            target = os.path.join(self.output_path, entry.name)
+            if entry.name == "config.json":
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+                if self.quantizer is not None:
+                    config["quantization"] = self.quantizer.config()
+                _write_json(target, config, indent=4)
+            else:
+                shutil.copyfile(entry.path, target)
+
+def _nbytes(dtype, shape):
+    numel = 1
+    for dim in shape:
+        numel *= dim
+    return numel * DTYPE_BITS[dtype] // 8
+
+def _as_bytes(data):
+    """memoryview 또는 NumPy 배열을 파일에 쓸 수 있는 바이트 뷰로 (배열은 연속 메모리로만 바꿈)"""
+    if isinstance(data, memoryview):
+        return data.cast("B") if data.format != "B" else data
+    import numpy as np
+    return memoryview(np.ascontiguousarray(data)).cast("B")
+
+def _shard_names(count):
+    if count == 1:
+        return ["model.safetensors"]
+    return [f"model-{i:05d}-of-{count:05d}.safetensors" for i in range(1, count + 1)]
+
+def _write_json(path, data, indent=None):
+    """임시 파일에 쓴 뒤 이름을 바꿔 중간에 중단되어도 이전 내용이 남도록 함"""
+    partial = path + ".tmp"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(partial, path)
+
+def convert_model(input_path, output_path, dtype=None, quantizer=None, max_shard_bytes=DEFAULT_SHARD_BYTES,
+                  max_workers=4, resume=True):
+    """
+    HF 모델 디렉토리를 MLX 형식으로 변환합니다 (StreamingConverter 사용).
+
+    Returns:
+        dict: 변환 통계
+    """
+    paths, _, errors = find_weight_files(input_path)
+    if errors or not paths:
+        raise FileNotFoundError(f"입력 가중치를 찾을 수 없습니다: {input_path} ({'; '.join(errors) or '*.safetensors 없음'})")
+    converter = StreamingConverter(input_path, output_path, dtype=dtype, quantizer=quantizer,
+                                   max_shard_bytes=max_shard_bytes, max_workers=max_workers)
+    return converter.run(resume=resume)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from .streaming import AsyncChannel
+from .scheduler import Sequence
+
+logger = logging.getLogger(__name__)
+
+class ExecutorBusyError(RuntimeError):
+    """추론 작업 대기열이 가득 찼을 때 발생하는 예외"""
+
+class InferenceExecutor:
+    """
+    추론 전용 실행기
+
+    모델과 프로세서를 소유하는 전용 워커 스레드 하나가 제한된 크기의 대기열에서 작업을 꺼내
+    순서대로 실행합니다. 이벤트 루프는 작업 완료를 기다리기만 하므로,
+    긴 생성이 진행 중이어도 다른 HTTP 요청(상태 확인 등)은 계속 응답할 수 있습니다.
+
+    스케줄러가 연결되면 워커 스레드는 대기열의 작업을 처리하는 사이사이에
+    스케줄러를 한 토큰씩 진행시킵니다.
+    """
+
+    def __init__(self, max_queue_size=32, name="inference-worker"):
+        self.name = name
+        self.max_queue_size = max_queue_size
+        self.model = None
+        self.processor = None
+        self.scheduler = None
+        self._jobs = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def queue_depth(self):
+        """실행을 기다리는 작업 수"""
+        return self._jobs.qsize()
+
+    @property
+    def is_running(self):
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """워커 스레드 시작 (이미 실행 중이면 무시)"""
+        with self._lock:
+            if self.is_running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+            self._thread.start()
+            logger.info(f"추론 실행기 시작: 대기열 크기 {self.max_queue_size}")
+
+    def shutdown(self, timeout=None):
+        """대기 중인 작업을 마친 뒤 워커 스레드 종료"""
+        with self._lock:
+            if not self.is_running:
+                return
+            self._running = False
+            self._jobs.put(None)
+            thread = self._thread
+        thread.join(timeout)
+        logger.info("추론 실행기 종료")
+
+    def attach_scheduler(self, scheduler):
+        """배치 스케줄러 연결 (generate 호출 전에 필요)"""
+        self.scheduler = scheduler
+
+    def _worker(self):
+        while True:
+            # 진행 중인 시퀀스가 있으면 작업을 기다리지 않고 디코딩을 계속함
+            busy = self.scheduler is not None and self.scheduler.has_work()
+            try:
+                job = self._jobs.get(block=not busy)
+            except queue.Empty:
+                job = False
+            
+            while job is not False:
+                if job is None:
+                    return
+                self._run_job(job)
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    job = False
+            
+            if self.scheduler is not None and self.scheduler.has_work():
+                try:
+                    self.scheduler.step()
+                except Exception as e:
+                    logger.error(f"스케줄러 실행 오류: {e}")
+
+    def _run_job(self, job):
+        future, fn, args, kwargs = job
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        워커 스레드에서 실행할 작업을 대기열에 추가합니다.
+
+        Args:
+            fn (callable): 실행할 함수
+
+        Returns:
+            concurrent.futures.Future: 작업 결과
+
+        Raises:
+            ExecutorBusyError: 대기열이 가득 찬 경우
+        """
+        self.start()
+        future = Future()
+        try:
+            self._jobs.put_nowait((future, fn, args, kwargs))
+        except queue.Full:
+            raise ExecutorBusyError(f"추론 대기열이 가득 찼습니다 (최대 {self.max_queue_size}개)")
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """작업을 워커 스레드에서 실행하고 결과를 비동기로 기다림"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def generate(self, request):
+        """
+        생성 요청을 배치 스케줄러에 제출합니다. 이벤트 루프 스레드에서 호출해야 합니다.
+
+        Args:
+            request (GenerationRequest): 생성 요청
+
+        Returns:
+            Sequence: 생성 결과를 비동기로 읽을 수 있는 시퀀스
+                      (request.n > 1이면 나머지 n - 1개는 seq.forks)
+
+        Raises:
+            ExecutorBusyError: 대기열이 가득 찬 경우
+        """
+        if self.scheduler is None:
+            raise RuntimeError("배치 스케줄러가 연결되지 않았습니다")
+        seq = Sequence(request, AsyncChannel())
+        seq.forks = [Sequence(request, AsyncChannel(), index=i) for i in range(1, request.n)]
+        self.submit(self.scheduler.add, seq)
+        return seq
@@ -0,0 +1,760 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+
+from .backend import TokenOutput
+from .speculative import (
+    AdaptiveDraftLength, PromptLookupProposer, SpeculationStats, accept_greedy, DEFAULT_DRAFT_TOKENS, MAX_DRAFT_TOKENS
+)
+
+logger = logging.getLogger(__name__)
+
+# mlx/mlx_vlm은 임포트에 수 초가 걸리므로 첫 백엔드 생성 시점까지 미룸 (_import_mlx)
+generate = None
+stream_generate = None
+# 토큰 단위 디코딩 루프에 필요한 저수준 API (없으면 stream_generate 경로만 사용)
+mx = None
+prepare_inputs = None
+make_prompt_cache = None
+top_p_sampling = None
+_IMPORTED = False
+
+def _import_mlx():
+    """mlx_vlm 생성 API를 한 번만 임포트 (설치되지 않은 항목은 None으로 남김)"""
+    global generate, stream_generate, mx, prepare_inputs, make_prompt_cache, top_p_sampling, _IMPORTED
+    if _IMPORTED:
+        return
+    try:
+        from mlx_vlm import generate
+        try:
+            from mlx_vlm import stream_generate
+        except ImportError:
+            from mlx_vlm.utils import stream_generate
+    except ImportError:
+        generate = None
+        stream_generate = None
+
+    try:
+        import mlx.core as mx
+        from mlx_vlm.utils import prepare_inputs
+        try:
+            from mlx_vlm.models.cache import make_prompt_cache
+        except ImportError:
+            from mlx_lm.models.cache import make_prompt_cache
+    except ImportError:
+        mx = None
+        prepare_inputs = None
+        make_prompt_cache = None
+
+    try:
+        from mlx_vlm.sample_utils import top_p_sampling
+    except ImportError:
+        top_p_sampling = None
+    _IMPORTED = True
+
+class _IncrementalDetokenizer:
+    """
+    토큰을 하나씩 받아 새로 확정된 텍스트 조각을 돌려주는 디토크나이저
+
+    멀티바이트 문자가 여러 토큰에 걸쳐 있으면 문자가 완성될 때까지 출력을 미룹니다.
+    줄바꿈마다 디코딩 구간을 새로 시작하여 긴 응답에서도 디코딩 비용이 커지지 않게 합니다.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.tokens = []
+        self.emitted = 0
+
+    def add(self, token):
+        self.tokens.append(token)
+        text = self.tokenizer.decode(self.tokens, skip_special_tokens=True)
+        if text.endswith("�"):
+            return ""
+        piece = text[self.emitted:]
+        if text.endswith("\n"):
+            self.tokens = []
+            self.emitted = 0
+        else:
+            self.emitted = len(text)
+        return piece
+
+class _CachingVisionTower:
+    """
+    비전 인코더 출력 캐시 래퍼
+
+    모델의 vision_tower 속성을 대신하며, 백엔드가 key를 설정한 호출에 한해 같은 이미지 묶음의
+    인코더 출력을 캐시에서 돌려줍니다. 원래 인코더는 모델의 매개변수 트리에 그대로 남아 있습니다.
+    """
+
+    def __init__(self, tower, cache):
+        self.tower = tower
+        self.cache = cache
+        self.key = None
+
+    def __call__(self, *args, **kwargs):
+        key = self.key
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        output = self.tower(*args, **kwargs)
+        if key is not None:
+            self.cache.put(key, output, _nbytes(output))
+        return output
+
+    def __getattr__(self, name):
+        return getattr(self.tower, name)
+
+class _CacheState:
+    """토큰 단위 디코딩 루프를 사용하는 시퀀스 상태"""
+
+    def __init__(self, request, key, cache, detokenizer):
+        self.request = request
+        self.key = key
+        self.cache = cache
+        self.detokenizer = detokenizer
+        self.fed = []
+        self.next_token = None
+        self.rope_deltas = None
+        # 지금까지 확정한 출력 토큰 수 (추측 디코딩의 초안 길이를 max_tokens 안으로 제한)
+        self.generated = 0
+        # 초안 모델 상태 (추측 디코딩을 사용하지 않으면 None)
+        self.draft = None
+        # 프롬프트 n-gram 조회 제안기 (prompt_lookup 방식이 아니면 None)
+        self.lookup = None
+        # 프롬프트 토큰 ID와 프리필 마지막 위치의 로짓 (n > 1 요청에서 상태를 복제할 때 사용)
+        self.prompt_ids = None
+        self.logits = None
+        # 토큰 사용량 (프롬프트 전체, 그중 이미지 토큰, 접두사 캐시로 건너뛴 토큰)
+        self.prompt_tokens = 0
+        self.image_tokens = 0
+        self.cached_tokens = 0
+
+class _DraftState:
+    """
+    시퀀스별 초안 모델 상태
+
+    pending은 확정되었지만 아직 초안 모델 KV 캐시에 들어가지 않은 토큰입니다
+    (다음 초안을 만들 때 대상 모델의 next_token과 함께 먼저 처리됨).
+    """
+
+    def __init__(self, cache, rope_deltas, length):
+        self.cache = cache
+        self.rope_deltas = rope_deltas
+        self.length = length
+        self.pending = []
+
+class _GeneratorState:
+    """stream_generate 제너레이터를 사용하는 시퀀스 상태"""
+
+    def __init__(self, generator=None):
+        self.generator = generator
+        self.rope_deltas = None
+        self.prompt_tokens = 0
+        self.image_tokens = 0
+        self.cached_tokens = 0
+
+class MLXBackend:
+    """
+    mlx_vlm 모델을 배치 스케줄러 백엔드 인터페이스로 감싼 클래스
+
+    mlx_vlm의 저수준 API를 사용할 수 있으면 시퀀스마다 KV 캐시를 직접 관리하는 토큰 단위
+    디코딩 루프를 사용합니다. 이 경우 끝난 시퀀스의 KV 캐시를 접두사 캐시(PrefixCache)에 저장해 두고,
+    다음 요청의 프롬프트가 같은 접두사로 시작하면 그 부분의 프리필(비전 인코더 포함)을 건너뜁니다.
+    저수준 API가 없으면 각 시퀀스의 stream_generate 제너레이터를 토큰 하나씩 번갈아 진행합니다.
+
+    mlx_vlm은 KV 캐시가 서로 다른 시퀀스들을 한 번의 forward로 디코딩하는 API를 제공하지 않으므로,
+    decode()는 시퀀스를 하나씩 진행합니다. 배치 전체가 decode()로 전달되므로
+    묶음 forward 구현으로 교체할 수 있습니다.
+
+    draft_model(같은 토크나이저를 쓰는 작은 Qwen2.5-VL)이 주어지면 추측 디코딩을 사용합니다.
+    초안 모델이 k개 토큰을 제안하고 대상 모델이 한 번의 forward로 검증하며, 탐욕적 디코딩에서는
+    대상 모델만으로 생성한 결과와 같은 토큰을, 샘플링에서는 같은 분포의 토큰을 생성합니다.
+    초안 모델 없이 프롬프트와 앞선 출력에서 n-gram을 찾아 초안을 만드는 방식(prompt_lookup)도
+    같은 검증 경로를 사용하며, 요청마다 방식을 고를 수 있습니다(GenerationRequest.speculation).
+    """
+
+    def __init__(self, model, processor, prefix_cache=None, vision_cache=None, stop_token_ids=None,
+                 draft_model=None, num_draft_tokens=DEFAULT_DRAFT_TOKENS, max_draft_tokens=MAX_DRAFT_TOKENS,
+                 adaptive_draft=True, default_speculation=None, lookup_max_ngram=3, lookup_num_tokens=10,
+                 lookup_min_acceptance=0.3):
+        _import_mlx()
+        self.model = model
+        self.processor = processor
+        self.draft_model = draft_model
+        self.num_draft_tokens = num_draft_tokens
+        self.max_draft_tokens = max_draft_tokens
+        self.adaptive_draft = adaptive_draft
+        # 요청이 방식을 지정하지 않았을 때 사용할 추측 디코딩 방식 (draft, prompt_lookup, off)
+        if default_speculation is None:
+            default_speculation = "draft" if draft_model is not None else "off"
+        self.default_speculation = default_speculation
+        self.lookup_max_ngram = lookup_max_ngram
+        self.lookup_num_tokens = lookup_num_tokens
+        self.lookup_min_acceptance = lookup_min_acceptance
+        self.speculation = SpeculationStats()
+        self.prefix_cache = prefix_cache
+        self.vision_tower = None
+        if vision_cache is not None and getattr(model, "vision_tower", None) is not None:
+            # 인스턴스 속성으로 설정하여 매개변수 트리(dict 항목)는 건드리지 않음
+            self.vision_tower = _CachingVisionTower(model.vision_tower, vision_cache)
+            object.__setattr__(model, "vision_tower", self.vision_tower)
+        self.tokenizer = getattr(processor, "tokenizer", processor)
+        self.image_token_index = self._find_image_token_index()
+        # 모델 세션이 미리 계산한 중단 토큰이 있으면 그대로 사용
+        self.eos_token_ids = set(stop_token_ids) if stop_token_ids else self._find_eos_token_ids()
+        self.low_level = mx is not None and prepare_inputs is not None and make_prompt_cache is not None
+
+    def _find_image_token_index(self):
+        config = getattr(self.model, "config", None)
+        for name in ("image_token_index", "image_token_id"):
+            value = getattr(config, name, None)
+            if value is not None:
+                return value
+        return None
+
+    def _find_eos_token_ids(self):
+        ids = set()
+        eos = getattr(self.tokenizer, "eos_token_id", None)
+        if eos is not None:
+            ids.add(eos)
+        config_eos = getattr(getattr(self.model, "config", None), "eos_token_id", None)
+        if isinstance(config_eos, int):
+            ids.add(config_eos)
+        elif isinstance(config_eos, (list, tuple)):
+            ids.update(config_eos)
+        # Qwen 계열 채팅 템플릿의 턴 종료 토큰
+        try:
+            im_end = self.tokenizer.convert_tokens_to_ids("<|im_end|>")
+            if isinstance(im_end, int) and im_end >= 0:
+                ids.add(im_end)
+        except Exception:
+            pass
+        return ids
+
+    # --- 모델 내부 상태 ---
+
+    def _language_model(self, model=None):
+        model = self.model if model is None else model
+        return getattr(model, "language_model", model)
+
+    def _restore_model_state(self, state):
+        # Qwen2.5-VL은 M-RoPE 위치 보정값을 모델 객체에 저장하므로 시퀀스를 번갈아 진행할 때 교체해야 함
+        lm = self._language_model()
+        if hasattr(lm, "_rope_deltas"):
+            lm._rope_deltas = state.rope_deltas
+
+    def _save_model_state(self, state):
+        lm = self._language_model()
+        if hasattr(lm, "_rope_deltas"):
+            state.rope_deltas = lm._rope_deltas
+
+    @contextmanager
+    def _vision_cache_key(self, images):
+        """이 구간의 비전 인코더 호출에 이미지 묶음의 내용 키를 사용"""
+        if self.vision_tower is None or not images:
+            yield
+            return
+        self.vision_tower.key = ("vision",) + tuple(_image_digest(image) for image in images)
+        try:
+            yield
+        finally:
+            self.vision_tower.key = None
+
+    # --- 스케줄러 인터페이스 ---
+
+    def prefill(self, request):
+        if self.low_level:
+            try:
+                return self._prefill_cached(request)
+            except (AttributeError, TypeError, KeyError) as e:
+                # 설치된 mlx_vlm 버전의 내부 API가 다른 경우
+                logger.warning(f"토큰 단위 디코딩 루프 사용 불가, stream_generate로 전환: {e}")
+                self.low_level = False
+
+        state = _GeneratorState()
+        state.generator = self._iter_tokens(request, state)
+        with self._vision_cache_key(request.images):
+            return state, self._next_generated(state)
+
+    def decode(self, states):
+        outputs = []
+        for state in states:
+            if isinstance(state, _GeneratorState):
+                outputs.append(self._next_generated(state))
+            elif state.draft is not None:
+                outputs.append(self._step_speculative(state))
+            elif state.lookup is not None:
+                outputs.append(self._step_prompt_lookup(state))
+            else:
+                outputs.append(self._step_cached(state))
+        return outputs
+
+    def release(self, state):
+        if isinstance(state, _GeneratorState):
+            state.generator.close()
+        elif isinstance(state, _CacheState):
+            self._store_prefix(state)
+            state.cache = None
+            state.draft = None
+            state.lookup = None
+            state.logits = None
+
+    def fork(self, state):
+        """
+        프리필을 마친 시퀀스의 KV 캐시를 복제해 같은 프롬프트에서 새 시퀀스 시작 (n > 1 요청)
+
+        첫 토큰은 원래 시퀀스와 같은 프리필 로짓에서 따로 샘플링합니다. 복제할 수 없는 상태
+        (stream_generate 경로, 회전/양자화 캐시)면 None을 반환해 스케줄러가 다시 프리필하게 합니다.
+        """
+        if not isinstance(state, _CacheState) or state.logits is None:
+            return None
+        length = len(state.key)
+        cache = _copy_cache(state.cache, length, self._language_model())
+        if cache is None:
+            return None
+        forked = _CacheState(state.request, state.key, cache, _IncrementalDetokenizer(self.tokenizer))
+        forked.fed = list(state.key)
+        forked.rope_deltas = state.rope_deltas
+        forked.prompt_ids = state.prompt_ids
+        forked.prompt_tokens = state.prompt_tokens
+        forked.image_tokens = state.image_tokens
+        # 프롬프트 전체를 원래 시퀀스의 KV 상태에서 가져왔으므로 프리필한 토큰이 없음
+        forked.cached_tokens = state.prompt_tokens
+        if state.draft is not None:
+            draft_cache = _copy_cache(state.draft.cache, length, self._language_model(self.draft_model))
+            if draft_cache is not None:
+                forked.draft = _DraftState(
+                    draft_cache, state.draft.rope_deltas,
+                    AdaptiveDraftLength(self.num_draft_tokens, max_k=self.max_draft_tokens, adaptive=self.adaptive_draft)
+                )
+        elif state.lookup is not None:
+            forked.lookup = self._prompt_lookup(state.prompt_ids)
+        return forked, self._emit(forked, state.logits)
+
+    # --- stream_generate 경로 ---
+
+    def _iter_tokens(self, request, state):
+        images = request.images or None
+        kwargs = {
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+            "top_p": request.top_p,
+        }
+
+        if stream_generate is None:
+            # stream_generate가 없는 버전: 전체 응답을 하나의 조각으로 반환
+            response_text = generate(self.model, self.processor, request.prompt, images, verbose=False, **kwargs)
+            if isinstance(response_text, list) and len(response_text) > 0:
+                response_text = response_text[0]
+            yield TokenOutput(None, response_text)
+            return
+
+        for chunk in stream_generate(self.model, self.processor, request.prompt, images, **kwargs):
+            # mlx_vlm 버전에 따라 문자열 또는 GenerationResult 객체가 반환됨
+            if not state.prompt_tokens:
+                state.prompt_tokens = getattr(chunk, "prompt_tokens", 0) or self._count_prompt_tokens(request.prompt)
+            yield TokenOutput(getattr(chunk, "token", None), getattr(chunk, "text", chunk))
+
+    def _count_prompt_tokens(self, prompt):
+        # 프롬프트 토큰 수를 알려주지 않는 버전: 텍스트만 토큰화 (이미지 토큰 확장분은 포함되지 않음)
+        try:
+            return len(self.tokenizer.encode(prompt))
+        except Exception:
+            return 0
+
+    def _next_generated(self, state):
+        self._restore_model_state(state)
+        try:
+            return next(state.generator, None)
+        finally:
+            self._save_model_state(state)
+
+    # --- 토큰 단위 디코딩 루프 ---
+
+    def _prefix_key(self, input_ids, images):
+        """
+        접두사 캐시 키 생성
+
+        이미지 토큰 ID는 이미지 내용과 무관하게 같으므로, 각 이미지 구간의 토큰을
+        해당 이미지 내용의 해시에서 만든 음수 ID로 바꿔 서로 다른 이미지가 같은 키가 되지 않게 합니다.
+        """
+        image_keys = [_image_key(image) for image in images]
+        key = []
+        image_idx = -1
+        previous = None
+        for token in input_ids:
+            if self.image_token_index is not None and token == self.image_token_index:
+                if previous != self.image_token_index:
+                    image_idx += 1
+                key.append(image_keys[image_idx] if image_idx < len(image_keys) else token)
+            else:
+                key.append(token)
+            previous = token
+        return key
+
+    def _prefill_cached(self, request):
+        images = request.images or []
+        inputs = prepare_inputs(
+            self.processor,
+            images=images or None,
+            prompts=request.prompt,
+            image_token_index=self.image_token_index
+        )
+        input_ids = inputs["input_ids"]
+        pixel_values = inputs.get("pixel_values", None)
+        mask = inputs.get("attention_mask", None)
+        extra = {k: v for k, v in inputs.items() if k not in ("input_ids", "pixel_values", "attention_mask")}
+
+        ids = input_ids[0].tolist()
+        key = self._prefix_key(ids, images)
+        state = _CacheState(request, key, None, _IncrementalDetokenizer(self.tokenizer))
+        state.prompt_tokens = len(ids)
+        if self.image_token_index is not None:
+            state.image_tokens = ids.count(self.image_token_index)
+
+        # 접두사 캐시 조회 (프롬프트의 마지막 토큰은 로짓 계산을 위해 항상 다시 처리)
+        reused = 0
+        snapshot = None
+        if self.prefix_cache is not None:
+            reused, snapshot = self.prefix_cache.lookup(key[:-1])
+        suffix = ids[reused:]
+        if snapshot is not None and self.image_token_index in suffix:
+            # 새 이미지가 접미사에 있으면 비전 인코더를 포함한 전체 프리필이 필요
+            reused, snapshot = 0, None
+
+        if snapshot is not None:
+            state.cache = self._restore_cache(snapshot, reused)
+            state.rope_deltas = snapshot["rope_deltas"]
+            self._restore_model_state(state)
+            logits = self._forward(mx.array(suffix)[None], state.cache)
+            logger.info(f"접두사 캐시 재사용: {reused}/{len(ids)} 토큰, 프리필 {len(suffix)} 토큰")
+        else:
+            state.cache = make_prompt_cache(self._language_model())
+            self._restore_model_state(state)
+            with self._vision_cache_key(images):
+                outputs = self.model(input_ids, pixel_values, cache=state.cache, mask=mask, **extra)
+            logits = getattr(outputs, "logits", outputs)[:, -1, :]
+        self._save_model_state(state)
+
+        state.cached_tokens = reused
+        state.fed = list(key)
+        state.prompt_ids = ids
+        if request.n > 1:
+            state.logits = logits
+        mode = request.speculation or self.default_speculation
+        if mode == "draft" and self.draft_model is not None:
+            state.draft = self._prefill_draft(state, input_ids, pixel_values, mask, extra)
+        elif mode == "prompt_lookup" and _trimmable(state.cache):
+            state.lookup = self._prompt_lookup(ids)
+        return state, self._emit(state, logits)
+
+    def _prompt_lookup(self, ids):
+        ignore = () if self.image_token_index is None else (self.image_token_index,)
+        return PromptLookupProposer(
+            ids, max_ngram=self.lookup_max_ngram, num_tokens=self.lookup_num_tokens,
+            min_acceptance=self.lookup_min_acceptance, ignore=ignore
+        )
+
+    def _forward(self, tokens, cache, language_model=None):
+        outputs = (language_model or self._language_model())(tokens, cache=cache)
+        return getattr(outputs, "logits", outputs)[:, -1, :]
+
+    def _sample(self, logits, request):
+        if not request.temperature:
+            return mx.argmax(logits, axis=-1)
+        if top_p_sampling is not None and request.top_p is not None and 0 < request.top_p < 1.0:
+            return top_p_sampling(logits, request.top_p, request.temperature)
+        return mx.random.categorical(logits * (1 / request.temperature))
+
+    def _emit(self, state, logits):
+        token = self._sample(logits, state.request).item()
+        if token in self.eos_token_ids:
+            return None
+        state.next_token = token
+        state.generated += 1
+        if state.lookup is not None:
+            state.lookup.extend([token])
+        return TokenOutput(token, state.detokenizer.add(token))
+
+    def _emit_tokens(self, state, tokens):
+        """검증으로 확정된 토큰들을 출력으로 변환 (EOS에 도달하면 None을 넣고 중단)"""
+        results = []
+        for token in tokens:
+            if token in self.eos_token_ids:
+                results.append(None)
+                break
+            state.generated += 1
+            results.append(TokenOutput(token, state.detokenizer.add(token)))
+        if state.lookup is not None:
+            state.lookup.extend(tokens)
+        state.next_token = tokens[-1]
+        return results
+
+    def _step_cached(self, state):
+        started = time.perf_counter()
+        self._restore_model_state(state)
+        logits = self._forward(mx.array([[state.next_token]]), state.cache)
+        self._save_model_state(state)
+        if state.draft is not None:
+            state.draft.pending.append(state.next_token)
+        state.fed.append(state.next_token)
+        output = self._emit(state, logits)
+        # 토큰 하나씩 디코딩하는 속도 (추측 디코딩 속도 향상 배수의 기준)
+        self.speculation.record_plain(time.perf_counter() - started)
+        return output
+
+    # --- 추측 디코딩 ---
+
+    def _prefill_draft(self, state, input_ids, pixel_values, mask, extra):
+        """
+        초안 모델 프리필 (초안 모델은 접두사 캐시가 없으므로 항상 이미지를 포함한 프롬프트 전체)
+
+        잘라낼 수 없는 KV 캐시(회전/양자화 캐시)를 쓰는 모델이면 검증 후 되돌릴 수 없으므로 None
+        """
+        draft_lm = self._language_model(self.draft_model)
+        cache = make_prompt_cache(draft_lm)
+        if not (_trimmable(cache) and _trimmable(state.cache)):
+            return None
+        if hasattr(draft_lm, "_rope_deltas"):
+            draft_lm._rope_deltas = None
+        self.draft_model(input_ids, pixel_values, cache=cache, mask=mask, **extra)
+        length = AdaptiveDraftLength(self.num_draft_tokens, max_k=self.max_draft_tokens, adaptive=self.adaptive_draft)
+        return _DraftState(cache, getattr(draft_lm, "_rope_deltas", None), length)
+
+    def _step_speculative(self, state):
+        """
+        초안 모델이 k개 토큰을 제안하고 대상 모델이 [next_token, 초안...]을 한 번에 처리해 검증
+
+        Returns:
+            list: 이번 단계에서 확정된 TokenOutput 목록 (EOS에 도달하면 마지막이 None)
+        """
+        draft = state.draft
+        request = state.request
+        # 채택분과 대상 모델의 다음 토큰을 합쳐도 max_tokens를 넘지 않도록 제한
+        k = min(draft.length.k, request.max_tokens - state.generated - 1)
+        if k < 1:
+            return self._step_cached(state)
+
+        started = time.perf_counter()
+        tokens, draft_probs = self._draft_tokens(state, k)
+        drafted_fed = len(tokens) - 1
+
+        self._restore_model_state(state)
+        outputs = self._language_model()(mx.array([[state.next_token] + tokens]), cache=state.cache)
+        self._save_model_state(state)
+        logits = getattr(outputs, "logits", outputs)[0]
+        accepted, next_token = self._verify(logits, tokens, draft_probs, request)
+
+        # 채택되지 않은 초안을 두 모델의 KV 캐시에서 되돌림
+        _trim_cache(state.cache, len(tokens) - accepted)
+        state.fed.extend([state.next_token] + tokens[:accepted])
+        if accepted <= drafted_fed:
+            _trim_cache(draft.cache, drafted_fed - accepted)
+            draft.pending = []
+        else:
+            draft.pending = tokens[drafted_fed:accepted]
+        draft.length.update(len(tokens), accepted)
+
+        results = self._emit_tokens(state, tokens[:accepted] + [next_token])
+        self.speculation.record("draft", len(tokens), accepted, accepted + 1, time.perf_counter() - started)
+        return results
+
+    def _step_prompt_lookup(self, state):
+        """
+        프롬프트 n-gram 조회로 만든 초안을 대상 모델이 [next_token, 초안...]을 한 번에 처리해 검증
+
+        일치하는 n-gram이 없거나 채택률이 떨어져 제안을 멈춘 동안에는 토큰 하나씩 디코딩합니다.
+        초안 분포가 없으므로 샘플링 요청은 초안을 확정적 제안으로 취급해 검증합니다.
+
+        Returns:
+            list: 이번 단계에서 확정된 TokenOutput 목록 (EOS에 도달하면 마지막이 None)
+        """
+        lookup = state.lookup
+        request = state.request
+        k = request.max_tokens - state.generated - 1
+        tokens = lookup.propose(k) if k >= 1 else []
+        if not tokens:
+            return self._step_cached(state)
+
+        started = time.perf_counter()
+        self._restore_model_state(state)
+        outputs = self._language_model()(mx.array([[state.next_token] + tokens]), cache=state.cache)
+        self._save_model_state(state)
+        logits = getattr(outputs, "logits", outputs)[0]
+        accepted, next_token = self._verify(logits, tokens, None, request)
+
+        _trim_cache(state.cache, len(tokens) - accepted)
+        state.fed.extend([state.next_token] + tokens[:accepted])
+        lookup.update(len(tokens), accepted)
+
+        results = self._emit_tokens(state, tokens[:accepted] + [next_token])
+        self.speculation.record("prompt_lookup", len(tokens), accepted, accepted + 1, time.perf_counter() - started)
+        return results
+
+    def _draft_tokens(self, state, k):
+        """
+        초안 모델로 최대 k개 토큰 생성 (EOS가 나오면 중단)
+
+        Returns:
+            tuple: (초안 토큰 목록, 샘플링일 때 위치별 초안 확률 분포 목록 / 탐욕적이면 None)
+        """
+        draft = state.draft
+        request = state.request
+        draft_lm = self._language_model(self.draft_model)
+        if hasattr(draft_lm, "_rope_deltas"):
+            draft_lm._rope_deltas = draft.rope_deltas
+        logits = self._forward(mx.array([draft.pending + [state.next_token]]), draft.cache, draft_lm)
+        tokens = []
+        probs = None if not request.temperature else []
+        for i in range(k):
+            if probs is None:
+                token = mx.argmax(logits, axis=-1).item()
+            else:
+                q = self._probs(logits, request, top_p=False)
+                token = mx.random.categorical(mx.log(q)).item()
+                probs.append(q[0])
+            tokens.append(token)
+            if token in self.eos_token_ids or i == k - 1:
+                break
+            logits = self._forward(mx.array([[token]]), draft.cache, draft_lm)
+        if hasattr(draft_lm, "_rope_deltas"):
+            draft.rope_deltas = draft_lm._rope_deltas
+        return tokens, probs
+
+    def _verify(self, logits, tokens, draft_probs, request):
+        """
+        초안 검증
+
+        탐욕적 디코딩은 대상 모델의 argmax와 일치하는 앞부분을 채택합니다. 샘플링은 초안 토큰 d를
+        min(1, p(d)/q(d)) 확률로 채택하고, 거절되면 max(p - q, 0)에서 다시 뽑아 대상 분포 p를 그대로 따릅니다.
+        (draft_probs가 None인 샘플링 요청은 초안을 확정적 제안(q가 d에 집중된 분포)으로 취급)
+
+        Args:
+            logits: 대상 모델 로짓 [len(tokens) + 1, vocab]
+
+        Returns:
+            tuple: (채택된 초안 수, 대상 모델이 고른 다음 토큰)
+        """
+        if not request.temperature:
+            targets = mx.argmax(logits, axis=-1).tolist()
+            accepted = accept_greedy(tokens, targets)
+            return accepted, targets[accepted]
+
+        p = self._probs(logits, request)
+        for i, token in enumerate(tokens):
+            p_token = p[i, token].item()
+            q_token = draft_probs[i][token].item() if draft_probs is not None else 1.0
+            if q_token > 0 and mx.random.uniform().item() * q_token < p_token:
+                continue
+            if draft_probs is not None:
+                q = draft_probs[i]
+                if q.shape[-1] < p.shape[-1]:
+                    # 3B 모델은 임베딩 행 수(어휘 크기)가 7B/32B보다 작음 (추가 행은 쓰이지 않는 토큰)
+                    q = mx.pad(q, (0, p.shape[-1] - q.shape[-1]))
+                residual = mx.maximum(p[i] - q, 0)
+            else:
+                residual = p[i] * (mx.arange(p.shape[-1]) != token)
+            if residual.sum().item() <= 0:
+                residual = p[i]
+            return i, mx.random.categorical(mx.log(residual)).item()
+        return len(tokens), mx.random.categorical(mx.log(p[len(tokens)])).item()
+
+    def _probs(self, logits, request, top_p=True):
+        """온도(와 top_p)를 적용한 확률 분포 [n, vocab] (float32)"""
+        probs = mx.softmax(logits.astype(mx.float32) * (1 / request.temperature), axis=-1)
+        if top_p and request.top_p is not None and 0 < request.top_p < 1.0:
+            # 누적 확률이 top_p에 도달하기까지의 토큰만 남김 (남길 최소 확률을 구해 원래 순서에서 비교)
+            ordered = mx.sort(probs, axis=-1)[..., ::-1]
+            kept = mx.sum((mx.cumsum(ordered, axis=-1) - ordered) < request.top_p, axis=-1, keepdims=True)
+            threshold = mx.take_along_axis(ordered, kept - 1, axis=-1)
+            probs = mx.where(probs >= threshold, probs, 0)
+            probs = probs / probs.sum(axis=-1, keepdims=True)
+        return probs
+
+    # --- 접두사 캐시 ---
+
+    def _store_prefix(self, state):
+        if self.prefix_cache is None or state.cache is None:
+            return
+        layers = []
+        nbytes = 0
+        for layer in state.cache:
+            keys = getattr(layer, "keys", None)
+            values = getattr(layer, "values", None)
+            offset = getattr(layer, "offset", None)
+            # 일반 KVCache만 저장 (회전/양자화 캐시는 잘라서 재사용할 수 없음)
+            if type(layer).__name__ != "KVCache" or keys is None or offset != len(state.fed):
+                return
+            layers.append((keys, values))
+            nbytes += keys.nbytes + values.nbytes
+        self.prefix_cache.insert(state.fed, {"layers": layers, "rope_deltas": state.rope_deltas}, nbytes)
+
+    def _restore_cache(self, snapshot, length):
+        cache = make_prompt_cache(self._language_model())
+        for layer, (keys, values) in zip(cache, snapshot["layers"]):
+            # 잘라낸 배열은 새 배열이므로 이후 캐시 갱신이 저장된 스냅샷을 바꾸지 않음
+            layer.keys = keys[..., :length, :]
+            layer.values = values[..., :length, :]
+            layer.offset = length
+        return cache
+
+def _copy_cache(cache, length, language_model):
+    """
+    KV 캐시의 앞 length개 토큰을 새 캐시로 복제 (일반 KVCache가 아니면 None)
+
+    잘라낸 배열은 새 배열이므로 복제본과 원본이 이후에 각자 갱신되어도 서로 영향을 주지 않습니다.
+    """
+    if any(type(layer).__name__ != "KVCache" or getattr(layer, "keys", None) is None for layer in cache):
+        return None
+    copied = make_prompt_cache(language_model)
+    for target, layer in zip(copied, cache):
+        target.keys = layer.keys[..., :length, :]
+        target.values = layer.values[..., :length, :]
+        target.offset = length
+    return copied
+
+def _trimmable(cache):
+    """검증 후 채택되지 않은 초안을 잘라낼 수 있는 KV 캐시인지"""
+    return all(getattr(layer, "is_trimmable", lambda: False)() and hasattr(layer, "trim") for layer in cache)
+
+def _trim_cache(cache, n):
+    """KV 캐시의 마지막 n개 토큰 제거"""
+    if n > 0:
+        for layer in cache:
+            layer.trim(n)
+
+def _image_digest(image):
+    """
+    이미지 내용 해시
+
+    이미지 캐시가 기록한 내용 키가 있으면 픽셀 데이터를 다시 해시하지 않고 사용합니다.
+    """
+    content_key = getattr(image, "info", {}).get("content_key")
+    if content_key is not None:
+        return hashlib.sha1(content_key.encode("utf-8")).digest()
+    return hashlib.sha1(image.tobytes()).digest()
+
+def _image_key(image):
+    """이미지 내용 해시에서 만든 음수 토큰 ID (실제 토큰 ID와 겹치지 않음)"""
+    return -1 - int.from_bytes(_image_digest(image)[:4], "little")
+
+def _nbytes(output):
+    """mx.array 또는 그 튜플/리스트의 전체 크기"""
+    if isinstance(output, (tuple, list)):
+        return sum(_nbytes(item) for item in output)
+    return getattr(output, "nbytes", 0)
+
+def release_memory():
+    """내려간 모델의 배열을 회수하고 MLX 버퍼 캐시를 비움"""
+    gc.collect()
+    if mx is None:
+        return
+    clear_cache = getattr(mx, "clear_cache", None) or getattr(getattr(mx, "metal", None), "clear_cache", None)
+    if clear_cache is not None:
+        clear_cache()
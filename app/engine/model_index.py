@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import mmap
+import struct
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# safetensors 자료형별 원소 크기(비트)
+DTYPE_BITS = {
+    "F64": 64, "F32": 32, "F16": 16, "BF16": 16,
+    "I64": 64, "I32": 32, "I16": 16, "I8": 8,
+    "U64": 64, "U32": 32, "U16": 16, "U8": 8,
+    "BOOL": 8, "F8_E4M3": 8, "F8_E5M2": 8
+}
+# 정상적인 헤더 크기 상한 (이보다 크면 손상된 파일로 판단)
+MAX_HEADER_BYTES = 100 * 1024 * 1024
+# 모델 디렉토리에 반드시 있어야 하는 파일
+REQUIRED_FILES = ("config.json", "tokenizer.json")
+# 샤드로 나뉜 가중치의 텐서 -> 파일 매핑 (HF/MLX 공통 형식)
+SHARD_INDEX_FILE = "model.safetensors.index.json"
+# model-00001-of-00004.safetensors 형식의 샤드 파일 이름
+SHARD_PATTERN = re.compile(r"-(\d+)-of-(\d+)\.safetensors$")
+
+# 텐서 하나 (file: 텐서가 들어 있는 가중치 파일 이름, offset: 파일 안에서 데이터 시작 위치)
+TensorInfo = namedtuple("TensorInfo", ["name", "dtype", "shape", "nbytes", "file", "offset"])
+
+class SafetensorsError(ValueError):
+    """safetensors 헤더가 손상되었거나 파일 크기와 맞지 않을 때 발생하는 예외"""
+
+def _numel(shape):
+    numel = 1
+    for dim in shape:
+        numel *= dim
+    return numel
+
+def read_safetensors_header(path):
+    """
+    safetensors 파일의 JSON 헤더만 읽습니다 (텐서 데이터는 읽지 않음).
+
+    파일을 메모리 매핑하고 앞의 8바이트(헤더 길이)와 헤더 부분만 복사하므로
+    파일 크기와 관계없이 수 밀리초 안에 끝납니다.
+
+    Args:
+        path (str): safetensors 파일 경로
+
+    Returns:
+        tuple: (텐서 이름별 TensorInfo dict, __metadata__ dict)
+
+    Raises:
+        SafetensorsError: 헤더 손상, 잘린 파일, 자료형/크기 불일치
+    """
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 8:
+            raise SafetensorsError(f"{name}: 파일이 너무 작습니다 ({size}바이트)")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            (header_len,) = struct.unpack("<Q", mm[:8])
+            if header_len > min(size - 8, MAX_HEADER_BYTES):
+                raise SafetensorsError(f"{name}: 헤더 길이가 잘못되었습니다 ({header_len}바이트)")
+            raw = mm[8:8 + header_len]
+
+    try:
+        header = json.loads(raw)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise SafetensorsError(f"{name}: 헤더 JSON 파싱 실패: {e}")
+    if not isinstance(header, dict):
+        raise SafetensorsError(f"{name}: 헤더가 JSON 객체가 아닙니다")
+
+    data_size = size - 8 - header_len
+    metadata = header.pop("__metadata__", None) or {}
+    tensors = {}
+    for tensor_name, entry in header.items():
+        try:
+            dtype = entry["dtype"]
+            shape = [int(dim) for dim in entry["shape"]]
+            begin, end = (int(offset) for offset in entry["data_offsets"])
+        except (KeyError, TypeError, ValueError):
+            raise SafetensorsError(f"{name}: 텐서 항목이 잘못되었습니다: {tensor_name}")
+        bits = DTYPE_BITS.get(dtype)
+        if bits is None:
+            raise SafetensorsError(f"{name}: 알 수 없는 자료형 {dtype} ({tensor_name})")
+        if not 0 <= begin <= end or end - begin != _numel(shape) * bits // 8:
+            raise SafetensorsError(f"{name}: 텐서 크기가 모양과 맞지 않습니다: {tensor_name} {dtype}{shape}")
+        if end > data_size:
+            raise SafetensorsError(
+                f"{name}: 파일이 잘렸습니다 ({tensor_name}이(가) {end}바이트까지 필요, 데이터 {data_size}바이트)"
+            )
+        tensors[tensor_name] = TensorInfo(tensor_name, dtype, tuple(shape), end - begin, name, 8 + header_len + begin)
+    return tensors, metadata
+
+def find_weight_files(model_path):
+    """
+    모델 디렉토리의 가중치 파일을 찾습니다 (단일 파일과 샤드 모두 지원).
+
+    model.safetensors.index.json이 있으면 weight_map이 가리키는 샤드를 사용하고,
+    없으면 디렉토리의 모든 *.safetensors를 사용합니다.
+    model-0000N-of-0000M 형식의 샤드는 M개가 모두 있는지 확인합니다.
+
+    Args:
+        model_path (str): 모델 디렉토리 경로
+
+    Returns:
+        tuple: (가중치 파일 경로 목록(이름순), weight_map dict 또는 None, 오류 목록)
+    """
+    errors = []
+    weight_map = None
+    present = sorted(
+        entry.name for entry in os.scandir(model_path) if entry.name.endswith(".safetensors") and entry.is_file()
+    )
+    names = present
+    index_path = os.path.join(model_path, SHARD_INDEX_FILE)
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                weight_map = json.load(f)["weight_map"]
+            names = sorted(set(weight_map.values()))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            errors.append(f"{SHARD_INDEX_FILE} 파싱 실패: {e}")
+            weight_map = None
+
+    missing = [name for name in names if name not in present]
+    expected = {}
+    for name in names:
+        match = SHARD_PATTERN.search(name)
+        if match:
+            prefix = name[:match.start()]
+            expected[prefix] = max(expected.get(prefix, 0), int(match.group(2)))
+    for prefix, total in expected.items():
+        for i in range(1, total + 1):
+            name = f"{prefix}-{i:05d}-of-{total:05d}.safetensors"
+            if name not in present and name not in missing:
+                missing.append(name)
+    if missing:
+        errors.append(f"샤드 파일이 없습니다: {', '.join(sorted(missing))}")
+
+    paths = [os.path.join(model_path, name) for name in names if name in present]
+    return paths, weight_map, errors
+
+def has_weight_files(model_path):
+    """가중치 파일(단일 파일 또는 샤드 인덱스)이 있는지 빠르게 확인"""
+    if os.path.exists(os.path.join(model_path, SHARD_INDEX_FILE)):
+        return True
+    try:
+        return any(name.endswith(".safetensors") for name in os.listdir(model_path))
+    except OSError:
+        return False
+
+class ModelIndex:
+    """
+    모델 디렉토리 인덱스 (safetensors 헤더와 config.json만 읽음)
+
+    파일별 파싱 결과를 (수정 시각, 크기)를 키로 캐시하므로 모델 목록을 다시 조회할 때는
+    디렉토리 항목과 stat만 확인합니다. 변환이 잘못되어 헤더가 손상되었거나 파일이 잘린 모델은
+    가중치 로드를 시도하기 전에 errors로 보고합니다.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._models = {}
+        self._lock = threading.Lock()
+        self.parses = 0
+
+    def _file_entry(self, path, stat):
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._files.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        try:
+            entry = read_safetensors_header(path)
+        except (OSError, SafetensorsError) as e:
+            entry = e
+        with self._lock:
+            self._files[path] = (key, entry)
+            self.parses += 1
+        return entry
+
+    def _weight_files(self, model_path):
+        """가중치 파일 [(경로, stat)], weight_map, 오류 목록"""
+        paths, weight_map, errors = find_weight_files(model_path)
+        return [(path, os.stat(path)) for path in paths], weight_map, errors
+
+    def tensors(self, model_path):
+        """
+        모델의 모든 텐서
+
+        Returns:
+            dict: {텐서 이름: TensorInfo}
+        """
+        tensors = {}
+        for path, stat in self._weight_files(model_path)[0]:
+            entry = self._file_entry(path, stat)
+            if not isinstance(entry, Exception):
+                tensors.update(entry[0])
+        return tensors
+
+    def scan(self, model_path):
+        """
+        모델 디렉토리의 요약 정보 (변경된 파일만 다시 파싱)
+
+        Args:
+            model_path (str): 모델 디렉토리 경로
+
+        Returns:
+            dict: files, tensors(텐서 수), parameters, dtypes, quantization, total_bytes,
+                model_type, errors(비어 있으면 로드 가능)
+        """
+        model_path = os.path.abspath(model_path)
+        try:
+            weight_files, weight_map, shard_errors = self._weight_files(model_path)
+            config_stat = _stat(os.path.join(model_path, "config.json"))
+            index_stat = _stat(os.path.join(model_path, SHARD_INDEX_FILE))
+        except OSError as e:
+            return _summary(model_path, errors=[f"모델 디렉토리를 읽을 수 없습니다: {e}"])
+
+        signature = (
+            tuple((path, stat.st_mtime_ns, stat.st_size) for path, stat in weight_files),
+            (config_stat.st_mtime_ns, config_stat.st_size) if config_stat else None,
+            (index_stat.st_mtime_ns, index_stat.st_size) if index_stat else None
+        )
+        with self._lock:
+            cached = self._models.get(model_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        summary = self._summarize(model_path, weight_files, weight_map, shard_errors)
+        with self._lock:
+            self._models[model_path] = (signature, summary)
+        return summary
+
+    def _summarize(self, model_path, weight_files, weight_map=None, shard_errors=()):
+        errors = list(shard_errors)
+        for name in REQUIRED_FILES:
+            if not os.path.exists(os.path.join(model_path, name)):
+                errors.append(f"필수 파일이 없습니다: {name}")
+
+        config = {}
+        try:
+            with open(os.path.join(model_path, "config.json"), "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            errors.append(f"config.json 파싱 실패: {e}")
+
+        if not weight_files and not shard_errors:
+            errors.append("가중치 파일(*.safetensors)이 없습니다")
+
+        tensors = {}
+        total_bytes = 0
+        for path, stat in weight_files:
+            total_bytes += stat.st_size
+            entry = self._file_entry(path, stat)
+            if isinstance(entry, Exception):
+                errors.append(str(entry))
+                continue
+            for tensor_name, info in entry[0].items():
+                if tensor_name in tensors:
+                    errors.append(f"텐서가 여러 파일에 중복되어 있습니다: {tensor_name}")
+                tensors[tensor_name] = info
+
+        if weight_map is not None and not errors:
+            # 인덱스가 가리키는 샤드에 텐서가 실제로 있는지 확인
+            misplaced = [name for name, file in weight_map.items()
+                         if name not in tensors or tensors[name].file != file]
+            if misplaced:
+                errors.append(f"인덱스와 샤드 내용이 다릅니다: 텐서 {len(misplaced)}개 (예: {misplaced[0]})")
+
+        quantization = _quantization(config, tensors)
+        if tensors and config.get("vision_config") and not any(_is_vision_tensor(name) for name in tensors):
+            errors.append("비전 모델 설정이 있지만 비전 인코더 가중치가 없습니다")
+
+        dtypes = {}
+        for info in tensors.values():
+            dtypes[info.dtype] = dtypes.get(info.dtype, 0) + 1
+
+        return _summary(
+            model_path,
+            files=[os.path.basename(path) for path, _ in weight_files],
+            tensors=len(tensors),
+            parameters=_count_parameters(tensors, quantization),
+            dtypes=dtypes,
+            quantization=quantization,
+            total_bytes=total_bytes,
+            model_type=config.get("model_type"),
+            errors=errors
+        )
+
+def _summary(model_path, files=(), tensors=0, parameters=0, dtypes=None, quantization=None, total_bytes=0,
+             model_type=None, errors=()):
+    return {
+        "id": os.path.basename(model_path),
+        "path": model_path,
+        "files": list(files),
+        "tensors": tensors,
+        "parameters": parameters,
+        "dtypes": dtypes or {},
+        "quantization": quantization,
+        "total_bytes": total_bytes,
+        "model_type": model_type,
+        "valid": not errors,
+        "errors": list(errors)
+    }
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+def _is_vision_tensor(name):
+    return name.startswith(("vision_tower.", "visual.")) or ".visual." in name or ".vision_tower." in name
+
+def _quantization(config, tensors):
+    """
+    양자화 설정 (config.json의 quantization 항목, 없으면 가중치에서 추정)
+
+    MLX 양자화 가중치는 U32로 묶인 weight와 같은 이름의 scales/biases로 저장되며,
+    묶음 하나(32비트)에 들어간 값의 개수로 비트 수를 추정합니다.
+    """
+    quant = config.get("quantization") or config.get("quantization_config")
+    if isinstance(quant, dict) and quant.get("bits"):
+        result = {"bits": int(quant["bits"]), "group_size": quant.get("group_size")}
+        # 계층별 설정 ({모듈 경로: {bits, group_size}}, 기본값과 다른 계층만 기록됨)
+        layers = {key: value for key, value in quant.items() if isinstance(value, dict) and value.get("bits")}
+        if layers:
+            result["layers"] = layers
+        return result
+
+    for name, info in tensors.items():
+        if not name.endswith(".weight") or info.dtype != "U32":
+            continue
+        scales = tensors.get(name[:-len(".weight")] + ".scales")
+        if scales is None or not scales.shape or not info.shape:
+            continue
+        # 원래 입력 차원 = scales 열 수 * group_size, weight 열 수 = 입력 차원 * bits / 32
+        # (group_size는 가중치만으로 구분할 수 없으므로 MLX 기본값 64부터 시도)
+        for group_size in (64, 32, 128):
+            in_features = scales.shape[-1] * group_size
+            if (32 * info.shape[-1]) % in_features == 0 and 32 * info.shape[-1] // in_features in (2, 3, 4, 6, 8):
+                return {"bits": 32 * info.shape[-1] // in_features, "group_size": group_size}
+        return None
+    return None
+
+def _count_parameters(tensors, quantization):
+    """
+    원래 모델의 파라미터 수
+
+    양자화된 weight는 묶인 값을 풀어 센 개수로 계산하고, 양자화 보조 텐서(scales/biases)는 제외합니다.
+    """
+    bits = quantization["bits"] if quantization else None
+    layers = quantization.get("layers", {}) if quantization else {}
+    total = 0
+    for name, info in tensors.items():
+        stem, _, suffix = name.rpartition(".")
+        if suffix in ("scales", "biases") and f"{stem}.weight" in tensors and tensors[f"{stem}.weight"].dtype == "U32":
+            continue
+        numel = _numel(info.shape)
+        if bits and info.dtype == "U32" and f"{stem}.scales" in tensors:
+            numel = numel * 32 // int(layers.get(stem, {}).get("bits", bits))
+        total += numel
+    return total
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class _Node:
+    """래딕스 트리 노드 (edge: 부모에서 이 노드로 오는 토큰 열)"""
+
+    __slots__ = ("edge", "parent", "children", "entry")
+
+    def __init__(self, edge=(), parent=None):
+        self.edge = edge
+        self.parent = parent
+        self.children = {}
+        self.entry = None
+
+class _Entry:
+    __slots__ = ("key", "value", "nbytes", "node")
+
+    def __init__(self, key, value, nbytes, node):
+        self.key = key
+        self.value = value
+        self.nbytes = nbytes
+        self.node = node
+
+class PrefixCache:
+    """
+    토큰 ID 접두사로 색인하는 KV 상태 캐시
+
+    래딕스 트리에 토큰 열을 키로 값(KV 캐시 스냅샷 등)을 저장하고, 새 프롬프트와 가장 길게 겹치는
+    접두사를 찾아 돌려줍니다. 인과적 어텐션에서는 앞쪽 n개 토큰의 KV 상태가 그 n개 토큰에만
+    의존하므로, 찾은 값의 앞부분을 잘라 재사용할 수 있습니다.
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 제거합니다.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self._root = _Node()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reused_tokens = 0
+
+    def __len__(self):
+        return len(self._lru)
+
+    def lookup(self, tokens):
+        """
+        가장 길게 일치하는 접두사를 찾습니다.
+
+        Args:
+            tokens (list): 조회할 토큰 ID 열
+
+        Returns:
+            tuple: (일치한 토큰 수, 값). 일치하는 항목이 없으면 (0, None)
+                   값의 키는 일치한 토큰 수보다 길 수 있으므로 앞부분만 사용해야 합니다.
+        """
+        tokens = tuple(tokens)
+        with self._lock:
+            node = self._root
+            matched = 0
+            best = (0, None)
+            while matched < len(tokens):
+                child = node.children.get(tokens[matched])
+                if child is None:
+                    break
+                common = _common_length(child.edge, tokens, matched)
+                matched += common
+                node = child
+                if common < len(child.edge):
+                    break
+                if node.entry is not None:
+                    best = (matched, node.entry)
+
+            # 일치가 edge 중간에서 끝나거나 더 긴 키만 있는 경우, 하위 트리의 아무 항목이나 사용 가능
+            if matched > best[0]:
+                entry = _any_entry(node)
+                if entry is not None:
+                    best = (matched, entry)
+
+            length, entry = best
+            if entry is None or length == 0:
+                self.misses += 1
+                return 0, None
+            self._lru.move_to_end(id(entry))
+            self.hits += 1
+            self.reused_tokens += length
+            return length, entry.value
+
+    def insert(self, tokens, value, nbytes):
+        """
+        토큰 열에 대한 값을 저장합니다. 같은 키가 있으면 교체합니다.
+
+        Args:
+            tokens (list): 토큰 ID 열
+            value: 저장할 값
+            nbytes (int): 값이 차지하는 메모리 크기
+        """
+        tokens = tuple(tokens)
+        if not tokens or nbytes > self.max_bytes:
+            return
+        with self._lock:
+            node = self._root
+            pos = 0
+            while pos < len(tokens):
+                child = node.children.get(tokens[pos])
+                if child is None:
+                    child = _Node(tokens[pos:], node)
+                    node.children[tokens[pos]] = child
+                    node = child
+                    pos = len(tokens)
+                    break
+                common = _common_length(child.edge, tokens, pos)
+                if common < len(child.edge):
+                    child = _split(child, common)
+                node = child
+                pos += common
+
+            if node.entry is not None:
+                # 같은 키 교체: 노드는 그대로 두고 기존 항목만 제거
+                self._lru.pop(id(node.entry), None)
+                self.total_bytes -= node.entry.nbytes
+            entry = _Entry(tokens, value, nbytes, node)
+            node.entry = entry
+            self._lru[id(entry)] = entry
+            self.total_bytes += nbytes
+
+            while self.total_bytes > self.max_bytes and self._lru:
+                self._remove_entry(next(iter(self._lru.values())))
+                self.evictions += 1
+
+    def _remove_entry(self, entry):
+        self._lru.pop(id(entry), None)
+        self.total_bytes -= entry.nbytes
+        node = entry.node
+        node.entry = None
+        # 값도 자식도 없는 노드는 정리
+        while node is not self._root and node.entry is None and not node.children:
+            parent = node.parent
+            del parent.children[node.edge[0]]
+            node = parent
+
+    def clear(self):
+        with self._lock:
+            self._root = _Node()
+            self._lru.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "reused_tokens": self.reused_tokens
+            }
+
+def _common_length(edge, tokens, start):
+    n = min(len(edge), len(tokens) - start)
+    i = 0
+    while i < n and edge[i] == tokens[start + i]:
+        i += 1
+    return i
+
+def _split(node, at):
+    """node의 edge를 at 위치에서 나누고 앞부분을 담은 새 부모 노드 반환"""
+    parent = node.parent
+    middle = _Node(node.edge[:at], parent)
+    parent.children[middle.edge[0]] = middle
+    node.edge = node.edge[at:]
+    node.parent = middle
+    middle.children[node.edge[0]] = node
+    return middle
+
+def _any_entry(node):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.entry is not None:
+            return current.entry
+        stack.extend(current.children.values())
+    return None
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import logging
+import threading
+
+from .conversion import FLOAT_DTYPES, to_float32, from_float32
+
+logger = logging.getLogger(__name__)
+
+# MLX가 uint32 하나에 나눠 담을 수 있는 비트 수 (3/6비트는 묶음 경계를 넘어가므로 제외)
+SUPPORTED_BITS = (2, 4, 8)
+DEFAULT_BITS = 4
+DEFAULT_GROUP_SIZE = 64
+# 기본으로 양자화하지 않는 계층 (mlx_vlm과 같이 비전 인코더는 원래 정밀도 유지)
+DEFAULT_SKIP = (r"^vision_tower\.",)
+# 한 번에 float32로 바꿔 처리하는 최대 원소 수 (큰 임베딩도 메모리 사용량이 이 크기로 제한됨)
+CHUNK_ELEMENTS = 16 * 1024 * 1024
+
+class GroupQuantizer:
+    """
+    MLX affine 그룹 양자화를 NumPy로 수행하는 오프라인 양자화기
+
+    입력 차원을 group_size 단위로 나눠 그룹마다 scale/bias를 구하고(w ≈ q * scale + bias),
+    q를 uint32에 낮은 비트부터 채워 넣습니다. 결과는 MLX QuantizedLinear/QuantizedEmbedding이
+    그대로 읽는 weight(U32)/scales/biases 텐서이므로 Apple 장비 없이도 변환할 수 있습니다.
+
+    StreamingConverter의 quantizer로 사용합니다 (plan/apply/config).
+
+    Args:
+        bits (int): 기본 비트 수 (2, 4, 8)
+        group_size (int): 기본 그룹 크기
+        skip (list): 양자화하지 않을 텐서 이름 정규식 목록
+        layers (dict): {텐서 이름 정규식: bits 또는 (bits, group_size) 또는 None(건너뜀)}. 먼저 맞는 규칙 적용
+    """
+
+    def __init__(self, bits=DEFAULT_BITS, group_size=DEFAULT_GROUP_SIZE, skip=DEFAULT_SKIP, layers=None):
+        self.bits = bits
+        self.group_size = group_size
+        self.skip = [re.compile(pattern) for pattern in skip or ()]
+        self.layers = []
+        for pattern, setting in (layers or {}).items():
+            if isinstance(setting, int):
+                setting = (setting, group_size)
+            self.layers.append((re.compile(pattern), tuple(setting) if setting is not None else None))
+        for _, setting in [(None, (bits, group_size))] + self.layers:
+            if setting is not None:
+                _check_setting(*setting)
+
+        # 텐서 이름 -> (bits, group_size), plan()에서 양자화하기로 한 텐서
+        self._planned = {}
+        self._report = {}
+        self._lock = threading.Lock()
+
+    def setting(self, name, dtype, shape):
+        """
+        텐서 하나에 적용할 (bits, group_size) (양자화하지 않으면 None)
+
+        선형/임베딩 계층의 2차원 부동소수점 weight만 대상이며, 입력 차원이 그룹 크기로 나누어떨어져야 합니다.
+        """
+        if not name.endswith(".weight") or len(shape) != 2 or dtype not in FLOAT_DTYPES:
+            return None
+        if any(pattern.search(name) for pattern in self.skip):
+            return None
+        setting = (self.bits, self.group_size)
+        for pattern, layer_setting in self.layers:
+            if pattern.search(name):
+                setting = layer_setting
+                break
+        if setting is None or shape[-1] % setting[1] != 0:
+            return None
+        return setting
+
+    def plan(self, name, dtype, shape):
+        """출력 텐서 목록 [(이름, 자료형, 모양)] (양자화하면 weight/scales/biases)"""
+        setting = self.setting(name, dtype, shape)
+        if setting is None:
+            return [(name, dtype, shape)]
+        bits, group_size = setting
+        self._planned[name] = setting
+        rows, columns = shape
+        stem = name[:-len(".weight")]
+        groups = (rows, columns // group_size)
+        return [(name, "U32", (rows, columns * bits // 32)), (f"{stem}.scales", dtype, groups),
+                (f"{stem}.biases", dtype, groups)]
+
+    def apply(self, name, array, dtype):
+        """
+        텐서 하나 양자화 (plan()에서 양자화하기로 한 텐서만, 나머지는 그대로 반환)
+
+        Args:
+            name (str): 출력 weight 이름
+            array: NumPy 배열 (BF16은 uint16 원본 비트)
+            dtype (str): array의 safetensors 자료형 (scales/biases도 이 자료형으로 저장)
+
+        Returns:
+            list: plan()과 같은 순서의 출력 배열
+        """
+        setting = self._planned.get(name)
+        if setting is None:
+            return [array]
+        import numpy as np
+
+        bits, group_size = setting
+        rows, columns = array.shape
+        packed = np.empty((rows, columns * bits // 32), dtype=np.uint32)
+        scales = np.empty((rows, columns // group_size), dtype=np.float32)
+        biases = np.empty_like(scales)
+        squared_error = squared_norm = max_error = 0.0
+
+        step = max(1, CHUNK_ELEMENTS // columns)
+        for start in range(0, rows, step):
+            end = min(rows, start + step)
+            w = to_float32(array[start:end], dtype)
+            q, scale, bias = quantize_groups(w, bits, group_size)
+            packed[start:end] = pack_bits(q, bits)
+            # 오차는 실제로 저장되는 자료형으로 반올림한 scale/bias로 계산
+            scale = to_float32(from_float32(scale, dtype), dtype)
+            bias = to_float32(from_float32(bias, dtype), dtype)
+            scales[start:end] = scale
+            biases[start:end] = bias
+            error = dequantize_groups(q, scale, bias, group_size) - w
+            squared_error += float(np.square(error, dtype=np.float64).sum())
+            squared_norm += float(np.square(w, dtype=np.float64).sum())
+            max_error = max(max_error, float(np.abs(error).max()))
+
+        numel = rows * columns
+        with self._lock:
+            self._report[name] = {
+                "bits": bits,
+                "group_size": group_size,
+                "shape": [rows, columns],
+                "rmse": (squared_error / numel) ** 0.5,
+                "max_abs_error": max_error,
+                "relative_error": (squared_error / squared_norm) ** 0.5 if squared_norm > 0 else 0.0,
+            }
+        return [packed, from_float32(scales, dtype), from_float32(biases, dtype)]
+
+    def config(self):
+        """
+        config.json의 quantization 항목
+
+        기본값과 다른 계층은 mlx_vlm/mlx_lm의 계층별 설정 형식({모듈 경로: {bits, group_size}})으로 추가합니다.
+        (양자화하지 않은 계층은 scales가 없으므로 로더가 원래 정밀도로 둠)
+        """
+        config = {"group_size": self.group_size, "bits": self.bits}
+        for name, (bits, group_size) in sorted(self._planned.items()):
+            if (bits, group_size) != (self.bits, self.group_size):
+                config[name[:-len(".weight")]] = {"group_size": group_size, "bits": bits}
+        return config
+
+    def report(self):
+        """텐서별 양자화 오차 {이름: {bits, group_size, shape, rmse, max_abs_error, relative_error}}"""
+        with self._lock:
+            return dict(self._report)
+
+def _check_setting(bits, group_size):
+    if bits not in SUPPORTED_BITS:
+        raise ValueError(f"지원하지 않는 비트 수입니다: {bits} (가능: {', '.join(map(str, SUPPORTED_BITS))})")
+    if group_size <= 0 or group_size % (32 // bits) != 0:
+        raise ValueError(f"그룹 크기 {group_size}는 {32 // bits}의 배수여야 합니다 ({bits}비트)")
+
+def quantize_groups(w, bits, group_size):
+    """
+    float32 행렬 [rows, columns]을 그룹별 affine 양자화
+
+    Returns:
+        tuple: (q [rows, columns] uint32, scales [rows, groups], biases [rows, groups])
+    """
+    import numpy as np
+    rows, columns = w.shape
+    groups = w.reshape(rows, columns // group_size, group_size)
+    w_min = groups.min(axis=-1)
+    w_max = groups.max(axis=-1)
+    levels = (1 << bits) - 1
+    scales = np.maximum((w_max - w_min) / levels, np.float32(1e-7))
+    q = np.rint((groups - w_min[..., None]) / scales[..., None])
+    q = np.clip(q, 0, levels).astype(np.uint32).reshape(rows, columns)
+    return q, scales, w_min
+
+def dequantize_groups(q, scales, biases, group_size):
+    """quantize_groups의 역변환 (float32)"""
+    rows, columns = q.shape
+    groups = q.reshape(rows, columns // group_size, group_size).astype(scales.dtype)
+    return (groups * scales[..., None] + biases[..., None]).reshape(rows, columns)
+
+def pack_bits(q, bits):
+    """양자화 값을 uint32에 낮은 비트부터 채워 넣음 (MLX 배치)"""
+    import numpy as np
+    per_word = 32 // bits
+    rows, columns = q.shape
+    shifts = (np.arange(per_word, dtype=np.uint32) * bits)
+    return np.bitwise_or.reduce(q.reshape(rows, columns // per_word, per_word) << shifts, axis=-1)
+
+def unpack_bits(packed, bits):
+    """pack_bits의 역변환"""
+    import numpy as np
+    per_word = 32 // bits
+    rows, words = packed.shape
+    shifts = (np.arange(per_word, dtype=np.uint32) * bits)
+    return ((packed[..., None] >> shifts) & np.uint32((1 << bits) - 1)).reshape(rows, words * per_word)
+
+def summarize_report(report, limit=5):
+    """
+    양자화 오차 요약
+
+    Returns:
+        dict: tensors, mean_relative_error, worst(상대 오차가 큰 순서로 limit개)
+    """
+    if not report:
+        return {"tensors": 0, "mean_relative_error": 0.0, "worst": []}
+    worst = sorted(report.items(), key=lambda item: item[1]["relative_error"], reverse=True)[:limit]
+    return {
+        "tensors": len(report),
+        "mean_relative_error": sum(entry["relative_error"] for entry in report.values()) / len(report),
+        "worst": [{"name": name, **entry} for name, entry in worst],
+    }
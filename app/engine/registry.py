@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 가중치 파일 크기로 상주 메모리를 추정할 때 포함하는 확장자
+WEIGHT_EXTENSIONS = (".safetensors", ".npz", ".bin", ".gguf")
+
+class ModelUnavailable(RuntimeError):
+    """
+    모델을 사용할 수 없을 때 발생하는 예외 (로드 실패, 메모리 예산 부족 등)
+
+    Args:
+        message (str): 오류 메시지
+        status_code (int): HTTP 상태 코드
+        retry_after (int, optional): Retry-After 헤더 값(초)
+    """
+
+    def __init__(self, message, status_code=503, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class ModelHandle:
+    """
+    레지스트리가 관리하는 모델 하나
+
+    로더가 executor(전용 추론 실행기)와 session(ModelSession)을 채우며,
+    사용 중인 요청 수(active)가 0인 동안에만 메모리에서 내려갈 수 있습니다.
+    """
+
+    def __init__(self, model_id, path, nbytes):
+        self.model_id = model_id
+        self.path = path
+        self.nbytes = nbytes
+        self.state = "loading"
+        self.executor = None
+        self.session = None
+        self.caches = {}
+        self.error = None
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.load_seconds = None
+        self.ready = None
+        # 로드 진행 상황 (로더가 report()로 갱신)
+        self.phase = "queued"
+        self.progress = 0.0
+        self.load_started = None
+        # 로드 완료를 기다리는 요청 수
+        self.parked = 0
+
+    def report(self, phase, progress):
+        """
+        로드 진행 상황을 기록합니다.
+
+        Args:
+            phase (str): 현재 단계 이름 (예: "weights", "session")
+            progress (float): 0.0 ~ 1.0 진행률
+        """
+        self.phase = phase
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        logger.info(f"모델 로드 진행 ({self.model_id}): {phase} {self.progress * 100:.0f}%")
+
+    def info(self):
+        elapsed = None
+        if self.state == "loading" and self.load_started is not None:
+            elapsed = time.monotonic() - self.load_started
+        return {
+            "id": self.model_id,
+            "state": self.state,
+            "bytes": self.nbytes,
+            "active_requests": self.active,
+            "parked_requests": self.parked,
+            "phase": self.phase,
+            "progress": self.progress,
+            "loading_seconds": elapsed,
+            "load_seconds": self.load_seconds,
+            "error": str(self.error) if self.error else None
+        }
+
+class ModelRegistry:
+    """
+    여러 모델을 메모리 예산 안에서 상주시키는 레지스트리
+
+    요청의 model 필드로 모델을 찾고, 상주하지 않은 모델은 백그라운드 작업으로 로드합니다.
+    다른 모델들은 각자의 추론 실행기에서 계속 요청을 처리합니다.
+    새 모델을 올릴 공간이 부족하면 사용 중이 아닌 모델을 가장 오래 사용되지 않은 순서로 내립니다.
+
+    Args:
+        discover (callable): {모델 ID: 경로}를 반환하는 함수
+        loader (callable): ModelHandle을 받아 executor/session을 채우는 비동기 함수
+        unloader (callable, optional): 내려가는 ModelHandle의 자원을 해제하는 함수
+        memory_budget (int): 상주 모델 가중치 합계 한도(바이트)
+        default_model (str, optional): 요청의 model이 알 수 없는 값일 때 사용할 모델 ID
+        retry_after (int): 503 응답의 Retry-After 값(초)
+        max_wait (float, optional): 로드 중인 모델을 기다리는 최대 시간(초). None이면 무제한
+        max_parked (int, optional): 모델별로 로드 완료를 기다릴 수 있는 최대 요청 수. None이면 무제한
+        index (ModelIndex, optional): 로드 전에 가중치 파일을 검증하고 크기를 구할 모델 인덱스
+        extra_bytes (callable, optional): 모델 ID -> 모델과 함께 올라가는 추가 메모리 (예: 추측 디코딩 초안 모델)
+    """
+
+    def __init__(self, discover, loader, unloader=None, memory_budget=48 * 1024 ** 3, default_model=None,
+                 retry_after=5, max_wait=None, max_parked=None, index=None, extra_bytes=None):
+        self.discover = discover
+        self.index = index
+        self.extra_bytes = extra_bytes
+        self.loader = loader
+        self.unloader = unloader
+        self.memory_budget = memory_budget
+        self.default_model = default_model
+        self.retry_after = retry_after
+        self.max_wait = max_wait
+        self.max_parked = max_parked
+        self.available = {}
+        self.handles = {}
+        self.evictions = 0
+        self.park_timeouts = 0
+        self.refresh()
+
+    def refresh(self):
+        """모델 디렉토리를 다시 검색"""
+        self.available = dict(self.discover())
+        if self.default_model not in self.available:
+            self.default_model = next(iter(self.available), None)
+        return self.available
+
+    def resolve(self, name):
+        """
+        요청의 model 값을 모델 ID로 변환합니다.
+
+        정확히 일치하는 ID, 대소문자만 다른 ID 순으로 찾고, 없으면 기본 모델을 사용합니다.
+        """
+        if name in self.available:
+            return name
+        lowered = (name or "").lower()
+        for model_id in self.available:
+            if model_id.lower() == lowered:
+                return model_id
+        if self.default_model is None:
+            raise ModelUnavailable("사용 가능한 모델이 없습니다.", status_code=503, retry_after=self.retry_after)
+        return self.default_model
+
+    @property
+    def resident_bytes(self):
+        return sum(h.nbytes for h in self.handles.values() if h.state in ("loading", "ready"))
+
+    async def acquire(self, name):
+        """
+        모델을 사용할 수 있을 때까지 기다린 뒤 사용 중으로 표시하여 반환합니다.
+        사용이 끝나면 반드시 release()를 호출해야 합니다.
+
+        로드 중인 모델을 요청하면 로드가 끝날 때까지 대기(parking)하며,
+        로드가 끝나면 기다리던 요청들이 한꺼번에 진행됩니다.
+
+        Args:
+            name (str): 요청의 model 값
+
+        Returns:
+            ModelHandle: 로드가 끝난 모델
+
+        Raises:
+            ModelUnavailable: 로드 실패, 메모리 예산 부족, 대기 한도 초과
+        """
+        model_id = self.resolve(name)
+        deadline = None if self.max_wait is None else time.monotonic() + self.max_wait
+        while True:
+            handle = self._start_load(model_id)
+            if not handle.ready.done():
+                await self._park(handle, deadline)
+            # 로드가 끝난 직후 다른 모델을 위해 내려간 경우 다시 로드
+            if handle.state != "evicted":
+                break
+        if handle.state != "ready":
+            raise ModelUnavailable(f"모델 로드 실패 ({model_id}): {handle.error}", status_code=503,
+                                   retry_after=self.retry_after)
+        handle.active += 1
+        handle.last_used = time.monotonic()
+        return handle
+
+    async def _park(self, handle, deadline):
+        """로드가 끝날 때까지 대기 (대기 중인 요청이 취소되어도 로드 작업은 계속 진행)"""
+        if self.max_parked is not None and handle.parked >= self.max_parked:
+            raise ModelUnavailable(
+                f"모델 로드 대기 요청이 너무 많습니다 ({handle.model_id}: {handle.parked}건)",
+                status_code=503, retry_after=self.retry_after
+            )
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        handle.parked += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(handle.ready), timeout)
+        except asyncio.TimeoutError:
+            self.park_timeouts += 1
+            raise ModelUnavailable(
+                f"모델 로드 중입니다 ({handle.model_id}: {handle.phase} {handle.progress * 100:.0f}%)",
+                status_code=503, retry_after=self.retry_after
+            )
+        finally:
+            handle.parked -= 1
+
+    def release(self, handle):
+        handle.active = max(handle.active - 1, 0)
+        handle.last_used = time.monotonic()
+
+    def preload(self, name=None):
+        """모델 로드를 백그라운드로 시작만 하고 바로 반환 (이미 상주 중이면 아무 작업도 하지 않음)"""
+        return self._start_load(self.resolve(name if name is not None else self.default_model))
+
+    def get(self, name=None):
+        """로드가 끝난 모델 (없거나 로드 중이면 None)"""
+        try:
+            handle = self.handles.get(self.resolve(name if name is not None else self.default_model))
+        except ModelUnavailable:
+            return None
+        return handle if handle is not None and handle.state == "ready" else None
+
+    def _start_load(self, model_id):
+        handle = self.handles.get(model_id)
+        if handle is not None and handle.state in ("loading", "ready"):
+            return handle
+        if handle is not None:
+            # 이전 로드가 실패한 경우 다시 시도
+            del self.handles[model_id]
+
+        path = self.available.get(model_id)
+        if path is None:
+            raise ModelUnavailable(f"모델을 찾을 수 없습니다: {model_id}", status_code=404)
+        nbytes = self._inspect(model_id, path)
+        if self.extra_bytes is not None:
+            nbytes += self.extra_bytes(model_id)
+        handle = ModelHandle(model_id, path, nbytes)
+        teardown = self._make_room(handle)
+        handle.ready = asyncio.get_running_loop().create_future()
+        self.handles[model_id] = handle
+        asyncio.get_running_loop().create_task(self._load(handle, teardown))
+        return handle
+
+    def _inspect(self, model_id, path):
+        """상주 메모리 추정치(가중치 바이트). 인덱스가 있으면 손상된 변환 결과를 로드 전에 거절"""
+        if self.index is None:
+            return _weights_nbytes(path)
+        info = self.index.scan(path)
+        if info["errors"]:
+            raise ModelUnavailable(f"모델 파일 검증 실패 ({model_id}): {'; '.join(info['errors'])}", status_code=500)
+        return info["total_bytes"]
+
+    def _make_room(self, incoming):
+        """
+        새 모델이 들어갈 공간이 생길 때까지 사용 중이 아닌 모델을 LRU 순서로 내림
+
+        Returns:
+            list: 내린 모델들의 자원 해제 future (해제는 별도 스레드에서 진행)
+        """
+        idle = sorted(
+            (h for h in self.handles.values() if h.state == "ready" and h.active == 0),
+            key=lambda h: h.last_used
+        )
+        teardown = []
+        while self.resident_bytes + incoming.nbytes > self.memory_budget and idle:
+            # 워커 종료 대기와 메모리 정리는 이벤트 루프를 막지 않도록 기본 스레드 풀에서 수행
+            handle = self._detach(idle.pop(0).model_id)
+            teardown.append(asyncio.get_running_loop().run_in_executor(None, self._unload, handle))
+        if self.resident_bytes + incoming.nbytes > self.memory_budget:
+            if any(h.state in ("loading", "ready") for h in self.handles.values()):
+                raise ModelUnavailable(
+                    f"메모리 예산 부족: {incoming.model_id}({incoming.nbytes / 1024 ** 3:.1f}GiB)를 올리려면 "
+                    f"사용 중인 모델이 끝나야 합니다", status_code=503, retry_after=self.retry_after
+                )
+            # 상주 모델이 없으면 예산보다 큰 모델도 하나는 허용
+            logger.warning(f"모델 크기가 메모리 예산보다 큽니다: {incoming.model_id}")
+        return teardown
+
+    async def _load(self, handle, teardown=()):
+        started = time.monotonic()
+        handle.load_started = started
+        if teardown:
+            # 자리를 비켜 준 모델의 메모리가 실제로 반환된 뒤에 가중치를 올림
+            handle.report("unloading", 0.0)
+            await asyncio.gather(*teardown)
+        handle.report("starting", 0.0)
+        logger.info(f"모델 로드 시작 ({handle.model_id}): 가중치 {handle.nbytes / 1024 ** 3:.2f}GiB")
+        try:
+            await self.loader(handle)
+            handle.state = "ready"
+            handle.report("ready", 1.0)
+            handle.load_seconds = time.monotonic() - started
+            logger.info(f"모델 로드 완료 ({handle.model_id}): {handle.load_seconds:.1f}초")
+        except Exception as e:
+            handle.state = "failed"
+            handle.phase = "failed"
+            handle.error = e
+            logger.error(f"모델 로드 실패 ({handle.model_id}): {e}")
+            await asyncio.get_running_loop().run_in_executor(None, self._unload, handle)
+        finally:
+            handle.last_used = time.monotonic()
+            handle.ready.set_result(handle.state)
+
+    def evict(self, model_id):
+        """모델을 메모리에서 내림 (자원 해제가 끝날 때까지 기다림, 요청 처리 중에는 _make_room이 스레드에서 해제)"""
+        handle = self._detach(model_id)
+        if handle is not None:
+            self._unload(handle)
+
+    def _detach(self, model_id):
+        handle = self.handles.pop(model_id, None)
+        if handle is None:
+            return None
+        logger.info(f"모델 내림 ({model_id}): {handle.nbytes / 1024 ** 3:.2f}GiB 확보")
+        handle.state = "evicted"
+        self.evictions += 1
+        return handle
+
+    def _unload(self, handle):
+        if self.unloader is not None:
+            try:
+                self.unloader(handle)
+            except Exception as e:
+                logger.warning(f"모델 자원 해제 실패 ({handle.model_id}): {e}")
+        handle.executor = None
+        handle.session = None
+        handle.caches = {}
+
+    def shutdown(self):
+        for model_id in list(self.handles):
+            self.evict(model_id)
+
+    def stats(self):
+        return {
+            "default_model": self.default_model,
+            "memory_budget": self.memory_budget,
+            "resident_bytes": self.resident_bytes,
+            "evictions": self.evictions,
+            "park_timeouts": self.park_timeouts,
+            "parked_requests": sum(h.parked for h in self.handles.values()),
+            "available": list(self.available),
+            "models": {model_id: handle.info() for model_id, handle in self.handles.items()}
+        }
+
+def _weights_nbytes(path):
+    """모델 디렉토리의 가중치 파일 크기 합계 (상주 메모리 추정치)"""
+    total = 0
+    try:
+        for name in os.listdir(path):
+            if name.endswith(WEIGHT_EXTENSIONS):
+                total += os.path.getsize(os.path.join(path, name))
+    except OSError as e:
+        logger.warning(f"가중치 크기 확인 실패 ({path}): {e}")
+    return total
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+from collections import deque
+
+from .stop_sequences import StopSequenceMatcher
+
+logger = logging.getLogger(__name__)
+
+class Sequence:
+    """
+    스케줄러가 관리하는 생성 시퀀스 하나
+
+    생성된 텍스트 조각은 채널(AsyncChannel)로 전달되고, 종료 이유와 지연 시간 통계는
+    채널이 닫힌 뒤 이 객체에서 읽을 수 있습니다.
+
+    요청에 중단 문자열(stop)이 있으면 텍스트 조각을 채널로 보내기 전에 매처를 거치며,
+    중단 문자열의 앞부분일 수 있는 끝부분은 다음 조각이 올 때까지 보류됩니다.
+    요청의 n이 1보다 크면 첫 번째 시퀀스가 프리필하고 나머지(forks)는 그 상태를 복제해 갈라져 나옵니다.
+    """
+
+    def __init__(self, request, channel=None, index=0):
+        self.request = request
+        self.index = index
+        self.id = request.request_id if index == 0 else f"{request.request_id}.{index}"
+        self.channel = channel
+        self.forks = []
+        self.stop_matcher = StopSequenceMatcher(request.stop) if request.stop else None
+        self.state = None
+        self.tokens = []
+        self.text_parts = []
+        self.prompt_tokens = 0
+        self.image_tokens = 0
+        self.cached_tokens = 0
+        self.finish_reason = None
+        self.error = None
+        # 이벤트 루프 스레드가 설정하고 워커 스레드가 토큰 경계에서 확인 (cancel 참고)
+        self.cancelled = False
+        self.submitted_at = time.monotonic()
+        self.admitted_at = None
+        self.first_token_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.finish_reason is not None
+
+    @property
+    def text(self):
+        return "".join(self.text_parts)
+
+    def latency(self):
+        """
+        요청별 지연 시간 통계를 반환합니다.
+
+        Returns:
+            dict: 대기 시간, 첫 토큰까지 시간, 전체 시간(초)과 생성 토큰 수, 초당 토큰 수
+        """
+        end = self.finished_at or time.monotonic()
+        stats = {
+            "queue_wait": (self.admitted_at or end) - self.submitted_at,
+            "time_to_first_token": (self.first_token_at - self.submitted_at) if self.first_token_at else None,
+            "total_time": end - self.submitted_at,
+            "completion_tokens": len(self.tokens),
+            "tokens_per_second": None
+        }
+        if self.first_token_at and len(self.tokens) > 1 and end > self.first_token_at:
+            stats["tokens_per_second"] = (len(self.tokens) - 1) / (end - self.first_token_at)
+        return stats
+
+    def usage(self):
+        """
+        OpenAI 형식의 토큰 사용량을 반환합니다.
+
+        Returns:
+            dict: prompt/completion/total 토큰 수와 세부 정보.
+                  prefill_tokens는 실제로 프리필한 토큰 수(접두사 캐시 재사용분 제외),
+                  decode_tokens는 디코딩 단계에서 생성한 토큰 수(첫 토큰은 프리필에서 생성됨)
+        """
+        completion_tokens = len(self.tokens)
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": self.prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {
+                "cached_tokens": self.cached_tokens,
+                "image_tokens": self.image_tokens
+            },
+            "prefill_tokens": self.prompt_tokens - self.cached_tokens,
+            "decode_tokens": max(completion_tokens - 1, 0)
+        }
+
+    def stream(self, max_batch=64):
+        """생성된 텍스트 조각을 묶음 단위로 반환하는 비동기 이터레이터"""
+        return self.channel.batches(max_batch)
+
+    def cancel(self):
+        """
+        생성 취소 요청 (클라이언트 연결 종료 등, 어느 스레드에서나 호출 가능)
+
+        대기 중이면 배치에 합류하지 않고, 디코딩 중이면 다음 토큰 경계에서 종료 이유 "cancelled"로 끝나며
+        백엔드 상태(KV 캐시)가 해제됩니다.
+        """
+        self.cancelled = True
+
+    async def wait(self):
+        """생성이 끝날 때까지 기다린 뒤 전체 텍스트 반환"""
+        async for _ in self.channel.batches():
+            pass
+        return self.text
+
+def merge_usage(sequences):
+    """
+    같은 프롬프트에서 갈라진 시퀀스들(n > 1)의 토큰 사용량 합계
+
+    프롬프트는 한 번만 처리했으므로 첫 시퀀스의 프롬프트 사용량을 쓰고, 생성 토큰은 모두 더합니다.
+
+    Args:
+        sequences (list): [첫 시퀀스, 갈라진 시퀀스...]
+
+    Returns:
+        dict: Sequence.usage()와 같은 형식
+    """
+    usage = sequences[0].usage()
+    usage["completion_tokens"] = sum(len(seq.tokens) for seq in sequences)
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    usage["decode_tokens"] = sum(max(len(seq.tokens) - 1, 0) for seq in sequences)
+    return usage
+
+class BatchScheduler:
+    """
+    연속 배치(continuous batching) 스케줄러
+
+    새 요청은 토큰 경계에서 실행 중인 디코딩 배치에 합류하고, 끝난 시퀀스는 즉시 배치에서 빠집니다.
+    n > 1 요청은 프리필을 한 번만 하고 백엔드의 fork(state)로 상태를 복제해 n개 시퀀스가 함께 합류합니다
+    (fork가 없거나 None을 반환하는 백엔드는 갈라진 시퀀스마다 프리필).
+    모든 메서드는 추론 실행기의 워커 스레드에서 호출되므로 별도의 잠금이 필요하지 않습니다.
+    """
+
+    def __init__(self, backend, max_batch_size=8, on_admit=None, on_finish=None):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.on_admit = on_admit
+        self.on_finish = on_finish
+        self.waiting = deque()
+        self.running = []
+        self.completed = 0
+
+    def add(self, seq):
+        """대기열에 시퀀스 추가 (다음 토큰 경계에서 배치에 합류)"""
+        self.waiting.append(seq)
+
+    def has_work(self):
+        return bool(self.waiting or self.running)
+
+    def step(self):
+        """대기 중인 시퀀스를 배치에 합류시키고 배치 전체를 한 토큰 진행"""
+        self._drop_cancelled()
+        self._admit()
+        if self.running:
+            self._decode()
+        self.running = [seq for seq in self.running if not seq.done]
+
+    def _drop_cancelled(self):
+        """취소된 시퀀스를 대기열과 배치에서 제거"""
+        if any(seq.cancelled for seq in self.waiting):
+            kept = deque()
+            for seq in self.waiting:
+                if not seq.cancelled:
+                    kept.append(seq)
+                    continue
+                # 합류 전이므로 함께 갈라질 시퀀스들도 끝냄
+                for member in [seq] + seq.forks:
+                    if not member.done:
+                        self._finish(member, "cancelled")
+            self.waiting = kept
+        for seq in self.running:
+            if seq.cancelled and not seq.done:
+                self._finish(seq, "cancelled")
+        self.running = [seq for seq in self.running if not seq.done]
+
+    def _admit(self):
+        while self.waiting and len(self.running) < self.max_batch_size:
+            seq = self.waiting[0]
+            # 같은 프롬프트에서 갈라지는 시퀀스들은 함께 합류 (배치가 비어 있으면 한도를 넘어도 합류)
+            if self.running and len(self.running) + 1 + len(seq.forks) > self.max_batch_size:
+                break
+            self.waiting.popleft()
+            seq.admitted_at = time.monotonic()
+            if self.on_admit is not None:
+                self.on_admit(seq)
+            try:
+                seq.state, first = self.backend.prefill(seq.request)
+            except Exception as e:
+                logger.error(f"프리필 실패 ({seq.id}): {e}")
+                self._finish(seq, "error", e)
+                for fork in seq.forks:
+                    self._finish(fork, "error", e)
+                continue
+            # 첫 토큰을 받기 전에 복제 (첫 토큰에서 끝나면 상태가 해제됨)
+            firsts = [first] + [self._fork(seq, fork) for fork in seq.forks]
+            for member, output in zip([seq] + seq.forks, firsts):
+                if member.done:
+                    continue
+                member.prompt_tokens = getattr(member.state, "prompt_tokens", 0)
+                member.image_tokens = getattr(member.state, "image_tokens", 0)
+                member.cached_tokens = getattr(member.state, "cached_tokens", 0)
+                self.running.append(member)
+                self._accept(member, output)
+
+    def _fork(self, parent, seq):
+        """프리필한 시퀀스의 상태를 복제해 새 시퀀스 시작 (첫 토큰 반환)"""
+        seq.admitted_at = time.monotonic()
+        fork = getattr(self.backend, "fork", None)
+        try:
+            result = fork(parent.state) if fork is not None else None
+            if result is None:
+                result = self.backend.prefill(seq.request)
+        except Exception as e:
+            logger.error(f"시퀀스 복제 실패 ({seq.id}): {e}")
+            self._finish(seq, "error", e)
+            return None
+        seq.state, first = result
+        return first
+
+    def _decode(self):
+        active = [seq for seq in self.running if not seq.done]
+        if not active:
+            return
+        try:
+            outputs = self.backend.decode([seq.state for seq in active])
+        except Exception as e:
+            logger.error(f"디코딩 실패: {e}")
+            for seq in active:
+                self._finish(seq, "error", e)
+            return
+        for seq, output in zip(active, outputs):
+            self._accept(seq, output)
+
+    def _accept(self, seq, output):
+        # 한 시퀀스의 토큰 처리 오류는 그 시퀀스만 끝냄 (step 밖으로 나가면 배치 전체가 멈춤)
+        try:
+            # 추측 디코딩은 한 단계에서 여러 토큰을 확정하므로 목록으로 전달됨 (None이 있으면 거기서 종료)
+            if isinstance(output, list):
+                for item in output:
+                    if seq.done:
+                        break
+                    self._accept_one(seq, item)
+                return
+            self._accept_one(seq, output)
+        except Exception as e:
+            logger.error(f"토큰 처리 실패 ({seq.id}): {e}")
+            if not seq.done:
+                self._finish(seq, "error", e)
+
+    def _accept_one(self, seq, output):
+        if output is None:
+            self._finish(seq, "stop")
+            return
+        if seq.first_token_at is None:
+            seq.first_token_at = time.monotonic()
+        seq.tokens.append(output.token)
+        text = output.text
+        if text and seq.stop_matcher is not None:
+            text = seq.stop_matcher.feed(text)
+        self._put_text(seq, text)
+        if seq.stop_matcher is not None and seq.stop_matcher.matched is not None:
+            # 중단 문자열이 나타나면 남은 max_tokens와 관계없이 바로 종료
+            self._finish(seq, "stop")
+        elif len(seq.tokens) >= seq.request.max_tokens:
+            self._finish(seq, "length")
+
+    def _put_text(self, seq, text):
+        if text:
+            seq.text_parts.append(text)
+            if seq.channel is not None:
+                seq.channel.put(text)
+
+    def _finish(self, seq, reason, error=None):
+        if seq.stop_matcher is not None:
+            # 중단 문자열 없이 끝났으면 보류해 둔 끝부분도 응답에 포함
+            self._put_text(seq, seq.stop_matcher.flush())
+        seq.finish_reason = reason
+        seq.error = error
+        seq.finished_at = time.monotonic()
+        if seq.state is not None:
+            try:
+                self.backend.release(seq.state)
+            except Exception as e:
+                logger.warning(f"시퀀스 상태 해제 실패 ({seq.id}): {e}")
+        seq.state = None
+        self.completed += 1
+
+        stats = seq.latency()
+        ttft = stats["time_to_first_token"]
+        logger.info(
+            f"시퀀스 완료 ({seq.id}): 종료 이유 {reason}, 프롬프트 {seq.prompt_tokens}토큰"
+            f"(캐시 {seq.cached_tokens}, 이미지 {seq.image_tokens}), 생성 {stats['completion_tokens']}토큰, "
+            f"대기 {stats['queue_wait']:.2f}초, 첫 토큰 {ttft if ttft is None else f'{ttft:.2f}초'}, "
+            f"전체 {stats['total_time']:.2f}초"
+        )
+
+        if self.on_finish is not None:
+            try:
+                self.on_finish(seq)
+            except Exception as e:
+                logger.warning(f"완료 콜백 실패 ({seq.id}): {e}")
+
+        if seq.channel is not None:
+            if error is not None:
+                seq.channel.fail(error)
+            else:
+                seq.channel.close()
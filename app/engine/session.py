@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from jinja2.sandbox import ImmutableSandboxedEnvironment
+    from jinja2.exceptions import TemplateError
+except ImportError:
+    ImmutableSandboxedEnvironment = None
+    TemplateError = None
+
+# Qwen 계열 채팅 형식 (템플릿을 사용할 수 없을 때의 기본 형식)
+IM_START = "<|im_start|>"
+IM_END = "<|im_end|>"
+IMAGE_PLACEHOLDER = "<|vision_start|><|image_pad|><|vision_end|>"
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
+STOP_TOKENS = (IM_END, "<|endoftext|>")
+
+def _raise_exception(message):
+    raise TemplateError(message)
+
+class ModelSession:
+    """
+    로드된 모델 하나에 대한 요청 처리 준비물
+
+    모델을 로드할 때 한 번만 만들어, 요청마다 반복하던 작업을 미리 해 둡니다.
+    - 모델 설정(config.json) 파싱
+    - 채팅 템플릿 컴파일 (Jinja 템플릿 객체)
+    - 생성 중단 토큰 ID
+
+    요청 경로에서는 파일 시스템 접근이나 템플릿 컴파일 없이 format_conversation만 호출합니다.
+    컴파일된 템플릿은 프로세서 상태를 건드리지 않으므로 추론 워커가 아닌 스레드에서도 호출할 수 있습니다.
+    """
+
+    def __init__(self, model_id, model_path, model, processor, config=None):
+        self.model_id = model_id
+        self.model_path = model_path
+        self.model = model
+        self.processor = processor
+        self.tokenizer = getattr(processor, "tokenizer", processor)
+        self.config = config if config is not None else _read_config(model_path)
+        self.template = self._compile_template()
+        self.template_context = self._template_context()
+        self.stop_token_ids = self._find_stop_token_ids()
+
+    @classmethod
+    def create(cls, model_id, model_path, model, processor, load_config=None):
+        """
+        모델 로드 직후 세션을 생성합니다.
+
+        Args:
+            model_id (str): 모델 ID
+            model_path (str): 모델 디렉토리 절대 경로
+            model: 로드된 모델
+            processor: 로드된 프로세서
+            load_config (callable, optional): 모델 설정 로더 (mlx_vlm.utils.load_config)
+
+        Returns:
+            ModelSession: 생성된 세션
+        """
+        config = None
+        if load_config is not None:
+            try:
+                config = load_config(model_path)
+            except Exception as e:
+                logger.warning(f"모델 설정 로드 실패, config.json 직접 읽기: {e}")
+        session = cls(model_id, model_path, model, processor, config=config)
+        logger.info(
+            f"모델 세션 준비 완료: {model_id} (모델 타입 {session.config.get('model_type', 'unknown')}, "
+            f"템플릿 {'컴파일됨' if session.template is not None else '기본 형식'}, "
+            f"중단 토큰 {sorted(session.stop_token_ids)})"
+        )
+        return session
+
+    # --- 초기화 ---
+
+    def _chat_template_source(self):
+        for owner in (self.processor, self.tokenizer):
+            template = getattr(owner, "chat_template", None)
+            if isinstance(template, dict):
+                template = template.get("default")
+            if isinstance(template, str) and template:
+                return template
+        return None
+
+    def _compile_template(self):
+        source = self._chat_template_source()
+        if source is None or ImmutableSandboxedEnvironment is None:
+            return None
+        try:
+            env = ImmutableSandboxedEnvironment(trim_blocks=True, lstrip_blocks=True)
+            env.globals["raise_exception"] = _raise_exception
+            return env.from_string(source)
+        except Exception as e:
+            logger.warning(f"채팅 템플릿 컴파일 실패, 기본 형식 사용: {e}")
+            return None
+
+    def _template_context(self):
+        context = {}
+        for name in ("bos_token", "eos_token", "pad_token", "unk_token"):
+            value = getattr(self.tokenizer, name, None)
+            if value is not None:
+                context[name] = str(value)
+        return context
+
+    def _find_stop_token_ids(self):
+        ids = set()
+        eos = getattr(self.tokenizer, "eos_token_id", None)
+        if isinstance(eos, int):
+            ids.add(eos)
+        config_eos = self.config.get("eos_token_id")
+        if config_eos is None:
+            config_eos = getattr(getattr(self.model, "config", None), "eos_token_id", None)
+        if isinstance(config_eos, int):
+            ids.add(config_eos)
+        elif isinstance(config_eos, (list, tuple)):
+            ids.update(config_eos)
+        # Qwen 계열 채팅 템플릿의 턴 종료 토큰
+        for token in STOP_TOKENS:
+            try:
+                token_id = self.tokenizer.convert_tokens_to_ids(token)
+            except Exception:
+                continue
+            unk = getattr(self.tokenizer, "unk_token_id", None)
+            if isinstance(token_id, int) and token_id >= 0 and token_id != unk:
+                ids.add(token_id)
+        return ids
+
+    # --- 요청 경로 ---
+
+    def format_conversation(self, conversation):
+        """
+        대화 전체에 채팅 템플릿을 적용한 프롬프트를 생성합니다.
+
+        Args:
+            conversation (list): {"role", "content": [{"type": "text"|"image", ...}]} 형식의 메시지 목록
+
+        Returns:
+            str: 생성 프롬프트가 추가된 프롬프트 문자열
+        """
+        if self.template is not None:
+            try:
+                return self.template.render(
+                    messages=conversation,
+                    add_generation_prompt=True,
+                    **self.template_context
+                )
+            except Exception as e:
+                logger.warning(f"채팅 템플릿 적용 실패, 기본 형식 사용: {e}")
+        return format_chatml(conversation)
+
+def format_chatml(conversation):
+    """
+    Qwen 채팅 형식(ChatML)으로 대화를 직접 포맷합니다.
+
+    Args:
+        conversation (list): 채팅 메시지 목록
+
+    Returns:
+        str: 프롬프트 문자열
+    """
+    parts = []
+    if not conversation or conversation[0]["role"] != "system":
+        parts.append(f"{IM_START}system\n{DEFAULT_SYSTEM_PROMPT}{IM_END}\n")
+    for message in conversation:
+        content = "".join(
+            IMAGE_PLACEHOLDER if part["type"] == "image" else part.get("text", "")
+            for part in message["content"]
+        )
+        parts.append(f"{IM_START}{message['role']}\n{content}{IM_END}\n")
+    parts.append(f"{IM_START}assistant\n")
+    return "".join(parts)
+
+def _read_config(model_path):
+    try:
+        with open(os.path.join(model_path, "config.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"config.json 읽기 실패: {e}")
+        return {}
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .model_index import read_safetensors_header, find_weight_files
+
+logger = logging.getLogger(__name__)
+
+# 샤드를 읽어 들일 때 한 번에 읽는 크기
+READ_CHUNK_BYTES = 16 * 1024 * 1024
+
+class SafetensorsShard:
+    """
+    메모리 매핑된 safetensors 파일 하나
+
+    tensor()는 데이터를 복사하지 않는 memoryview를 반환하므로 실제로 접근한 텐서의 페이지만
+    디스크에서 읽힙니다.
+
+    Args:
+        path (str): safetensors 파일 경로
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.tensors, self.metadata = read_safetensors_header(path)
+        with open(path, "rb") as f:
+            self.nbytes = os.fstat(f.fileno()).st_size
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+    def tensor(self, name):
+        """텐서 원본 바이트 (복사 없음, 샤드를 닫기 전까지 유효)"""
+        info = self.tensors[name]
+        return self._view[info.offset:info.offset + info.nbytes]
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+
+def read_through(path, chunk_bytes=READ_CHUNK_BYTES):
+    """
+    파일 전체를 순차적으로 읽어 페이지 캐시에 올립니다.
+
+    readinto는 읽는 동안 GIL을 놓기 때문에 여러 스레드에서 호출하면 샤드들이 실제로 동시에 읽힙니다.
+    (mmap 슬라이스 복사는 GIL을 잡은 채 페이지 폴트가 나므로 병렬로 읽히지 않음)
+
+    Returns:
+        int: 읽은 바이트 수
+    """
+    buffer = bytearray(chunk_bytes)
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            total += n
+    return total
+
+class ShardedSafetensors:
+    """
+    단일 파일 또는 샤드(model-0000N-of-0000M.safetensors)로 저장된 모델 가중치
+
+    load()는 샤드를 스레드 풀에서 동시에 메모리 매핑하고 읽어 들이며 샤드별 소요 시간을 기록합니다.
+    큰 모델의 로드 시간이 단일 스레드 읽기 속도가 아니라 디스크 대역폭에 맞춰 줄어듭니다.
+
+    Args:
+        model_path (str): 모델 디렉토리 경로
+    """
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.paths, self.weight_map, errors = find_weight_files(model_path)
+        if errors:
+            raise FileNotFoundError(f"{model_path}: {'; '.join(errors)}")
+        self.shards = {}
+        self.timings = []
+
+    def load(self, max_workers=4, read=True):
+        """
+        모든 샤드를 동시에 열고(메모리 매핑) 읽어 들입니다.
+
+        Args:
+            max_workers (int): 동시에 읽을 샤드 수
+            read (bool): False면 메모리 매핑만 하고 데이터는 접근할 때 읽음
+
+        Returns:
+            list: 샤드별 {"file", "bytes", "seconds", "mb_per_s"} (파일 이름순)
+        """
+        def open_shard(path):
+            started = time.perf_counter()
+            shard = SafetensorsShard(path)
+            nbytes = read_through(path) if read else 0
+            seconds = time.perf_counter() - started
+            return shard, {
+                "file": shard.name,
+                "bytes": nbytes,
+                "seconds": seconds,
+                "mb_per_s": nbytes / 1024 ** 2 / seconds if seconds > 0 else 0.0
+            }
+
+        started = time.perf_counter()
+        workers = max(1, min(max_workers, len(self.paths)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-loader") as pool:
+            results = list(pool.map(open_shard, self.paths))
+        elapsed = time.perf_counter() - started
+
+        for shard, timing in results:
+            self.shards[shard.name] = shard
+        self.timings = [timing for _, timing in results]
+        total = sum(timing["bytes"] for timing in self.timings)
+        logger.info(
+            f"가중치 샤드 {len(self.paths)}개 로드 ({workers}개 스레드): {total / 1024 ** 3:.2f}GiB, "
+            f"{elapsed:.2f}초 ({total / 1024 ** 2 / max(elapsed, 1e-9):.0f}MB/s)"
+        )
+        return self.timings
+
+    def names(self):
+        """모든 텐서 이름"""
+        names = []
+        for shard in self._open_shards():
+            names.extend(shard.tensors)
+        return names
+
+    def tensor(self, name):
+        """텐서 원본 바이트 (복사 없음)"""
+        if self.weight_map is not None and name in self.weight_map:
+            return self.shard(self.weight_map[name]).tensor(name)
+        for shard in self._open_shards():
+            if name in shard.tensors:
+                return shard.tensor(name)
+        raise KeyError(name)
+
+    def shard(self, file_name):
+        """파일 이름으로 샤드 (처음 접근할 때 메모리 매핑)"""
+        shard = self.shards.get(file_name)
+        if shard is None:
+            shard = SafetensorsShard(os.path.join(self.model_path, file_name))
+            self.shards[file_name] = shard
+        return shard
+
+    def _open_shards(self):
+        return [self.shard(os.path.basename(path)) for path in self.paths]
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.close()
+        self.shards = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+# 초안 길이 기본값과 범위
+DEFAULT_DRAFT_TOKENS = 4
+MAX_DRAFT_TOKENS = 8
+
+class AdaptiveDraftLength:
+    """
+    시퀀스별 초안 길이(k) 조절기
+
+    초안이 모두 채택되면 k를 하나 늘리고, 절반도 채택되지 않으면 하나 줄입니다.
+    채택률이 높은 구간(정형화된 답변, 반복 구문)에서는 검증 한 번에 더 많은 토큰을 확정하고,
+    낮은 구간에서는 버려질 초안 계산을 줄입니다.
+
+    Args:
+        k (int): 초기 초안 길이
+        min_k (int): 최소 초안 길이
+        max_k (int): 최대 초안 길이
+        adaptive (bool): False면 k를 고정
+    """
+
+    def __init__(self, k=DEFAULT_DRAFT_TOKENS, min_k=1, max_k=MAX_DRAFT_TOKENS, adaptive=True):
+        self.min_k = max(1, min_k)
+        self.max_k = max(self.min_k, max_k)
+        self.k = min(max(k, self.min_k), self.max_k)
+        self.adaptive = adaptive
+
+    def update(self, drafted, accepted):
+        """검증 결과로 다음 초안 길이 조절"""
+        if not self.adaptive or drafted <= 0:
+            return self.k
+        if accepted >= drafted:
+            self.k = min(self.k + 1, self.max_k)
+        elif accepted * 2 < drafted:
+            self.k = max(self.k - 1, self.min_k)
+        return self.k
+
+def accept_greedy(draft, targets):
+    """
+    탐욕적 검증: 대상 모델의 예측과 일치하는 초안 앞부분의 길이
+
+    Args:
+        draft (list): 초안 토큰 [d1, ..., dk]
+        targets (list): 대상 모델이 각 위치에서 고른 토큰 [t0, ..., tk] (t(i-1)이 di에 대응)
+
+    Returns:
+        int: 채택된 초안 토큰 수 n (다음 토큰은 targets[n])
+    """
+    n = 0
+    while n < len(draft) and draft[n] == targets[n]:
+        n += 1
+    return n
+
+class PromptLookupProposer:
+    """
+    프롬프트 n-gram 조회 초안 제안기 (초안 모델 없음)
+
+    지금까지의 토큰(프롬프트 + 생성된 출력)에서 마지막 n개 토큰과 같은 n-gram이 앞에 나온 위치를 찾아
+    그 뒤에 이어진 토큰들을 초안으로 제안합니다. 이미지 속 글자 옮겨 적기, 내용 재구성처럼 출력이
+    프롬프트를 많이 베끼는 요청에서 채택률이 높습니다.
+
+    n-gram마다 가장 최근에 나온 위치(이어지는 토큰의 시작 위치)를 색인해 두므로 조회는 상수 시간입니다.
+    채택률(지수 이동 평균)이 min_acceptance 아래로 떨어지면 cooldown 단계 동안 제안을 멈춥니다.
+
+    Args:
+        tokens (list): 프롬프트 토큰 ID
+        max_ngram (int): 조회할 최대 n-gram 길이 (긴 것부터 시도)
+        min_ngram (int): 조회할 최소 n-gram 길이
+        num_tokens (int): 한 번에 제안할 최대 토큰 수
+        min_acceptance (float): 이 채택률 아래로 떨어지면 제안을 잠시 멈춤
+        cooldown (int): 제안을 멈추는 디코딩 단계 수
+        ignore (tuple): 색인하지 않을 토큰 ID (이미지 자리 표시 토큰 등)
+    """
+
+    def __init__(self, tokens, max_ngram=3, min_ngram=1, num_tokens=10, min_acceptance=0.3, cooldown=16, ignore=()):
+        self.max_ngram = max_ngram
+        self.min_ngram = max(1, min_ngram)
+        self.num_tokens = num_tokens
+        self.min_acceptance = min_acceptance
+        self.cooldown = cooldown
+        self.ignore = set(ignore)
+        self.tokens = []
+        self.acceptance = 1.0
+        self.paused = 0
+        self._index = {}
+        self.extend(tokens)
+
+    def extend(self, tokens):
+        """확정된 토큰 추가"""
+        for token in tokens:
+            position = len(self.tokens)
+            # 새 토큰이 이어지는 n-gram(바로 앞 n개 토큰)을 색인
+            if token not in self.ignore:
+                for n in range(self.min_ngram, self.max_ngram + 1):
+                    if position < n:
+                        break
+                    key = tuple(self.tokens[position - n:position])
+                    if not self.ignore.intersection(key):
+                        self._index[key] = position
+            self.tokens.append(token)
+
+    def propose(self, k):
+        """
+        초안 토큰 제안 (일치하는 n-gram이 없거나 멈춘 상태면 빈 목록)
+
+        Args:
+            k (int): 제안할 최대 토큰 수 (num_tokens로도 제한)
+        """
+        if self.paused:
+            self.paused -= 1
+            return []
+        k = min(k, self.num_tokens)
+        for n in range(self.max_ngram, self.min_ngram - 1, -1):
+            if len(self.tokens) < n:
+                continue
+            position = self._index.get(tuple(self.tokens[-n:]))
+            if position is not None:
+                return self.tokens[position:position + k]
+        return []
+
+    def update(self, drafted, accepted):
+        """검증 결과 기록 (채택률이 떨어지면 cooldown 동안 제안을 멈추고 다시 시도)"""
+        if drafted <= 0:
+            return
+        self.acceptance = 0.7 * self.acceptance + 0.3 * (accepted / drafted)
+        if self.acceptance < self.min_acceptance:
+            self.paused = self.cooldown
+            self.acceptance = 1.0
+
+class SpeculationStats:
+    """
+    추측 디코딩 통계 (모델별, 방식별)
+
+    방식(draft: 초안 모델, prompt_lookup: 프롬프트 n-gram 조회)마다 검증 횟수와 채택 토큰 수, 소요 시간을 모으고,
+    추측 없이 토큰 하나씩 디코딩한 단계의 시간과 비교해 디코딩 속도 향상 배수를 계산합니다.
+    워커 스레드가 기록하고 이벤트 루프(/metrics, /v1/registry)가 읽으므로 잠금으로 보호합니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+        self.plain_steps = 0
+        self.plain_seconds = 0.0
+
+    def record(self, method, drafted, accepted, emitted, seconds=0.0):
+        """
+        검증 한 번의 결과 기록
+
+        Args:
+            method (str): 추측 방식
+            drafted (int): 초안 토큰 수
+            accepted (int): 채택된 초안 토큰 수
+            emitted (int): 이번 검증으로 확정된 토큰 수 (채택분 + 대상 모델이 고른 다음 토큰)
+            seconds (float): 초안 생성과 검증에 걸린 시간
+        """
+        with self._lock:
+            counters = self._methods.setdefault(method, [0, 0, 0, 0, 0.0])
+            counters[0] += 1
+            counters[1] += drafted
+            counters[2] += accepted
+            counters[3] += emitted
+            counters[4] += seconds
+
+    def record_plain(self, seconds):
+        """추측 없이 토큰 하나를 디코딩한 단계 기록 (속도 향상 비교 기준)"""
+        with self._lock:
+            self.plain_steps += 1
+            self.plain_seconds += seconds
+
+    def stats(self):
+        """
+        Returns:
+            dict: {방식: rounds, drafted_tokens, accepted_tokens, acceptance_rate,
+                   tokens_per_round(대상 모델 forward 한 번에 확정된 평균 토큰 수),
+                   speedup(추측 없는 디코딩 대비 토큰 처리 속도 배수, 비교 기준이 없으면 None)}
+        """
+        with self._lock:
+            baseline = self.plain_seconds / self.plain_steps if self.plain_steps and self.plain_seconds > 0 else None
+            result = {}
+            for method, (rounds, drafted, accepted, emitted, seconds) in self._methods.items():
+                speedup = None
+                if baseline is not None and seconds > 0:
+                    speedup = (emitted / seconds) * baseline
+                result[method] = {
+                    "rounds": rounds,
+                    "drafted_tokens": drafted,
+                    "accepted_tokens": accepted,
+                    "acceptance_rate": accepted / drafted if drafted else 0.0,
+                    "tokens_per_round": emitted / rounds if rounds else 0.0,
+                    "speedup": speedup
+                }
+            return result
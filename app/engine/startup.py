@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class StartupProfiler:
+    """
+    서버 시작 시간 분석기
+
+    모듈 임포트 시간과 모델 로드 단계별 시간을 기록해 시작 직후 한 번에 보고합니다.
+    워커 재시작이나 수평 확장 시 어느 단계가 콜드 스타트를 늘리는지 확인하는 용도입니다.
+    추론 워커 스레드와 이벤트 루프가 함께 기록하므로 기록 목록은 잠금으로 보호합니다.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, seconds):
+        with self._lock:
+            self.entries.append((kind, name, seconds))
+
+    @contextmanager
+    def phase(self, name, kind="phase"):
+        """with 블록 실행 시간을 단계 시간으로 기록"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - started)
+
+    def import_module(self, name):
+        """
+        모듈을 임포트하고 걸린 시간을 기록합니다 (이미 임포트된 모듈은 기록하지 않음).
+
+        Args:
+            name (str): 모듈 이름
+
+        Returns:
+            module: 임포트된 모듈
+        """
+        if name in sys.modules:
+            return sys.modules[name]
+        with self.phase(name, kind="import"):
+            return importlib.import_module(name)
+
+    def report(self):
+        """
+        단계별 시간 요약
+
+        Returns:
+            dict: {"uptime_seconds", "imports": {모듈: 초}, "phases": {단계: 초}}
+        """
+        with self._lock:
+            entries = list(self.entries)
+        result = {"uptime_seconds": time.perf_counter() - self.started, "imports": {}, "phases": {}}
+        for kind, name, seconds in entries:
+            group = result["imports"] if kind == "import" else result["phases"]
+            group[name] = group.get(name, 0.0) + seconds
+        return result
+
+    def log(self, title="시작 시간 분석"):
+        report = self.report()
+        lines = [f"{title} (경과 {report['uptime_seconds']:.2f}초)"]
+        for group in ("imports", "phases"):
+            for name, seconds in sorted(report[group].items(), key=lambda item: -item[1]):
+                lines.append(f"  {group[:-1]:<6} {name:<40} {seconds * 1000:9.1f}ms")
+        logger.info("\n".join(lines))
+        return report
+
+# 프로세스 전체에서 공유하는 분석기
+STARTUP_PROFILE = StartupProfiler()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+class StopSequenceMatcher:
+    """
+    중단 문자열(stop) 증분 매처 (Aho-Corasick)
+
+    디토크나이즈된 텍스트 조각을 받는 대로 모든 중단 문자열을 한 번에 찾습니다. 조각마다 새로 들어온
+    글자만 오토마톤으로 진행하므로 응답이 길어져도 비용이 늘지 않으며, 여러 토큰에 걸친 중단 문자열도 찾습니다.
+
+    오토마톤 상태의 깊이는 "지금까지의 텍스트 끝부분 중 어떤 중단 문자열의 앞부분과 같은 가장 긴 길이"이므로
+    그만큼만 내보내지 않고 보류합니다. 중단 문자열이 나타나면 그 앞까지만 내보내고 matched를 설정합니다.
+
+    Args:
+        stop (list): 중단 문자열 목록 (빈 문자열은 무시)
+    """
+
+    def __init__(self, stop):
+        self.patterns = [pattern for pattern in dict.fromkeys(stop) if pattern]
+        self._goto = [{}]
+        self._fail = [0]
+        self._depth = [0]
+        # 상태에서 끝나는(실패 링크로 이어진 것 포함) 가장 긴 중단 문자열 번호 (없으면 None)
+        self._output = [None]
+        for index, pattern in enumerate(self.patterns):
+            self._insert(index, pattern)
+        self._build()
+        self.state = 0
+        self.held = ""
+        self.matched = None
+
+    def _insert(self, index, pattern):
+        state = 0
+        for char in pattern:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[state] + 1)
+                self._output.append(None)
+                self._goto[state][char] = following
+            state = following
+        self._output[state] = index
+
+    def _build(self):
+        # 너비 우선으로 실패 링크 계산 (얕은 상태의 링크가 먼저 정해짐)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, following in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                link = self._goto[fallback].get(char, 0)
+                self._fail[following] = link
+                if self._output[following] is None:
+                    self._output[following] = self._output[link]
+                queue.append(following)
+
+    def feed(self, text):
+        """
+        텍스트 조각 처리
+
+        Args:
+            text (str): 새로 확정된 텍스트 조각
+
+        Returns:
+            str: 지금 내보내도 되는 텍스트 (중단 문자열이 나타나면 그 앞까지)
+        """
+        if self.matched is not None:
+            return ""
+        buffer = self.held + text
+        offset = len(self.held)
+        state = self.state
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            index = self._output[state]
+            if index is not None:
+                self.matched = self.patterns[index]
+                self.held = ""
+                self.state = 0
+                return buffer[:offset + i + 1 - len(self.matched)]
+        self.state = state
+        keep = len(buffer) - self._depth[state]
+        self.held = buffer[keep:]
+        return buffer[:keep]
+
+    def flush(self):
+        """생성이 끝났을 때 보류 중인 텍스트 반환 (중단 문자열로 끝나지 않았으므로 그대로 내보냄)"""
+        held = self.held
+        self.held = ""
+        self.state = 0
+        return held
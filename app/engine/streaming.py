@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 생산자가 종료되었음을 알리는 표식
+_DONE = object()
+
+class _Failure:
+    """생산자에서 발생한 예외를 소비자에게 전달하기 위한 래퍼"""
+    def __init__(self, error):
+        self.error = error
+
+class AsyncChannel:
+    """
+    워커 스레드에서 이벤트 루프로 항목을 전달하는 단방향 채널
+
+    반드시 이벤트 루프 스레드에서 생성해야 하며, put/close/fail은 어느 스레드에서나 호출할 수 있습니다.
+    소비자가 중단되면 cancelled가 설정되어 생산자가 작업을 멈출 수 있습니다.
+    """
+
+    def __init__(self, loop=None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        """소비자가 더 이상 항목을 읽지 않는지 여부"""
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _put(self, item):
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            # 이벤트 루프가 이미 종료된 경우
+            self._cancelled.set()
+
+    def put(self, item):
+        """항목 전달"""
+        self._put(item)
+
+    def close(self):
+        """정상 종료 알림"""
+        self._put(_DONE)
+
+    def fail(self, error):
+        """예외 전달 (소비자 쪽에서 다시 발생함)"""
+        self._put(_Failure(error))
+
+    async def batches(self, max_batch=64):
+        """
+        채널의 항목을 묶음 단위로 반환합니다.
+
+        소비자가 느려서 항목이 쌓인 경우 대기 중인 항목을 한 번에 최대 max_batch개까지 묶어 반환하므로,
+        클라이언트가 뒤처지면 SSE 프레임 하나에 여러 토큰이 담기게 됩니다.
+
+        Yields:
+            list: 전달된 항목 묶음
+        """
+        try:
+            while True:
+                item = await self._queue.get()
+                batch = []
+                while True:
+                    if item is _DONE:
+                        if batch:
+                            yield batch
+                        return
+                    if isinstance(item, _Failure):
+                        if batch:
+                            yield batch
+                        raise item.error
+                    batch.append(item)
+                    if len(batch) >= max_batch or self._queue.empty():
+                        break
+                    item = self._queue.get_nowait()
+                yield batch
+        finally:
+            self._cancelled.set()
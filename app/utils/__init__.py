@@ -8,12 +8,33 @@ from .image_utils import (
     decode_base64_image,
     load_image_from_url,
     process_image_from_data_url,
-    create_empty_image
+    decode_image_bytes,
+    create_empty_image,
+    preprocess_image,
+    smart_resize,
+    image_cache_key,
+    image_nbytes,
+    load_image,
+    load_images
 )
+from .lru_cache import ByteLRUCache
+from .image_fetch import ImageFetcher, ImageFetchError
+from .metrics import MetricsRegistry
 
 __all__ = [
     'decode_base64_image',
     'load_image_from_url',
     'process_image_from_data_url',
-    'create_empty_image'
+    'decode_image_bytes',
+    'create_empty_image',
+    'preprocess_image',
+    'smart_resize',
+    'image_cache_key',
+    'image_nbytes',
+    'load_image',
+    'load_images',
+    'ByteLRUCache',
+    'ImageFetcher',
+    'ImageFetchError',
+    'MetricsRegistry'
 ]
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+class ImageFetchError(Exception):
+    """이미지 다운로드 실패 (크기 초과, HTTP 오류 등)"""
+
+class ImageFetcher:
+    """
+    http(s) 이미지 URL을 비동기로 가져오는 클래스
+
+    - 공유 연결 풀(requests.Session)을 재사용하여 요청마다 새 연결을 만들지 않습니다.
+    - 호스트별 동시 요청 수를 제한하여 느린 호스트 하나가 다운로드 스레드를 모두 차지하지 않게 합니다.
+    - 응답을 조각 단위로 읽으면서 최대 크기를 넘으면 즉시 중단합니다.
+    - 응답을 디스크에 캐시하고 ETag/Last-Modified로 조건부 요청을 보내, 바뀌지 않은 이미지는 다시 받지 않습니다.
+      Cache-Control max-age가 남아 있으면 요청 자체를 생략합니다.
+      디스크 캐시는 cache_max_bytes를 넘으면 가장 오래 사용하지 않은(수정 시각 기준) 항목부터 지웁니다.
+
+    블로킹 I/O는 전용 스레드 풀에서 실행되므로 이벤트 루프를 막지 않습니다.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=20 * 1024 * 1024, timeout=10,
+                 per_host_limit=4, pool_size=16, max_workers=8, chunk_size=64 * 1024,
+                 cache_max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.per_host_limit = per_host_limit
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-fetch")
+        self._host_limits = {}
+        self._limits_loop = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "downloads": 0, "not_modified": 0, "fresh_hits": 0, "bytes_downloaded": 0, "errors": 0, "evictions": 0
+        }
+        # 디스크 캐시 크기 (저장할 때 더해 가다가 예산을 넘으면 디렉토리를 다시 세며 정리)
+        self._cache_lock = threading.Lock()
+        self._cache_bytes = 0
+        # 디렉토리 생성과 기존 항목 정리는 첫 저장 때 수행 (서버 모듈 임포트만으로 디렉토리를 만들지 않음)
+        self._cache_ready = False
+
+    @classmethod
+    def from_env(cls, environ):
+        """환경 변수에서 설정을 읽어 생성"""
+        return cls(
+            cache_dir=environ.get("IMAGE_FETCH_CACHE_DIR", os.path.join(os.getcwd(), "cache", "images")),
+            max_bytes=int(environ.get("IMAGE_FETCH_MAX_BYTES", str(20 * 1024 * 1024))),
+            timeout=float(environ.get("IMAGE_FETCH_TIMEOUT", "10")),
+            per_host_limit=int(environ.get("IMAGE_FETCH_PER_HOST", "4")),
+            cache_max_bytes=int(environ.get("IMAGE_FETCH_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+        )
+
+    def _host_limit(self, url):
+        # asyncio.Semaphore는 이벤트 루프 스레드에서만 생성/사용되며, 루프가 바뀌면 새로 만듦
+        loop = asyncio.get_running_loop()
+        if self._limits_loop is not loop:
+            self._host_limits = {}
+            self._limits_loop = loop
+        host = urlparse(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_limits[host] = semaphore
+        return semaphore
+
+    async def fetch(self, url):
+        """
+        URL의 내용을 비동기로 가져옵니다.
+
+        Args:
+            url (str): http(s) URL
+
+        Returns:
+            bytes: 응답 본문
+
+        Raises:
+            ImageFetchError: 다운로드 실패 또는 최대 크기 초과
+        """
+        loop = asyncio.get_running_loop()
+        async with self._host_limit(url):
+            return await loop.run_in_executor(self._executor, self.fetch_sync, url)
+
+    def fetch_sync(self, url):
+        """fetch의 블로킹 버전 (스레드 풀에서 실행됨)"""
+        meta = self._read_meta(url)
+        if meta is not None and meta.get("fresh_until", 0) > time.time():
+            data = self._read_body(url)
+            if data is not None:
+                self._count("fresh_hits")
+                return data
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 304 and meta is not None:
+                    data = self._read_body(url)
+                    if data is not None:
+                        self._count("not_modified")
+                        self._write_meta(url, response, meta)
+                        return data
+                    # 캐시 파일이 사라진 경우 조건 없이 다시 요청
+                    return self._refetch(url)
+                response.raise_for_status()
+                data = self._read_limited(response)
+                self._store(url, response, data)
+                return data
+        except ImageFetchError:
+            self._count("errors")
+            raise
+        except requests.RequestException as e:
+            self._count("errors")
+            raise ImageFetchError(f"이미지 다운로드 실패: {url}: {e}")
+
+    def _refetch(self, url):
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            data = self._read_limited(response)
+            self._store(url, response, data)
+            return data
+
+    def _read_limited(self, response):
+        length = response.headers.get("Content-Length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            raise ImageFetchError(f"이미지 크기가 제한을 초과합니다: {length} > {self.max_bytes}바이트")
+        buffer = bytearray()
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            buffer.extend(chunk)
+            if len(buffer) > self.max_bytes:
+                raise ImageFetchError(f"이미지 크기가 제한을 초과합니다: {self.max_bytes}바이트")
+        self._count("downloads")
+        self._count("bytes_downloaded", len(buffer))
+        return bytes(buffer)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    # --- 디스크 캐시 ---
+
+    def _cache_path(self, url, suffix):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}{suffix}")
+
+    def _read_meta(self, url):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(url, ".json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_body(self, url):
+        path = self._cache_path(url, ".bin")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # 수정 시각을 마지막 사용 시각으로 사용 (정리할 때 오래 사용하지 않은 항목부터 지움)
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _write_meta(self, url, response, previous=None):
+        meta = dict(previous or {})
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag:
+            meta["etag"] = etag
+        if last_modified:
+            meta["last_modified"] = last_modified
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        meta["fresh_until"] = time.time() + int(match.group(1)) if match else 0
+        _atomic_write(self._cache_path(url, ".json"), json.dumps(meta).encode("utf-8"))
+        return meta
+
+    def _store(self, url, response, data):
+        if not self.cache_dir:
+            return
+        cache_control = response.headers.get("Cache-Control", "")
+        has_validator = response.headers.get("ETag") or response.headers.get("Last-Modified") or "max-age" in cache_control
+        if "no-store" in cache_control or not has_validator or len(data) > self.cache_max_bytes:
+            return
+        try:
+            self._prepare_cache()
+            _atomic_write(self._cache_path(url, ".bin"), data)
+            self._write_meta(url, response)
+        except OSError as e:
+            logger.warning(f"이미지 디스크 캐시 저장 실패: {e}")
+            return
+        with self._cache_lock:
+            # 같은 URL을 덮어쓴 경우 실제보다 크게 세지만, 정리할 때 디렉토리를 다시 세므로 어긋나지 않음
+            self._cache_bytes += len(data)
+            over = self._cache_bytes > self.cache_max_bytes
+        if over:
+            self._evict()
+
+    def _prepare_cache(self):
+        """캐시 디렉토리를 만들고 이전 실행에서 남은 항목을 예산에 맞춰 정리 (처음 한 번)"""
+        if self._cache_ready:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._evict()
+        self._cache_ready = True
+
+    def _evict(self):
+        """디스크 캐시가 예산을 넘으면 가장 오래 사용하지 않은 항목(.bin과 .json)부터 지움"""
+        with self._cache_lock:
+            entries = {}
+            try:
+                scanned = list(os.scandir(self.cache_dir))
+            except OSError as e:
+                logger.warning(f"이미지 디스크 캐시 확인 실패: {e}")
+                return
+            for entry in scanned:
+                key, suffix = os.path.splitext(entry.name)
+                if suffix not in (".bin", ".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                item = entries.setdefault(key, {"bytes": 0, "used": 0.0, "paths": []})
+                item["bytes"] += stat.st_size
+                item["paths"].append(entry.path)
+                if suffix == ".bin" or not item["used"]:
+                    item["used"] = stat.st_mtime
+            total = sum(item["bytes"] for item in entries.values())
+            evicted = 0
+            for item in sorted(entries.values(), key=lambda item: item["used"]):
+                if total <= self.cache_max_bytes:
+                    break
+                for path in item["paths"]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= item["bytes"]
+                evicted += 1
+            self._cache_bytes = total
+        if evicted:
+            self._count("evictions", evicted)
+            logger.info(f"이미지 디스크 캐시 정리: {evicted}개 삭제, {total / 1024 ** 2:.1f}MB 사용 중")
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+def _atomic_write(path, data):
+    """임시 파일에 쓴 뒤 이름을 바꿔, 다른 스레드가 반쯤 쓰인 파일을 읽지 않게 함"""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -2,64 +2,245 @@
 # -*- coding: utf-8 -*-
 
 import os
-import sys
-import base64
-import requests
+import time
+import asyncio
+import functools
+import binascii
+import math
+import hashlib
 import logging
 from io import BytesIO
-from PIL import Image
-import numpy as np
+from PIL import Image, ImageOps
+
+from .image_fetch import ImageFetchError
 
 logger = logging.getLogger(__name__)
 
-def decode_base64_image(base64_string):
+# Qwen2.5-VL 비전 인코더의 패치 격자 (14px 패치 2x2 병합 = 시각 토큰 하나당 28x28 픽셀)
+IMAGE_FACTOR = 28
+MIN_PIXELS = 4 * IMAGE_FACTOR * IMAGE_FACTOR
+MAX_PIXELS = 1280 * IMAGE_FACTOR * IMAGE_FACTOR
+MAX_ASPECT_RATIO = 200
+
+def smart_resize(height, width, factor=IMAGE_FACTOR, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
+    """
+    비율을 유지하면서 픽셀 수가 [min_pixels, max_pixels] 범위에 들고
+    가로세로가 factor의 배수가 되는 크기를 계산합니다.
+    
+    Args:
+        height (int): 원본 높이
+        width (int): 원본 너비
+        factor (int): 크기를 맞출 격자 단위
+        min_pixels (int): 최소 픽셀 수
+        max_pixels (int): 최대 픽셀 수
+        
+    Returns:
+        tuple: (높이, 너비)
+    """
+    if max(height, width) / min(height, width) > MAX_ASPECT_RATIO:
+        raise ValueError(f"이미지 가로세로 비율이 너무 큽니다: {width}x{height}")
+    h_bar = max(factor, round(height / factor) * factor)
+    w_bar = max(factor, round(width / factor) * factor)
+    if h_bar * w_bar > max_pixels:
+        beta = math.sqrt((height * width) / max_pixels)
+        h_bar = max(factor, math.floor(height / beta / factor) * factor)
+        w_bar = max(factor, math.floor(width / beta / factor) * factor)
+    elif h_bar * w_bar < min_pixels:
+        beta = math.sqrt(min_pixels / (height * width))
+        h_bar = math.ceil(height * beta / factor) * factor
+        w_bar = math.ceil(width * beta / factor) * factor
+    return h_bar, w_bar
+
+def preprocess_image(image, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS, factor=IMAGE_FACTOR):
+    """
+    모델 입력용으로 이미지를 전처리합니다.
+    
+    EXIF 방향을 적용하고 RGB로 변환한 뒤, 비율을 유지하며 픽셀 예산과 패치 격자에 맞게 크기를 조정합니다.
+    시각 토큰 수가 (높이/28)*(너비/28)이므로 max_pixels가 곧 이미지당 토큰 수 상한이 됩니다.
+    
+    Args:
+        image (PIL.Image): 원본 이미지
+        min_pixels (int): 최소 픽셀 수
+        max_pixels (int): 최대 픽셀 수
+        factor (int): 크기를 맞출 격자 단위
+        
+    Returns:
+        PIL.Image: 전처리된 이미지
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    height, width = smart_resize(image.height, image.width, factor, min_pixels, max_pixels)
+    if (width, height) != image.size:
+        image = image.resize((width, height), Image.BICUBIC)
+    return image
+
+def image_nbytes(image):
+    """
+    디코딩된 이미지가 차지하는 메모리 크기를 추정합니다.
+    
+    Args:
+        image (PIL.Image): 이미지 객체
+        
+    Returns:
+        int: 픽셀 데이터 크기(바이트)
+    """
+    return image.width * image.height * len(image.getbands())
+
+def image_cache_key(data, **params):
+    """
+    이미지 원본 바이트와 전처리 매개변수로 캐시 키를 생성합니다.
+    
+    Args:
+        data (bytes): 이미지 원본 바이트 (Base64 문자열 바이트도 가능)
+        **params: 디코딩 결과에 영향을 주는 전처리 매개변수
+        
+    Returns:
+        tuple: (내용 해시, 정렬된 매개변수 목록)
+    """
+    return (hashlib.sha256(data).hexdigest(), tuple(sorted(params.items())))
+
+def _cached_image(cache, key, decode, preprocess=None, source_nbytes=0):
+    """
+    캐시에서 이미지를 찾고, 없으면 decode()로 디코딩한 결과를 저장합니다.
+    
+    저장되는 이미지는 여러 요청이 공유하므로 픽셀 데이터를 미리 읽어 두고,
+    info["content_key"]에 내용 해시를 기록하여 이후 단계(비전 인코더 캐시 등)에서 재사용합니다.
+    preprocess가 주어지면 preprocess_image를 적용한 결과를 저장합니다 (키에 매개변수 포함).
+    info["decode_stats"]에는 디코딩 시간과 최대 메모리 사용량 추정치가 기록됩니다.
+    """
+    if cache is not None:
+        image = cache.get(key)
+        if image is not None:
+            return image
+    
+    started = time.perf_counter()
+    image = decode()
+    if image is None:
+        return None
+    source_size = image.info.pop("source_size", image.size)
+    image.load()
+    decoded_nbytes = image_nbytes(image)
+    if preprocess:
+        image = preprocess_image(image, **preprocess)
+    image.info["decode_stats"] = {
+        "decode_ms": (time.perf_counter() - started) * 1000,
+        # 원본(인코딩) 데이터 + 디코딩 직후 픽셀 + 전처리 결과가 동시에 메모리에 있는 순간 기준
+        "peak_bytes": source_nbytes + decoded_nbytes + (image_nbytes(image) if preprocess else 0),
+        "source_size": source_size,
+        "decoded_size": image.size
+    }
+    logger.debug(f"이미지 디코딩: {image.info['decode_stats']}")
+    image.info["content_key"] = repr(key)
+    if cache is not None:
+        cache.put(key, image, image_nbytes(image))
+    return image
+
+def _open_image(data, preprocess=None):
+    """
+    이미지 바이트를 엽니다. 픽셀 디코딩은 지연되며, JPEG이고 전처리 목표 크기가 원본보다 작으면
+    draft 모드로 DCT 단계에서 축소(1/2, 1/4, 1/8)하여 디코딩합니다.
+    """
+    image = Image.open(BytesIO(data))
+    if preprocess and image.format == "JPEG":
+        height, width = smart_resize(
+            image.height, image.width, IMAGE_FACTOR,
+            preprocess.get("min_pixels", MIN_PIXELS), preprocess.get("max_pixels", MAX_PIXELS)
+        )
+        if width * height < image.width * image.height:
+            source_size = image.size
+            # draft는 요청 크기 이상인 가장 작은 배율을 고르므로 이후 리사이즈 품질은 유지됨
+            image.draft("RGB", (width, height))
+            image.info["source_size"] = source_size
+    return image
+
+def _base64_payload(data_url):
+    """
+    데이터 URL에서 Base64 부분을 복사 없이 가리키는 memoryview를 반환합니다.
+    
+    문자열을 ASCII 바이트로 한 번만 변환하고, 접두사 제거는 슬라이스로 처리하여
+    split()처럼 큰 문자열을 다시 복사하지 않습니다.
+    """
+    raw = data_url.encode("ascii") if isinstance(data_url, str) else data_url
+    view = memoryview(raw)
+    start = raw.find(b"base64,", 0, 256)
+    return view[start + len(b"base64,"):] if start >= 0 else view
+
+def decode_base64_image(base64_string, **preprocess):
     """
     Base64 인코딩된 이미지 문자열을 PIL Image 객체로 변환합니다.
     
     Args:
-        base64_string (str): Base64 인코딩된 이미지 문자열
+        base64_string (str | bytes | memoryview): Base64 인코딩된 이미지 문자열 (데이터 URL 접두사 허용)
+        **preprocess: 전처리 목표 크기 (JPEG draft 디코딩에 사용)
         
     Returns:
         PIL.Image: 디코딩된 이미지 객체
     """
     try:
-        # Base64 접두사 제거 (있는 경우)
-        if "base64," in base64_string:
-            base64_string = base64_string.split("base64,")[1]
-        
-        # 이미지 디코딩
-        image_data = base64.b64decode(base64_string)
-        image = Image.open(BytesIO(image_data))
-        return image
+        payload = base64_string if isinstance(base64_string, memoryview) else _base64_payload(base64_string)
+        # 이미지 디코딩 (binascii는 memoryview를 그대로 받음)
+        image_data = binascii.a2b_base64(payload)
+        return _open_image(image_data, preprocess)
     except Exception as e:
         logger.error(f"Base64 이미지 디코딩 중 오류 발생: {e}")
         return None
 
-def load_image_from_url(image_url):
+_DEFAULT_FETCHER = None
+
+def _download_image_bytes(image_url):
+    # 동기 호출도 공유 연결 풀과 크기 제한, 디스크 캐시를 사용하도록 기본 ImageFetcher를 재사용
+    global _DEFAULT_FETCHER
+    if _DEFAULT_FETCHER is None:
+        from .image_fetch import ImageFetcher
+        _DEFAULT_FETCHER = ImageFetcher.from_env(os.environ)
+    return _DEFAULT_FETCHER.fetch_sync(image_url)
+
+def decode_image_bytes(data, cache=None, **preprocess):
+    """
+    이미지 원본 바이트를 PIL Image 객체로 변환합니다.
+    
+    Args:
+        data (bytes): 이미지 파일 바이트 (예: ImageFetcher로 받은 응답 본문)
+        cache (ByteLRUCache, optional): 디코딩 이미지 캐시
+        **preprocess: preprocess_image 매개변수 (min_pixels, max_pixels). 없으면 원본 그대로 반환
+        
+    Returns:
+        PIL.Image: 디코딩된 이미지 객체
+    """
+    try:
+        key = image_cache_key(data, **preprocess)
+        return _cached_image(cache, key, lambda: _open_image(data, preprocess), preprocess, len(data))
+    except Exception as e:
+        logger.error(f"이미지 디코딩 중 오류 발생: {e}")
+        return None
+
+def load_image_from_url(image_url, cache=None, **preprocess):
     """
     URL에서 이미지를 다운로드하여 PIL Image 객체로 변환합니다.
     
     Args:
         image_url (str): 이미지 URL
+        cache (ByteLRUCache, optional): 디코딩 이미지 캐시
+        **preprocess: preprocess_image 매개변수 (min_pixels, max_pixels)
         
     Returns:
         PIL.Image: 다운로드된 이미지 객체
     """
     try:
-        response = requests.get(image_url, stream=True, timeout=10)
-        response.raise_for_status()
-        image = Image.open(BytesIO(response.content))
-        return image
+        return decode_image_bytes(_download_image_bytes(image_url), cache=cache, **preprocess)
     except Exception as e:
         logger.error(f"URL에서 이미지 로드 중 오류 발생: {e}")
         return None
 
-def process_image_from_data_url(data_url):
+def process_image_from_data_url(data_url, cache=None, **preprocess):
     """
     데이터 URL에서 이미지를 처리합니다.
     
     Args:
         data_url (str): 데이터 URL (base64 인코딩 등)
+        cache (ByteLRUCache, optional): 디코딩 이미지 캐시 (내용 해시 기준)
+        **preprocess: preprocess_image 매개변수 (min_pixels, max_pixels). 없으면 원본 그대로 반환
         
     Returns:
         PIL.Image: 처리된 이미지 객체
@@ -67,15 +248,23 @@ def process_image_from_data_url(data_url):
     try:
         # 데이터 URL 형식 확인
         if data_url.startswith("data:"):
-            # Base64 인코딩된  이미지인 경우
-            return decode_base64_image(data_url)
+            # Base64 인코딩된  이미지인 경우 (Base64 문자열 자체를 해시하여 캐시 적중 시 디코딩 생략)
+            payload = _base64_payload(data_url)
+            key = image_cache_key(payload, **preprocess)
+            return _cached_image(
+                cache, key, lambda: decode_base64_image(payload, **preprocess), preprocess,
+                # Base64 바이트 + 디코딩된 원본 바이트(약 3/4)
+                len(payload) + len(payload) * 3 // 4
+            )
         elif data_url.startswith(("http://", "https://")):
             # 웹 URL인 경우
-            return load_image_from_url(data_url)
+            return load_image_from_url(data_url, cache=cache, **preprocess)
         else:
             # 로컬 파일 경로인 경우
             if os.path.exists(data_url):
-                return Image.open(data_url)
+                with open(data_url, "rb") as f:
+                    data = f.read()
+                return decode_image_bytes(data, cache=cache, **preprocess)
             else:
                 logger.error(f"이미지 파일이 존재하지 않습니다: {data_url}")
                 return None
@@ -95,4 +284,78 @@ def create_empty_image(width=512, height=512, color=(200, 200, 200)):
     Returns:
         PIL.Image: 생성된 빈 이미지
     """
-    return Image.new("RGB", (width, height), color) 
\ No newline at end of file
+    return Image.new("RGB", (width, height), color)
+
+async def load_image(image_url, executor, cache=None, fetcher=None, observe=None, **preprocess):
+    """
+    이미지 URL 하나를 전처리된 PIL 이미지로 변환합니다. 실패하면 빈 이미지를 반환합니다.
+    
+    http(s) URL은 fetcher로 비동기 다운로드하고, 디코딩과 전처리는 executor(스레드 풀)에서 수행합니다.
+    
+    Args:
+        image_url (str): 이미지 URL (http(s) 또는 data URL)
+        executor (concurrent.futures.Executor): 디코딩을 실행할 스레드 풀
+        cache (ByteLRUCache, optional): 디코딩된 이미지 캐시
+        fetcher (ImageFetcher, optional): http(s) 이미지 다운로더
+        observe (callable, optional): 디코딩 소요 시간(초)을 받는 콜백
+        **preprocess: 전처리 매개변수 (min_pixels, max_pixels)
+        
+    Returns:
+        PIL.Image: 처리된 이미지 (실패 시 빈 이미지)
+    """
+    logger.info(f"이미지 URL 처리 중: {image_url[:100]}...")
+    loop = asyncio.get_running_loop()
+    try:
+        if image_url.startswith(("http://", "https://")):
+            if fetcher is None:
+                raise ImageFetchError("이미지 다운로더가 설정되지 않았습니다")
+            data = await fetcher.fetch(image_url)
+            decode = functools.partial(decode_image_bytes, data, cache, **preprocess)
+        else:
+            decode = functools.partial(process_image_from_data_url, image_url, cache, **preprocess)
+        started = time.perf_counter()
+        img = await loop.run_in_executor(executor, decode)
+        if observe is not None:
+            observe(time.perf_counter() - started)
+        if img is None:
+            logger.warning("이미지 처리 실패, 빈 이미지 생성")
+            img = create_empty_image()
+    except ImageFetchError as fetch_err:
+        logger.warning(f"이미지 다운로드 실패, 빈 이미지 생성: {fetch_err}")
+        img = create_empty_image()
+    except Exception as img_err:
+        logger.error(f"이미지 처리 오류: {img_err}")
+        img = create_empty_image()
+    return img
+
+async def load_images(image_urls, executor, cache=None, fetcher=None, observe=None, **preprocess):
+    """
+    요청의 모든 이미지를 병렬로 처리합니다.
+    
+    이미지 자리 표시자 수와 반환되는 이미지 수가 항상 같도록, 실패한 이미지는 빈 이미지로 채웁니다.
+    한 이미지가 실패해도 나머지 이미지의 처리는 그대로 끝까지 진행됩니다.
+    
+    Args:
+        image_urls (list): 대화에 등장한 순서대로의 이미지 URL
+        executor (concurrent.futures.Executor): 디코딩을 실행할 스레드 풀
+        cache, fetcher, observe: load_image 참고
+        **preprocess: 전처리 매개변수 (min_pixels, max_pixels)
+        
+    Returns:
+        list: PIL 이미지 목록 (입력과 같은 순서)
+    """
+    if not image_urls:
+        return []
+    started = time.time()
+    images = await asyncio.gather(
+        *(load_image(url, executor, cache, fetcher, observe, **preprocess) for url in image_urls)
+    )
+    logger.info(f"이미지 {len(images)}개 처리 완료: {time.time() - started:.2f}초")
+    for index, image in enumerate(images):
+        stats = image.info.get("decode_stats")
+        if stats:
+            logger.info(
+                f"이미지 {index}: {stats['source_size']} -> {stats['decoded_size']}, "
+                f"디코딩 {stats['decode_ms']:.1f}ms, 최대 메모리 {stats['peak_bytes'] / 1024 ** 2:.1f}MiB"
+            )
+    return list(images)
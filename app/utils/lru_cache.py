@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class ByteLRUCache:
+    """
+    메모리 크기(바이트)로 제한되는 LRU 캐시
+
+    항목마다 크기를 함께 저장하고, 전체 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 제거합니다.
+    여러 스레드에서 동시에 사용할 수 있습니다.
+    """
+
+    def __init__(self, max_bytes, name="cache"):
+        self.max_bytes = max_bytes
+        self.name = name
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key, default=None):
+        """값 조회 (적중 시 가장 최근 사용으로 표시)"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, nbytes):
+        """
+        값 저장 (max_bytes보다 큰 값은 저장하지 않음)
+
+        Args:
+            key: 캐시 키 (해시 가능해야 함)
+            value: 저장할 값
+            nbytes (int): 값이 차지하는 메모리 크기
+        """
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._items[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._items.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 지연 시간(초) 히스토그램 기본 구간
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 처리량(토큰/초) 히스토그램 기본 구간
+THROUGHPUT_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320, 640, 1280, 2560, 5120)
+
+class _Shards:
+    """
+    스레드별 값 배열
+
+    각 스레드는 자기 배열에만 쓰므로 값 갱신에 잠금이 필요 없습니다.
+    잠금은 스레드가 처음 기록할 때(배열 생성)만 사용하고, 수집 시에는 모든 배열을 합산합니다.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._arrays = []
+        self._lock = threading.Lock()
+
+    def local(self):
+        array = getattr(self._local, "array", None)
+        if array is None:
+            array = [0.0] * self.size
+            self._local.array = array
+            with self._lock:
+                self._arrays.append(array)
+        return array
+
+    def total(self):
+        with self._lock:
+            arrays = list(self._arrays)
+        result = [0.0] * self.size
+        for array in arrays:
+            for i, value in enumerate(array):
+                result[i] += value
+        return result
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """레이블 값 조합별 하위 지표 (처음 사용할 때만 잠금)"""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name}: 레이블 값이 필요합니다 ({', '.join(self.labelnames)})")
+        return self.labels()
+
+    def _label_text(self, values, extra=None):
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._child_lines(values, child))
+        return lines
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.local()[0] += amount
+
+    @property
+    def value(self):
+        return self._shards.total()[0]
+
+class Counter(_Metric):
+    """단조 증가 카운터"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _child_lines(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_format(child.value)}"]
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # 구간별 개수 + (+Inf 구간) + 합계
+        self._shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value):
+        array = self._shards.local()
+        array[bisect.bisect_left(self.buckets, value)] += 1
+        array[-1] += value
+
+    def snapshot(self):
+        """(누적 구간 개수 목록, 전체 개수, 합계)"""
+        totals = self._shards.total()
+        cumulative = []
+        running = 0.0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, totals[-1]
+
+class Histogram(_Metric):
+    """구간별 관측 횟수와 합계를 기록하는 히스토그램"""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def _child_lines(self, values, child):
+        cumulative, count, total = child.snapshot()
+        lines = []
+        for bound, value in zip(self.buckets + (math.inf,), cumulative):
+            le = "+Inf" if bound == math.inf else _format(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(values, ('le', le))} {_format(value)}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {_format(count)}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_format(total)}")
+        return lines
+
+class CallbackMetric(_Metric):
+    """
+    수집 시점에 함수를 호출해 값을 읽는 지표 (게이지 또는 카운터)
+
+    대기열 깊이나 캐시 적중 횟수처럼 다른 구성 요소가 이미 집계하는 값을 요청 경로에
+    아무 비용 없이 노출할 때 사용합니다. 함수는 {레이블 값 튜플: 값} 또는 단일 숫자를 반환합니다.
+    """
+
+    def __init__(self, name, documentation, function, labelnames=(), type_name="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.type_name = type_name
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        try:
+            values = self.function()
+        except Exception as e:
+            logger.warning(f"지표 수집 실패 ({self.name}): {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{self._label_text(labels)} {_format(value)}")
+        return lines
+
+class MetricsRegistry:
+    """
+    지표 모음 (Prometheus 텍스트 형식으로 출력)
+
+    지표 갱신(inc/observe)은 스레드별 배열에 쓰므로 추론 워커와 이벤트 루프가 동시에 기록해도
+    서로 기다리지 않습니다.
+    """
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self.prefix + name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def gauge_function(self, name, documentation, function, labelnames=()):
+        return self._register(CallbackMetric(self.prefix + name, documentation, function, labelnames))
+
+    def counter_function(self, name, documentation, function, labelnames=()):
+        return self._register(CallbackMetric(self.prefix + name, documentation, function, labelnames, "counter"))
+
+    def render(self):
+        """
+        등록된 모든 지표를 Prometheus 텍스트 형식(0.0.4)으로 출력합니다.
+
+        Returns:
+            str: /metrics 응답 본문
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+요청당 프롬프트 준비 비용 비교
+
+기존 요청 경로(요청마다 load_config로 설정 파일을 읽고 프로세서의 apply_chat_template 호출)와
+모델 로드 시 한 번 만든 ModelSession.format_conversation의 요청당 시간을 측정합니다.
+모델 가중치는 로드하지 않고 프로세서만 로드합니다.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mlx_vlm.utils import load_config, load_processor
+
+from app.engine.session import ModelSession
+
+CONVERSATION = [
+    {"role": "system", "content": [{"type": "text", "text": "당신은 친절한 도우미입니다."}]},
+    {"role": "user", "content": [{"type": "image"}, {"type": "text", "text": "이 이미지에 대해 설명해 주세요."}]},
+    {"role": "assistant", "content": [{"type": "text", "text": "고양이가 창가에 앉아 있습니다."}]},
+    {"role": "user", "content": [{"type": "text", "text": "고양이의 색깔은 무엇인가요?"}]}
+]
+
+def _measure(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(timings), statistics.mean(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="요청당 프롬프트 준비 비용 벤치마크")
+    parser.add_argument("--model_path", type=str, required=True,
+                       help="MLX 모델 디렉토리 (예: models/mlx_models/Qwen2.5-VL-7B-Instruct-mlx)")
+    parser.add_argument("--iterations", type=int, default=200,
+                       help="측정 반복 횟수")
+    args = parser.parse_args()
+
+    model_path = os.path.abspath(args.model_path)
+    processor = load_processor(model_path)
+    session = ModelSession.create(os.path.basename(model_path), model_path, None, processor, load_config)
+
+    def per_request_path():
+        load_config(model_path)
+        processor.apply_chat_template(CONVERSATION, tokenize=False, add_generation_prompt=True)
+
+    def session_path():
+        session.format_conversation(CONVERSATION)
+
+    # 두 경로의 결과가 같은지 먼저 확인
+    expected = processor.apply_chat_template(CONVERSATION, tokenize=False, add_generation_prompt=True)
+    if session.format_conversation(CONVERSATION) != expected:
+        print("경고: 세션 템플릿 결과가 프로세서 결과와 다릅니다")
+
+    baseline_median, baseline_mean = _measure(per_request_path, args.iterations)
+    session_median, session_mean = _measure(session_path, args.iterations)
+
+    print(f"요청마다 설정 로드 + 템플릿 적용: 중앙값 {baseline_median:.1f}us, 평균 {baseline_mean:.1f}us")
+    print(f"ModelSession.format_conversation: 중앙값 {session_median:.1f}us, 평균 {session_mean:.1f}us")
+    print(f"요청당 절감: {baseline_median - session_median:.1f}us ({baseline_median / max(session_median, 1e-9):.1f}배)")
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,12 @@ import time
 import traceback
 from pathlib import Path
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.engine.conversion import STATE_FILE
+from convert_model import run_conversion, build_quantizer
+
 def main():
     try:
         # 스크립트 경로를 기준으로 상대 경로 구성
@@ -14,58 +20,25 @@ def main():
         # 환경 설정 (상대 경로 사용)
         input_dir = os.path.join(project_root, "models", "Qwen2.5-VL-32B-original")
         output_dir = os.path.join(project_root, "models", "mlx_models", "qwen-2.5-vl-32b")
-        quantize = n
-        
+        quantize = False
+
         print(f"입력 디렉토리: {input_dir}")
         print(f"출력 디렉토리: {output_dir}")
         print(f"양자화: {quantize}")
-        
-        # 출력 디렉토리 검증
-        if os.path.exists(output_dir):
+
+        # 출력 디렉토리에 이전 변환 기록이 없으면 다른 모델을 덮어쓰지 않도록 중단
+        # (기록이 있으면 중단된 변환을 이어서 진행)
+        if os.path.exists(output_dir) and not os.path.exists(os.path.join(output_dir, STATE_FILE)):
             print(f"오류: 출력 디렉토리가 이미 존재합니다: {output_dir}")
             return 1
-            
-        # mlx_lm 모듈 임포트
-        from mlx_lm import convert
-        print("MLX-LM 모듈 로드 완료")
-        
-        # 변환 옵션 정의
-        args = {
-            "hf_path": input_dir,
-            "mlx_path": output_dir,
-            "quantize": quantize
-        }
-        
-        # 변환 실행
+
+        # 변환 실행 (텐서 단위 스트리밍 변환, 모델 전체를 메모리에 올리지 않음)
         print("변환 시작...")
         start_time = time.time()
-        
-        # 변환 과정의 구성 요소 직접 호출
-        try:
-            from mlx_lm.utils import get_model
-            from transformers import AutoProcessor
-            import mlx.core as mx
-            
-            print("모델 로드 중...")
-            model = get_model(args["hf_path"], quantize=args["quantize"])
-            print("프로세서 로드 중...")
-            processor = AutoProcessor.from_pretrained(args["hf_path"])
-            
-            print("디렉토리 생성 중...")
-            os.makedirs(args["mlx_path"], exist_ok=True)
-            
-            print("모델 저장 중...")
-            mx.save_model(model, args["mlx_path"])
-            
-            print("토크나이저 저장 중...")
-            processor.save_pretrained(args["mlx_path"])
-            
-            print(f"완료! 모델이 {args['mlx_path']}에 저장되었습니다.")
-        except Exception as e:
-            print(f"변환 중 오류 발생: {e}")
-            traceback.print_exc()
+
+        if run_conversion(input_dir, output_dir, quantizer=build_quantizer() if quantize else None) != 0:
             return 1
-        
+
         duration = time.time() - start_time
         print(f"변환 완료! 소요 시간: {duration:.2f}초")
         
@@ -5,9 +5,11 @@ import os
 import sys
 import argparse
 import logging
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, AutoConfig
-from mlx_lm import load, convert
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.engine.conversion import convert_model, DEFAULT_SHARD_BYTES, REPORT_FILE
+from app.engine.quantization import GroupQuantizer, DEFAULT_BITS, DEFAULT_GROUP_SIZE, DEFAULT_SKIP, summarize_report
 
 # 로깅 설정
 logging.basicConfig(
@@ -19,108 +21,174 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def setup_args():
+def setup_args(argv=None):
     """커맨드 라인 인수 설정"""
-    parser = argparse.ArgumentParser(description="Hugging Face 모델을 MLX 형식으로 변환")
+    parser = argparse.ArgumentParser(description="Hugging Face 모델을 MLX 형식으로 변환 (스트리밍, 중단 후 이어서 변환 가능)")
     parser.add_argument(
-        "--model_path", 
-        type=str, 
+        "--model_path",
+        type=str,
         required=True,
-        help="Hugging Face 모델 경로 (로컬 경로 또는 Hugging Face Hub ID)"
+        help="Hugging Face 모델 경로 (로컬 디렉토리, safetensors 형식)"
     )
     parser.add_argument(
-        "--mlx_model_path", 
-        type=str, 
+        "--mlx_model_path",
+        type=str,
         help="변환된 MLX 모델을 저장할 경로 (기본값: {model_path}-mlx)"
     )
     parser.add_argument(
-        "--trust_remote_code", 
-        action="store_true",
-        help="원격 코드 신뢰 여부 (일부 모델에 필요)"
+        "--dtype",
+        type=str,
+        default="auto",
+        choices=["auto", "float16", "bfloat16", "float32"],
+        help="부동소수점 가중치의 출력 자료형 (auto: 원본 유지)"
     )
     parser.add_argument(
-        "--torch_dtype", 
-        type=str, 
-        default="auto",
-        choices=["auto", "float16", "bfloat16"],
-        help="PyTorch 데이터 타입 (auto, float16, bfloat16)"
+        "--max_shard_size_gb",
+        type=float,
+        default=DEFAULT_SHARD_BYTES / 1024 ** 3,
+        help="출력 샤드 하나의 최대 크기 (GB)"
     )
     parser.add_argument(
-        "--vision", 
+        "--workers",
+        type=int,
+        default=4,
+        help="동시에 쓰는 출력 샤드 수"
+    )
+    parser.add_argument(
+        "--no_resume",
         action="store_true",
-        help="vision 모델인지 여부"
+        help="이전에 중단된 변환을 이어서 하지 않고 처음부터 다시 변환"
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="선형/임베딩 계층을 그룹 양자화 (MLX affine 형식)"
+    )
+    parser.add_argument(
+        "--q_bits",
+        type=int,
+        default=DEFAULT_BITS,
+        choices=[2, 4, 8],
+        help="양자화 비트 수"
+    )
+    parser.add_argument(
+        "--q_group_size",
+        type=int,
+        default=DEFAULT_GROUP_SIZE,
+        help="양자화 그룹 크기"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--q_skip",
+        type=str,
+        action="append",
+        help="양자화하지 않을 텐서 이름 정규식 (여러 번 지정 가능, 기본값: 비전 인코더)"
+    )
+    parser.add_argument(
+        "--q_layer",
+        type=str,
+        action="append",
+        default=[],
+        help="계층별 설정 '정규식=비트[/그룹크기]' 또는 '정규식=skip' (예: 'mlp\\.down_proj=8', 먼저 맞는 규칙 적용)"
+    )
+    # 이전 버전과의 호환을 위한 옵션 (텐서 이름과 배치는 모델 구성에 맞춰 자동으로 변환됨)
+    parser.add_argument("--torch_dtype", type=str, choices=["auto", "float16", "bfloat16"], help=argparse.SUPPRESS)
+    parser.add_argument("--trust_remote_code", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--vision", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
 
-def main():
-    """메인 함수"""
-    args = setup_args()
-    
-    # 기본 MLX 모델 경로 설정
-    if not args.mlx_model_path:
-        args.mlx_model_path = f"{args.model_path}-mlx"
-    
-    logger.info(f"변환 시작: {args.model_path} → {args.mlx_model_path}")
-    
-    # Torch 데이터 타입 설정
-    if args.torch_dtype == "auto":
-        torch_dtype = "auto"
-    elif args.torch_dtype == "float16":
-        torch_dtype = torch.float16
-    elif args.torch_dtype == "bfloat16":
-        torch_dtype = torch.bfloat16
-    else:
-        torch_dtype = "auto"
-    
-    try:
-        # 일반 모델과 비전 모델 구분하여 로드 및 변환
-        if not args.vision:
-            logger.info("일반 텍스트 모델 로드 중...")
-            
-            # 모델 설정 로드
-            config = AutoConfig.from_pretrained(
-                args.model_path,
-                trust_remote_code=args.trust_remote_code
-            )
-            
-            # 토크나이저 로드
-            tokenizer = AutoTokenizer.from_pretrained(
-                args.model_path,
-                trust_remote_code=args.trust_remote_code
-            )
-            
-            # 모델 로드
-            model = AutoModelForCausalLM.from_pretrained(
-                args.model_path,
-                torch_dtype=torch_dtype,
-                trust_remote_code=args.trust_remote_code
-            )
-            
-            # MLX 형식으로 변환
-            convert.convert_model(
-                model_path=args.model_path,
-                save_path=args.mlx_model_path,
-                trust_remote_code=args.trust_remote_code,
-                torch_dtype=torch_dtype
-            )
+def build_quantizer(bits=DEFAULT_BITS, group_size=DEFAULT_GROUP_SIZE, skip=None, layer_rules=()):
+    """
+    커맨드 라인 설정으로 양자화기 생성
+
+    Args:
+        layer_rules (list): '정규식=비트[/그룹크기]' 또는 '정규식=skip' 목록
+    """
+    layers = {}
+    for rule in layer_rules:
+        pattern, sep, setting = rule.rpartition("=")
+        if not sep or not pattern:
+            raise ValueError(f"계층 설정 형식이 잘못되었습니다: {rule} ('정규식=비트[/그룹크기]')")
+        if setting == "skip":
+            layers[pattern] = None
         else:
-            logger.info("비전 모델 로드 중...")
-            
-            # MLX-VLM의 convert 함수 사용
-            from mlx_vlm.convert import convert_hf_vl_model
-            
-            # 비전 모델 변환
-            logger.info(f"Qwen-VL 모델을 MLX 형식으로 변환 중: {args.model_path}")
-            convert_hf_vl_model(
-                args.model_path,
-                args.mlx_model_path,
-                trust_remote_code=args.trust_remote_code
-            )
-        
-        logger.info(f"모델 변환 완료: {args.mlx_model_path}")
+            layer_bits, _, layer_group = setting.partition("/")
+            layers[pattern] = (int(layer_bits), int(layer_group) if layer_group else group_size)
+    return GroupQuantizer(bits=bits, group_size=group_size, skip=DEFAULT_SKIP if skip is None else skip, layers=layers)
+
+def run_conversion(model_path, mlx_model_path, dtype="auto", max_shard_size_gb=DEFAULT_SHARD_BYTES / 1024 ** 3,
+                   workers=4, resume=True, quantizer=None):
+    """
+    변환 실행 (다른 변환 스크립트에서도 사용)
+
+    Returns:
+        int: 종료 코드 (0: 성공)
+    """
+    logger.info(f"변환 시작: {model_path} → {mlx_model_path}")
+    try:
+        stats = convert_model(
+            model_path,
+            mlx_model_path,
+            dtype=None if dtype == "auto" else dtype,
+            quantizer=quantizer,
+            max_shard_bytes=int(max_shard_size_gb * 1024 ** 3),
+            max_workers=workers,
+            resume=resume
+        )
+    except (ValueError, FileExistsError) as e:
+        # 잘못된 출력 경로 등 다시 실행해도 해결되지 않는 오류
+        logger.error(f"모델 변환 실패: {e}")
+        return 1
     except Exception as e:
         logger.error(f"모델 변환 중 오류 발생: {e}")
-        sys.exit(1)
+        logger.error("같은 명령을 다시 실행하면 완료된 샤드는 건너뛰고 이어서 변환합니다.")
+        return 1
+
+    logger.info(
+        f"모델 변환 완료: {mlx_model_path} (샤드 {stats['shards']}개, 이어서 변환으로 건너뛴 샤드 {stats['skipped']}개, "
+        f"{stats['seconds']:.1f}초)"
+    )
+    if "report" in stats:
+        summary = summarize_report(stats["report"])
+        logger.info(
+            f"양자화 텐서 {summary['tensors']}개, 평균 상대 오차 {summary['mean_relative_error']:.4f} "
+            f"(텐서별 오차: {os.path.join(mlx_model_path, REPORT_FILE)})"
+        )
+        for entry in summary["worst"]:
+            logger.info(
+                f"  {entry['name']}: {entry['bits']}비트/그룹 {entry['group_size']}, "
+                f"상대 오차 {entry['relative_error']:.4f}, 최대 오차 {entry['max_abs_error']:.4g}"
+            )
+    return 0
+
+def main(argv=None):
+    """메인 함수"""
+    args = setup_args(argv)
+
+    # 기본 MLX 모델 경로 설정
+    if not args.mlx_model_path:
+        args.mlx_model_path = f"{args.model_path.rstrip('/')}-mlx"
+
+    dtype = args.dtype
+    if dtype == "auto" and args.torch_dtype:
+        dtype = args.torch_dtype
+
+    quantizer = None
+    if args.quantize:
+        try:
+            quantizer = build_quantizer(args.q_bits, args.q_group_size, args.q_skip, args.q_layer)
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+
+    return run_conversion(
+        args.model_path,
+        args.mlx_model_path,
+        dtype=dtype,
+        quantizer=quantizer,
+        max_shard_size_gb=args.max_shard_size_gb,
+        workers=args.workers,
+        resume=not args.no_resume
+    )
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
@@ -118,7 +118,7 @@ mkdir -p "$MLX_MODEL_DIR"
 if [ -d "$OUTPUT_MODEL_PATH" ]; then
     echo "경고: 출력 디렉토리가 이미 존재합니다: $OUTPUT_MODEL_PATH"
     echo "1) 스킵 - 변환 건너뛰기 (기존 모델 그대로 유지)"
-    echo "2) 덮어쓰기 - 기존 디렉토리 내용 덮어쓰기 (일부 파일이 남을 수 있음)"
+    echo "2) 이어서 변환 - 중단된 변환이면 완료된 샤드는 건너뛰고 이어서 변환"
     echo "3) 삭제 후 변환 - 기존 디렉토리 완전히 삭제 후 새로 변환"
     
     read -p "선택하세요 (1-3): " option
@@ -129,8 +129,8 @@ if [ -d "$OUTPUT_MODEL_PATH" ]; then
             exit 0
             ;;
         2)
-            echo "기존 디렉토리 내용을 덮어쓰고 계속 진행합니다..."
-            # 덮어쓰기는 별도 작업 불필요 (mlx-vlm.convert가 처리)
+            echo "이전 변환을 이어서 진행합니다..."
+            # 변환 기록(.conversion_state.json)과 원본/설정이 다르면 변환기가 이전 가중치를 지우고 처음부터 변환
             ;;
         3)
             echo "기존 디렉토리 삭제 중..."
@@ -146,9 +146,10 @@ fi
 # MLX 변환 실행
 echo "MLX 변환 시작... (이 작업은 수 분이 소요될 수 있습니다)"
 
-python -m mlx_vlm.convert \
-    --hf-path "$INPUT_MODEL_PATH" \
-    --mlx-path "$OUTPUT_MODEL_PATH" || handle_error "모델 변환 실패"
+# 텐서 단위 스트리밍 변환 (모델 전체를 메모리에 올리지 않고, 중단되면 다시 실행해 이어서 변환)
+python "$SCRIPT_DIR/convert_model.py" \
+    --model_path "$INPUT_MODEL_PATH" \
+    --mlx_model_path "$OUTPUT_MODEL_PATH" || handle_error "모델 변환 실패 (다시 실행하면 이어서 변환합니다)"
 
 # 변환 결과 확인
 if [ -d "$OUTPUT_MODEL_PATH" ]; then
@@ -5,11 +5,18 @@ import time
 import argparse
 from pathlib import Path
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from convert_model import run_conversion, build_quantizer
+
 def main():
     parser = argparse.ArgumentParser(description="Qwen-2.5-VL 모델을 MLX 형식으로 변환")
     parser.add_argument("--input-dir", type=str, required=True, help="입력 모델 디렉토리")
     parser.add_argument("--output-dir", type=str, required=True, help="출력 MLX 모델 디렉토리")
-    parser.add_argument("--quantize", action="store_true", help="모델 양자화 여부")
+    parser.add_argument("--quantize", action="store_true", help="모델 양자화 여부 (비전 인코더는 원래 정밀도 유지)")
+    parser.add_argument("--q-bits", type=int, default=4, choices=[2, 4, 8], help="양자화 비트 수")
+    parser.add_argument("--q-group-size", type=int, default=64, help="양자화 그룹 크기")
     args = parser.parse_args()
     
     input_dir = args.input_dir
@@ -20,24 +27,12 @@ def main():
     print(f"출력 디렉토리: {output_dir}")
     print(f"양자화: {quantize}")
     
-    # 출력 디렉토리 준비
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # mlx_lm 모듈 임포트
+    # 스트리밍 변환 (중단된 경우 같은 명령으로 다시 실행하면 이어서 변환)
     try:
-        from mlx_lm.convert import convert as mlx_convert
-        
-        # 직접 모듈 함수 호출 (subprocess 없이)
-        mlx_convert(
-            hf_path=input_dir,
-            mlx_path=output_dir,
-            quantize=quantize,
-            model_key_or_path=None,
-            vocab_key_or_path=None,
-            repo_id=None,
-            access_token=None,
-        )
-        
+        quantizer = build_quantizer(args.q_bits, args.q_group_size) if quantize else None
+        if run_conversion(input_dir, output_dir, quantizer=quantizer) != 0:
+            return 1
+
         # 성공 여부 확인
         if os.path.exists(os.path.join(output_dir, "config.json")):
             print("변환 성공!")
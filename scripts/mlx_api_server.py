@@ -6,7 +6,9 @@ import sys
 import json
 import base64
 import logging
+import importlib.util
 from pathlib import Path
+from collections import OrderedDict
 from typing import List, Optional, Dict, Any, Union
 
 # 로깅 설정
@@ -20,24 +22,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 필요한 라이브러리 임포트 체크
+# 필요한 라이브러리 설치 여부 체크 (find_spec은 모듈을 실행하지 않으므로 아래에서 한 번만 임포트됨)
 required_libs = ["fastapi", "PIL", "uvicorn", "transformers"]
 missing_libs = []
 
 for lib in required_libs:
-    try:
-        __import__(lib)
-    except ImportError:
+    if importlib.util.find_spec(lib) is None:
         missing_libs.append(lib)
         logger.error(f"필수 라이브러리 {lib}가 설치되어 있지 않습니다.")
 
 # MLX 라이브러리 체크
-mlx_installed = True
-try:
-    import mlx.core
-    import mlx.nn
-except ImportError:
-    mlx_installed = False
+mlx_installed = importlib.util.find_spec("mlx") is not None
+if not mlx_installed:
     logger.error("MLX 라이브러리가 설치되어 있지 않습니다. 실행 전 MLX를 설치하세요.")
     logger.error("설치 명령어: pip install mlx")
     missing_libs.append("mlx")
@@ -87,11 +83,21 @@ if not available_model_list:
 DEFAULT_MODEL = available_model_list[0] if available_model_list else None
 CURRENT_MODEL = None
 MODEL_INSTANCE = None
+# 로드된 모델 인스턴스 (가장 최근에 사용한 모델이 마지막). 모델을 번갈아 요청해도 다시 로드하지 않음
+LOADED_MODELS = OrderedDict()
+MAX_RESIDENT_MODELS = max(int(os.environ.get("MAX_RESIDENT_MODELS", "2")), 1)
 
 # 서버 시작 시 모델 로드 (기본 모델 또는 첫 번째 사용 가능한 모델)
 def load_model(model_name):
     global CURRENT_MODEL, MODEL_INSTANCE
     
+    # 이미 메모리에 있는 모델이면 전환만 함
+    if model_name in LOADED_MODELS:
+        LOADED_MODELS.move_to_end(model_name)
+        MODEL_INSTANCE = LOADED_MODELS[model_name]
+        CURRENT_MODEL = model_name
+        return True
+    
     if model_name not in AVAILABLE_MODELS:
         raise ValueError(f"요청된 모델 '{model_name}'는 지원되지 않습니다. 지원되는 모델: {list(AVAILABLE_MODELS.keys())}")
     
@@ -101,6 +107,13 @@ def load_model(model_name):
         raise FileNotFoundError(f"모델 경로를 찾을 수 없습니다: {model_path}")
 
     try:
+        # 상주 모델 수 한도에 닿았으면 새 모델을 올리기 전에 가장 오래 사용하지 않은 모델을 내림
+        while len(LOADED_MODELS) >= MAX_RESIDENT_MODELS:
+            evicted, _ = LOADED_MODELS.popitem(last=False)
+            logger.info(f"모델 '{evicted}' 내림")
+            if evicted == CURRENT_MODEL:
+                CURRENT_MODEL, MODEL_INSTANCE = None, None
+        
         logger.info(f"모델 '{model_name}' 로드 중...")
         # MLX를 사용하여 모델 로드 (MLX 설치에만 사용 가능)
         from transformers import AutoProcessor, TextStreamer
@@ -114,6 +127,7 @@ def load_model(model_name):
             "processor": processor,
             "streamer": TextStreamer(processor.tokenizer)
         }
+        LOADED_MODELS[model_name] = MODEL_INSTANCE
         CURRENT_MODEL = model_name
         logger.info(f"모델 '{model_name}' 로드 완료")
         return True
@@ -257,6 +271,11 @@ async def chat_completions(request: ChatRequest):
         
         logger.info(f"생성된 텍스트 길이: {len(generated_text)}")
         
+        # 토큰 수는 문자 수가 아닌 토크나이저 기준 (프롬프트는 이미지 토큰 포함)
+        prompt_tokens = int(inputs["input_ids"].shape[-1])
+        completion_tokens = len(processor.tokenizer.encode(generated_text, add_special_tokens=False))
+        finish_reason = "length" if completion_tokens >= request.max_tokens else "stop"
+        
         # OpenAI API 호환 응답 형식
         response = {
             "id": f"chatcmpl-{hash(prompt)}",
@@ -270,13 +289,13 @@ async def chat_completions(request: ChatRequest):
                         "role": "assistant",
                         "content": generated_text
                     },
-                    "finish_reason": "stop"
+                    "finish_reason": finish_reason
                 }
             ],
             "usage": {
-                "prompt_tokens": len(prompt),
-                "completion_tokens": len(generated_text),
-                "total_tokens": len(prompt) + len(generated_text)
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
             }
         }
         
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import sys
 import os
-import shutil
-import subprocess
 from pathlib import Path
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from convert_model import run_conversion, build_quantizer
+
 def main():
     # 스크립트 경로를 기준으로 상대 경로 구성
     script_dir = Path(__file__).resolve().parent
@@ -19,40 +22,11 @@ def main():
     print(f"출력 디렉토리: {output_dir}")
     print(f"양자화: {quantize}")
     
-    # 출력 디렉토리가 존재하는지 확인
-    if os.path.exists(output_dir):
-        print(f"출력 디렉토리가 이미 존재합니다: {output_dir}")
-        # 확실하게 디렉토리 삭제
-        try:
-            shutil.rmtree(output_dir)
-            print(f"디렉토리 삭제 완료: {output_dir}")
-        except Exception as e:
-            print(f"디렉토리 삭제 실패: {e}")
-            # 권한 오류인 경우 sudo 시도
-            try:
-                subprocess.run(["sudo", "rm", "-rf", output_dir], check=True)
-                print("sudo로 디렉토리 삭제 완료")
-            except:
-                print("sudo로도 삭제 실패")
-                new_output_dir = f"{output_dir}_{os.getpid()}"
-                print(f"대체 디렉토리 사용: {new_output_dir}")
-                output_dir = new_output_dir
-                
-    # 출력 디렉토리 생성
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 변환 명령 구성
-    cmd = ["python", "-m", "mlx_lm", "convert", 
-           "--hf-path", input_dir, 
-           "--mlx-path", output_dir]
-           
-    if quantize:
-        cmd.append("--quantize")
-    
-    # 명령 실행
-    print(f"실행 명령: {' '.join(cmd)}")
-    subprocess.run(cmd, check=True)
-    
+    # 출력 디렉토리를 지우지 않음: 중단된 변환이 있으면 완료된 샤드는 건너뛰고 이어서 변환
+    # (설정이나 원본이 달라졌으면 이전 가중치 파일을 지우고 처음부터 변환)
+    if run_conversion(input_dir, output_dir, quantizer=build_quantizer() if quantize else None) != 0:
+        return 1
+
     # 성공 확인
     if os.path.exists(os.path.join(output_dir, "config.json")):
         print("변환 성공!")
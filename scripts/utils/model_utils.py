@@ -2,11 +2,37 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import logging
 import glob
+import importlib.util
 
 logger = logging.getLogger(__name__)
 
+def _load_model_index():
+    """
+    app/engine/model_index.py만 파일 경로로 로드합니다.
+
+    표준 라이브러리만 사용하는 모듈이므로, 저장소 루트가 sys.path에 없어도 (scripts/에서 실행)
+    동작하고 app.engine 패키지 __init__(스케줄러, 레지스트리 등)도 임포트하지 않습니다.
+    서버가 이미 임포트했다면 그 모듈을 그대로 사용합니다.
+    """
+    module = sys.modules.get("app.engine.model_index")
+    if module is not None:
+        return module
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "app", "engine", "model_index.py")
+    spec = importlib.util.spec_from_file_location("_qwen_model_index", os.path.normpath(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+_model_index = _load_model_index()
+ModelIndex = _model_index.ModelIndex
+has_weight_files = _model_index.has_weight_files
+
+# safetensors 헤더만 읽는 인덱스 (파일 수정 시각 기준 캐시라 반복 호출 시 다시 파싱하지 않음)
+MODEL_INDEX = ModelIndex()
+
 def get_available_models(models_dir):
     """
     지정된 디렉토리에서 사용 가능한 MLX 모델 목록을 찾습니다.
@@ -30,10 +56,8 @@ def get_available_models(models_dir):
     
     for mlx_dir in mlx_dirs:
         model_path = os.path.join(models_dir, mlx_dir)
-        # 모델 파일 확인 (tokenizer.json, model.safetensors 등이 있는지)
-        if (os.path.exists(os.path.join(model_path, "tokenizer.json")) and 
-            (os.path.exists(os.path.join(model_path, "model.safetensors")) or 
-             os.path.exists(os.path.join(model_path, "weights.safetensors")))):
+        # 모델 파일 확인 (tokenizer.json과 가중치: 단일 파일 또는 model-0000N-of-0000M 샤드)
+        if os.path.exists(os.path.join(model_path, "tokenizer.json")) and has_weight_files(model_path):
             model_dirs.append(model_path)
     
     return model_dirs
@@ -62,32 +86,12 @@ def check_model_compatibility(model_path):
     Returns:
         bool: 호환성 여부
     """
-    required_files = ["tokenizer.json", "config.json"]
-    model_files = ["model.safetensors", "weights.safetensors"]
-    
-    # 필수 파일 확인
-    for req_file in required_files:
-        if not os.path.exists(os.path.join(model_path, req_file)):
-            logger.warning(f"필수 파일이 없습니다: {req_file}")
-            return False
+    # 필수 파일, config.json, safetensors 헤더(자료형, 크기, 잘린 파일), 비전 가중치 확인
+    info = MODEL_INDEX.scan(model_path)
+    for error in info["errors"]:
+        logger.warning(f"모델 검증 실패 ({model_path}): {error}")
     
-    # 모델 파일 확인 (둘 중 하나는 있어야 함)
-    has_model_file = False
-    for model_file in model_files:
-        if os.path.exists(os.path.join(model_path, model_file)):
-            has_model_file = True
-            break
-    
-    if not has_model_file:
-        logger.warning(f"모델 가중치 파일이 없습니다: model.safetensors 또는 weights.safetensors")
-        return False
-    
-    # vision 모델인지 확인 (qwen-vl인 경우)
-    config_path = os.path.join(model_path, "config.json")
-    
-    # TODO: 모델 유형에 따른 추가 확인 로직 구현
-    
-    return True
+    return info["valid"]
 
 def get_model_metadata(model_path):
     """
@@ -99,24 +103,22 @@ def get_model_metadata(model_path):
     Returns:
         dict: 모델 메타데이터
     """
+    info = MODEL_INDEX.scan(model_path)
     metadata = {
         "id": get_model_name(model_path),
         "path": model_path,
         "created": None,
         "object": "model",
-        "owned_by": "user"
+        "owned_by": "user",
+        # 가중치 파일 크기 합계 (safetensors 헤더 인덱스 기준)
+        "size": info["total_bytes"],
+        "model_type": info["model_type"],
+        "parameters": info["parameters"],
+        "quantization": info["quantization"],
+        "dtypes": info["dtypes"],
+        "valid": info["valid"]
     }
     
-    # 모델 크기 계산
-    model_size = 0
-    for root, _, files in os.walk(model_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            if os.path.exists(file_path):
-                model_size += os.path.getsize(file_path)
-    
-    metadata["size"] = model_size
-    
     return metadata
 
 def format_openai_model_list(model_paths):
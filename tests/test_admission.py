@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from app.engine.admission import AdmissionController, AdmissionRejected
+
+def test_full_queue_is_rejected_with_429():
+    admission = AdmissionController(max_queue_depth=2, retry_after=3)
+    first = admission.acquire(10)
+    admission.acquire(10)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire(10)
+    assert excinfo.value.status_code == 429 and excinfo.value.retry_after == 3
+
+    # 배치에 들어간 요청은 대기열 자리를 비움
+    admission.mark_started(first.id)
+    admission.acquire(10)
+    assert admission.stats()["rejected"] == {429: 1, 503: 0}
+
+def test_token_budget_is_rejected_with_503():
+    admission = AdmissionController(max_inflight_tokens=100)
+    # 처리 중인 요청이 없으면 예산보다 큰 요청도 단독으로 승인
+    alone = admission.acquire(500)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire(1)
+    assert excinfo.value.status_code == 503
+    admission.release(alone)
+
+    admission.acquire(60)
+    with pytest.raises(AdmissionRejected):
+        admission.acquire(50)
+    admission.acquire(40)
+    assert admission.stats()["in_flight_tokens"] == 100
+
+def test_pixel_budget_is_reserved_before_decoding():
+    admission = AdmissionController(max_image_pixels=1000)
+    first = admission.acquire(1)
+    # 단독 요청은 상한 추정치가 예산을 넘어도 승인되고, 디코딩 후 실제 값으로 맞춰짐
+    admission.reserve_pixels(first, 4 * 1000)
+    admission.settle_pixels(first, 600)
+    assert admission.stats()["in_flight_image_pixels"] == 600
+
+    second = admission.acquire(1)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.reserve_pixels(second, 2 * 300)
+    assert excinfo.value.status_code == 503
+    admission.reserve_pixels(second, 400)
+
+    admission.release(second)
+    admission.release(first)
+    # 반환 후에는 이미 해제된 티켓을 맞춰도 예산이 바뀌지 않음
+    admission.settle_pixels(first, 999)
+    assert admission.stats()["in_flight_image_pixels"] == 0
+
+def test_retry_after_and_wait_stats_follow_queue_wait():
+    admission = AdmissionController(max_queue_depth=1, retry_after=2)
+    ticket = admission.acquire(1)
+    # 배치 합류까지 오래 기다린 요청
+    ticket.acquired_at = time.monotonic() - 49.5
+    admission.mark_started(ticket.id)
+
+    stats = admission.stats()
+    assert stats["queue_depth"] == 0 and stats["in_flight"] == 1
+    assert 49.5 <= stats["wait_seconds_avg"] < 50.5 and stats["wait_seconds_max"] == stats["wait_seconds_avg"]
+
+    admission.acquire(1)
+    with pytest.raises(AdmissionRejected) as excinfo:
+        admission.acquire(1)
+    # 최근 대기 시간의 지수 이동 평균 (0.2 x 49.5초)을 올림한 값
+    assert excinfo.value.retry_after == 10
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+import pytest
+
+from app.engine.conversion import STATE_FILE, StreamingConverter, convert_model
+from app.engine.model_index import ModelIndex, read_safetensors_header
+from app.engine.shard_loader import ShardedSafetensors
+from tests.test_model_index import write_safetensors
+
+# HF Qwen2.5-VL 이름의 원본 가중치 (자료형 변환 없이 그대로 옮겨지는 텐서만 사용)
+HF_TENSORS = {
+    "visual.blocks.0.attn.qkv.weight": ("F16", (48, 16)),
+    "model.embed_tokens.weight": ("F16", (64, 16)),
+    "model.layers.0.mlp.up_proj.weight": ("F16", (32, 16)),
+    "model.norm.weight": ("F32", (16,)),
+    "lm_head.weight": ("F16", (64, 16)),
+    "model.rotary_emb.inv_freq": ("F32", (8,)),
+}
+
+def make_hf_model(path):
+    path.mkdir()
+    (path / "config.json").write_text(json.dumps({"model_type": "qwen2_5_vl", "vision_config": {"depth": 1}}))
+    (path / "tokenizer.json").write_text("{}")
+    write_safetensors(path / "model.safetensors", HF_TENSORS)
+    return path
+
+def test_tensors_are_renamed_and_split_into_shards(tmp_path):
+    source = make_hf_model(tmp_path / "hf")
+    output = tmp_path / "out-mlx"
+    stats = convert_model(str(source), str(output), max_shard_bytes=2048, max_workers=2)
+    assert stats["shards"] > 1 and stats["skipped"] == 0
+
+    info = ModelIndex().scan(str(output))
+    assert info["valid"], info["errors"]
+    assert (output / "tokenizer.json").exists()
+    assert info["tensors"] == len(HF_TENSORS) - 1
+
+    with ShardedSafetensors(str(output)) as weights:
+        names = set(weights.names())
+        assert names == {
+            "vision_tower.blocks.0.attn.qkv.weight",
+            "language_model.model.embed_tokens.weight",
+            "language_model.model.layers.0.mlp.up_proj.weight",
+            "language_model.model.norm.weight",
+            "language_model.lm_head.weight",
+        }
+        # 데이터는 원본 텐서 이름 길이 값으로 채워져 있으므로 그대로 옮겨졌는지 확인
+        norm = weights.tensor("language_model.model.norm.weight")
+        assert set(norm.tobytes()) == {len("model.norm.weight")}
+        del norm
+
+    for name in os.listdir(output):
+        if name.endswith(".safetensors"):
+            _, metadata = read_safetensors_header(str(output / name))
+            assert metadata == {"format": "mlx"}
+
+def test_interrupted_conversion_resumes_from_completed_shards(tmp_path):
+    source = make_hf_model(tmp_path / "hf")
+    output = tmp_path / "out-mlx"
+    first = convert_model(str(source), str(output), max_shard_bytes=2048)
+    shards = sorted(name for name in os.listdir(output) if name.endswith(".safetensors"))
+
+    # 마지막 샤드를 쓰다가 중단된 상황
+    os.remove(output / shards[-1])
+    (output / (shards[-1] + ".partial")).write_bytes(b"\0" * 10)
+    second = StreamingConverter(str(source), str(output), max_shard_bytes=2048).run()
+    assert second["skipped"] == first["shards"] - 1
+    assert sorted(name for name in os.listdir(output) if name.endswith(".safetensors")) == shards
+    assert ModelIndex().scan(str(output))["valid"]
+
+    # 설정이 바뀌면 이전 변환이 쓴 샤드만 버리고 처음부터 변환
+    (output / "notes.safetensors").write_bytes(b"keep")
+    third = convert_model(str(source), str(output), max_shard_bytes=1 << 20)
+    assert third["shards"] == 1 and third["skipped"] == 0
+    assert sorted(name for name in os.listdir(output) if name.endswith(".safetensors")) == [
+        "model.safetensors", "notes.safetensors"
+    ]
+    with open(output / STATE_FILE, "r", encoding="utf-8") as f:
+        assert json.load(f)["complete"]
+
+def test_output_inside_source_is_rejected(tmp_path):
+    source = make_hf_model(tmp_path / "hf")
+    link = tmp_path / "link"
+    link.symlink_to(source)
+    # 같은 디렉토리, 하위 디렉토리, 심볼릭 링크를 거쳐 같은 위치를 가리키는 경우
+    for output in (source, source / "mlx", link, link / "mlx"):
+        with pytest.raises(ValueError):
+            StreamingConverter(str(source), str(output))
+    with pytest.raises(ValueError):
+        convert_model(str(source), str(link))
+    assert sorted(os.listdir(source)) == ["config.json", "model.safetensors", "tokenizer.json"]
+
+def test_unrecorded_output_directory_is_not_wiped(tmp_path):
+    source = make_hf_model(tmp_path / "hf")
+    # 다른 도구로 변환해 둔 모델 디렉토리 (변환 기록 없음)
+    output = tmp_path / "existing-mlx"
+    output.mkdir()
+    (output / "model.safetensors").write_bytes(b"weights")
+    with pytest.raises(FileExistsError):
+        convert_model(str(source), str(output))
+    assert os.listdir(output) == ["model.safetensors"]
+    assert (output / "model.safetensors").read_bytes() == b"weights"
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.utils.image_fetch import ImageFetcher, ImageFetchError
+
+BODY = b"\x89PNG fake image bytes" * 100
+ETAG = '"v1"'
+
+class _Handler(BaseHTTPRequestHandler):
+    """이미지 호스트 대역: 요청 수와 동시 요청 수를 기록"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get("If-None-Match")))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path == "/slow":
+                time.sleep(0.2)
+            if self.path in ("/image", "/slow") and self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = BODY * 10 if self.path == "/big" else BODY
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("ETag", ETAG)
+            if self.path != "/big":
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.active = 0
+    httpd.max_active = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def _url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+def test_conditional_request_reuses_disk_cache(server, tmp_path):
+    fetcher = ImageFetcher(cache_dir=str(tmp_path))
+    try:
+        assert asyncio.run(fetcher.fetch(_url(server, "/image"))) == BODY
+        assert asyncio.run(fetcher.fetch(_url(server, "/image"))) == BODY
+    finally:
+        fetcher.close()
+
+    # 두 번째 요청은 ETag로 조건부 요청하고 304 응답에 디스크 캐시 본문을 사용
+    assert server.requests == [("/image", None), ("/image", ETAG)]
+    assert fetcher.stats["downloads"] == 1
+    assert fetcher.stats["not_modified"] == 1
+
+def test_download_aborts_over_max_bytes(server, tmp_path):
+    fetcher = ImageFetcher(cache_dir=str(tmp_path), max_bytes=len(BODY) * 2)
+    try:
+        # Content-Length가 없어도 읽는 도중 한도를 넘으면 중단
+        with pytest.raises(ImageFetchError):
+            asyncio.run(fetcher.fetch(_url(server, "/big")))
+    finally:
+        fetcher.close()
+    assert not list(tmp_path.iterdir())
+
+def test_per_host_concurrency_limit(server):
+    fetcher = ImageFetcher(per_host_limit=2, max_workers=8)
+
+    async def fetch_all():
+        return await asyncio.gather(*(fetcher.fetch(_url(server, "/slow")) for _ in range(6)))
+
+    try:
+        results = asyncio.run(fetch_all())
+    finally:
+        fetcher.close()
+    assert results == [BODY] * 6
+    assert server.max_active <= 2
+
+def test_disk_cache_stays_within_budget(server, tmp_path):
+    fetcher = ImageFetcher(cache_dir=str(tmp_path), cache_max_bytes=len(BODY) * 3 + 300)
+
+    async def fetch(path):
+        await asyncio.sleep(0.01)
+        return await fetcher.fetch(_url(server, path))
+
+    try:
+        for path in ("/a0", "/a1", "/a2", "/a0", "/a3", "/a4"):
+            assert asyncio.run(fetch(path)) == BODY
+        cached = sum(path.stat().st_size for path in tmp_path.iterdir())
+        assert cached <= fetcher.cache_max_bytes
+        assert fetcher.stats["evictions"] == 2
+
+        # 최근에 다시 사용한 /a0은 남고 가장 오래 사용하지 않은 /a1, /a2가 지워짐
+        server.requests.clear()
+        asyncio.run(fetch("/a0"))
+        asyncio.run(fetch("/a1"))
+        assert server.requests == [("/a0", ETAG), ("/a1", None)]
+    finally:
+        fetcher.close()
+
+    # 다시 시작한 뒤 처음 저장할 때 이전 실행의 항목도 예산에 맞춰 정리
+    fetcher = ImageFetcher(cache_dir=str(tmp_path), cache_max_bytes=len(BODY) + 300)
+    try:
+        asyncio.run(fetch("/a5"))
+    finally:
+        fetcher.close()
+    assert len([path for path in tmp_path.iterdir() if path.suffix == ".bin"]) == 1
+
+def test_cache_directory_is_created_on_first_store(server, tmp_path):
+    cache_dir = tmp_path / "cache" / "images"
+    fetcher = ImageFetcher(cache_dir=str(cache_dir))
+    try:
+        assert not cache_dir.exists()
+        assert asyncio.run(fetcher.fetch(_url(server, "/lazy"))) == BODY
+        assert any(path.suffix == ".bin" for path in cache_dir.iterdir())
+    finally:
+        fetcher.close()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import base64
+import asyncio
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from app.utils.image_utils import load_images, create_empty_image
+
+def _data_url(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (10, 120, 200)).save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+class TrackingPool(ThreadPoolExecutor):
+    """동시에 실행 중인 디코딩 작업 수의 최댓값을 기록하는 스레드 풀"""
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def submit(self, fn, *args, **kwargs):
+        def run():
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            try:
+                # 디코딩이 겹칠 시간을 확보
+                time.sleep(0.05)
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.active -= 1
+        return super().submit(run)
+
+def test_images_decode_concurrently_in_input_order():
+    sizes = [(56, 28), (28, 84), (112, 56), (84, 84)]
+    pool = TrackingPool(max_workers=4)
+    try:
+        images = asyncio.run(load_images([_data_url(*size) for size in sizes], pool))
+    finally:
+        pool.shutdown()
+
+    assert [image.size for image in images] == sizes
+    assert pool.peak > 1
+
+def test_bad_image_does_not_block_the_others():
+    empty = create_empty_image()
+    urls = [_data_url(56, 28), "data:image/png;base64,bm90IGFuIGltYWdl", _data_url(28, 56)]
+    observed = []
+    pool = TrackingPool(max_workers=3)
+    try:
+        images = asyncio.run(asyncio.wait_for(load_images(urls, pool, observe=observed.append), timeout=5))
+    finally:
+        pool.shutdown()
+
+    assert len(images) == 3
+    assert images[0].size == (56, 28) and images[2].size == (28, 56)
+    # 디코딩에 실패한 이미지는 같은 자리에 빈 이미지로 채워짐
+    assert images[1].size == empty.size and images[1].getpixel((0, 0)) == empty.getpixel((0, 0))
+    assert len(observed) == 3
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from PIL import Image
+
+from app.utils.image_utils import smart_resize, preprocess_image, IMAGE_FACTOR
+
+def test_smart_resize_bounds_pixels_and_snaps_to_grid():
+    max_pixels = 1280 * IMAGE_FACTOR * IMAGE_FACTOR
+    height, width = smart_resize(3000, 4000, max_pixels=max_pixels)
+    assert height % IMAGE_FACTOR == 0 and width % IMAGE_FACTOR == 0
+    assert height * width <= max_pixels
+    # 비율 유지 (격자 단위 오차 이내)
+    assert abs(width / height - 4000 / 3000) < 0.05
+
+    # 너무 작은 이미지는 최소 픽셀 수까지 확대
+    height, width = smart_resize(10, 10, min_pixels=56 * 56)
+    assert (height, width) == (56, 56)
+
+def test_preprocess_applies_exif_orientation_and_rgb():
+    image = Image.new("RGBA", (400, 200))
+    image.getexif()[0x0112] = 6  # Orientation: 90도 회전
+
+    result = preprocess_image(image, max_pixels=100 * 100)
+    assert result.mode == "RGB"
+    # 회전 후 세로가 더 긴 이미지
+    assert result.height > result.width
+    assert result.width * result.height <= 100 * 100
+    assert result.width % IMAGE_FACTOR == 0 and result.height % IMAGE_FACTOR == 0
+
+def test_base64_jpeg_uses_draft_decode():
+    import base64
+    from io import BytesIO
+    from app.utils.image_utils import process_image_from_data_url
+
+    buffer = BytesIO()
+    Image.new("RGB", (2000, 1600), (10, 120, 200)).save(buffer, format="JPEG")
+    data_url = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+    image = process_image_from_data_url(data_url, max_pixels=200 * 200, min_pixels=28 * 28)
+    stats = image.info["decode_stats"]
+    assert stats["source_size"] == (2000, 1600)
+    assert image.width * image.height <= 200 * 200
+    # draft 디코딩으로 원본 해상도 픽셀 버퍼(약 9.6MB)를 만들지 않음
+    assert stats["peak_bytes"] < 2000 * 1600 * 3
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+from app.utils.metrics import MetricsRegistry
+
+def test_counter_and_histogram_across_threads():
+    registry = MetricsRegistry(prefix="test_")
+    requests = registry.counter("requests_total", "요청 수", ("status",))
+    latency = registry.histogram("latency_seconds", "지연 시간", buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(1000):
+            requests.labels(200).inc()
+            latency.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latency.observe(0.05)
+    latency.observe(5)
+
+    text = registry.render()
+    # 스레드별 배열에 나눠 기록해도 합계는 정확함
+    assert 'test_requests_total{status="200"} 4000' in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1"} 4001' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 4002' in text
+    assert "test_latency_seconds_count 4002" in text
+    assert "# TYPE test_latency_seconds histogram" in text
+
+def test_callback_metrics():
+    registry = MetricsRegistry()
+    registry.gauge_function("queue_depth", "대기열 길이", lambda: 3)
+    registry.gauge_function("hit_rate", "적중률", lambda: {("prefix",): 0.25}, ("cache",))
+    text = registry.render()
+    assert "queue_depth 3" in text
+    assert 'hit_rate{cache="prefix"} 0.25' in text
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import struct
+
+import pytest
+
+from app.engine.model_index import ModelIndex, SafetensorsError, read_safetensors_header
+from app.engine.shard_loader import ShardedSafetensors
+
+DTYPE_BYTES = {"F16": 2, "F32": 4, "U32": 4}
+
+def write_safetensors(path, tensors, truncate=0):
+    """{이름: (자료형, 모양)}으로 safetensors 파일 생성 (텐서마다 이름 길이 값으로 채움)"""
+    header = {"__metadata__": {"format": "mlx"}}
+    data = bytearray()
+    for name, (dtype, shape) in tensors.items():
+        numel = 1
+        for dim in shape:
+            numel *= dim
+        size = numel * DTYPE_BYTES[dtype]
+        header[name] = {"dtype": dtype, "shape": list(shape), "data_offsets": [len(data), len(data) + size]}
+        data += bytes([len(name)]) * size
+    raw = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(raw)) + raw + data[:len(data) - truncate])
+
+def make_model(path, tensors, config=None):
+    path.mkdir()
+    (path / "config.json").write_text(json.dumps(config or {"model_type": "qwen2_5_vl"}))
+    (path / "tokenizer.json").write_text("{}")
+    write_safetensors(path / "model.safetensors", tensors)
+    return path
+
+# 4비트, group_size 64로 양자화된 [128, 256] 선형 계층과 비전 인코더 가중치 하나
+QUANTIZED = {
+    "language_model.layers.0.mlp.weight": ("U32", (128, 32)),
+    "language_model.layers.0.mlp.scales": ("F16", (128, 4)),
+    "language_model.layers.0.mlp.biases": ("F16", (128, 4)),
+    "language_model.norm.weight": ("F16", (256,)),
+    "vision_tower.patch_embed.weight": ("F32", (16, 3)),
+}
+
+def test_header_is_parsed_without_reading_tensors(tmp_path):
+    write_safetensors(tmp_path / "w.safetensors", {"a": ("F32", (2, 3)), "b": ("F16", (4,))})
+    tensors, metadata = read_safetensors_header(str(tmp_path / "w.safetensors"))
+    assert metadata == {"format": "mlx"}
+    assert tensors["a"].shape == (2, 3) and tensors["a"].nbytes == 24
+    assert tensors["b"].dtype == "F16"
+
+def test_scan_reports_parameters_and_quantization(tmp_path):
+    model = make_model(tmp_path / "q-mlx", QUANTIZED)
+    info = ModelIndex().scan(str(model))
+    assert info["valid"], info["errors"]
+    assert info["quantization"] == {"bits": 4, "group_size": 64}
+    # 묶인 weight는 원래 원소 수로, scales/biases는 제외
+    assert info["parameters"] == 128 * 256 + 256 + 16 * 3
+    assert info["dtypes"] == {"U32": 1, "F16": 3, "F32": 1}
+    assert info["total_bytes"] == os.path.getsize(model / "model.safetensors")
+
+def test_scan_is_cached_until_files_change(tmp_path):
+    model = make_model(tmp_path / "q-mlx", QUANTIZED)
+    index = ModelIndex()
+    first = index.scan(str(model))
+    assert index.scan(str(model)) is first
+    assert index.parses == 1
+
+    write_safetensors(model / "model.safetensors", {"vision_tower.w": ("F32", (8,))})
+    os.utime(model / "model.safetensors", ns=(1, 1))
+    assert index.scan(str(model))["tensors"] == 1
+    assert index.parses == 2
+
+def test_broken_conversions_are_reported(tmp_path):
+    truncated = make_model(tmp_path / "t-mlx", QUANTIZED)
+    write_safetensors(truncated / "model.safetensors", QUANTIZED, truncate=10)
+    with pytest.raises(SafetensorsError):
+        read_safetensors_header(str(truncated / "model.safetensors"))
+
+    no_vision = make_model(tmp_path / "v-mlx", {"language_model.norm.weight": ("F16", (8,))},
+                           config={"model_type": "qwen2_5_vl", "vision_config": {"depth": 32}})
+
+    index = ModelIndex()
+    assert "잘렸습니다" in index.scan(str(truncated))["errors"][0]
+    assert not index.scan(str(no_vision))["valid"]
+    assert not index.scan(str(tmp_path / "missing-mlx"))["valid"]
+
+def make_sharded_model(path, shards):
+    path.mkdir()
+    (path / "config.json").write_text(json.dumps({"model_type": "qwen2_5_vl"}))
+    (path / "tokenizer.json").write_text("{}")
+    weight_map = {}
+    for i, tensors in enumerate(shards, 1):
+        name = f"model-{i:05d}-of-{len(shards):05d}.safetensors"
+        write_safetensors(path / name, tensors)
+        weight_map.update({tensor: name for tensor in tensors})
+    (path / "model.safetensors.index.json").write_text(json.dumps({"metadata": {}, "weight_map": weight_map}))
+    return path
+
+SHARDS = [
+    {"vision_tower.patch_embed.weight": ("F32", (16, 3)), "language_model.embed.weight": ("F16", (64, 8))},
+    {"language_model.norm.weight": ("F16", (256,))},
+]
+
+def test_sharded_models_are_indexed_and_validated(tmp_path):
+    model = make_sharded_model(tmp_path / "s-mlx", SHARDS)
+    index = ModelIndex()
+    info = index.scan(str(model))
+    assert info["valid"], info["errors"]
+    assert info["files"] == ["model-00001-of-00002.safetensors", "model-00002-of-00002.safetensors"]
+    assert info["parameters"] == 16 * 3 + 64 * 8 + 256
+
+    os.remove(model / "model-00002-of-00002.safetensors")
+    errors = index.scan(str(model))["errors"]
+    assert errors and "model-00002-of-00002.safetensors" in errors[0]
+
+def test_shards_load_in_parallel_with_zero_copy_tensors(tmp_path):
+    model = make_sharded_model(tmp_path / "s-mlx", SHARDS)
+    with ShardedSafetensors(str(model)) as weights:
+        timings = weights.load(max_workers=2)
+        assert [t["file"] for t in timings] == ["model-00001-of-00002.safetensors", "model-00002-of-00002.safetensors"]
+        assert all(t["bytes"] > 0 and t["seconds"] >= 0 for t in timings)
+
+        norm = weights.tensor("language_model.norm.weight")
+        assert isinstance(norm, memoryview) and norm.nbytes == 512
+        assert set(norm.tobytes()) == {len("language_model.norm.weight")}
+        assert sorted(weights.names()) == sorted(name for shard in SHARDS for name in shard)
+        del norm
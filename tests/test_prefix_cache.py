@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from app.engine.prefix_cache import PrefixCache
+
+def test_longest_prefix_match():
+    cache = PrefixCache(max_bytes=1000)
+    cache.insert([1, 2, 3, 4, 5], "turn1", 10)
+    cache.insert([1, 2, 7], "other", 10)
+
+    # 저장된 키보다 긴 프롬프트: 키 전체가 일치
+    assert cache.lookup([1, 2, 3, 4, 5, 6, 7]) == (5, "turn1")
+    # edge 중간에서 갈라지는 경우: 일치한 부분까지만 재사용
+    assert cache.lookup([1, 2, 3, 9]) == (3, "turn1")
+    assert cache.lookup([1, 2, 7, 8]) == (3, "other")
+    assert cache.lookup([4, 5]) == (0, None)
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+def test_lru_eviction_under_byte_budget():
+    cache = PrefixCache(max_bytes=100)
+    cache.insert([1, 1], "a", 40)
+    cache.insert([2, 2], "b", 40)
+    cache.lookup([1, 1, 3])
+    cache.insert([3, 3], "c", 40)
+
+    # 가장 오래 사용되지 않은 b가 제거됨
+    assert cache.lookup([2, 2]) == (0, None)
+    assert cache.lookup([1, 1]) == (2, "a")
+    assert cache.total_bytes == 80
+    assert cache.stats()["evictions"] == 1
+
+def test_replacing_same_key_keeps_tree_consistent():
+    cache = PrefixCache(max_bytes=100)
+    cache.insert([5, 6, 7], "old", 30)
+    cache.insert([5, 6, 7], "new", 50)
+
+    assert cache.lookup([5, 6, 7, 8]) == (3, "new")
+    assert len(cache) == 1 and cache.total_bytes == 50
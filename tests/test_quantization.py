@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from app.engine.conversion import REPORT_FILE, convert_model
+from app.engine.model_index import ModelIndex
+from app.engine.quantization import GroupQuantizer
+from tests.test_model_index import write_safetensors
+
+def test_policy_selects_layers_and_records_overrides():
+    quantizer = GroupQuantizer(bits=4, group_size=64, layers={r"mlp\.down_proj": 8, r"lm_head": None})
+
+    # 비전 인코더, 1차원 norm, 그룹 크기로 나누어떨어지지 않는 계층, 건너뛰기 규칙은 그대로
+    for name, shape in (("vision_tower.blocks.0.attn.qkv.weight", (48, 128)),
+                        ("language_model.model.norm.weight", (128,)),
+                        ("language_model.model.layers.0.mlp.gate_proj.weight", (32, 100)),
+                        ("language_model.lm_head.weight", (64, 128))):
+        assert quantizer.plan(name, "F16", shape) == [(name, "F16", shape)]
+
+    assert quantizer.plan("language_model.model.layers.0.mlp.up_proj.weight", "BF16", (32, 128)) == [
+        ("language_model.model.layers.0.mlp.up_proj.weight", "U32", (32, 16)),
+        ("language_model.model.layers.0.mlp.up_proj.scales", "BF16", (32, 2)),
+        ("language_model.model.layers.0.mlp.up_proj.biases", "BF16", (32, 2)),
+    ]
+    assert quantizer.plan("language_model.model.layers.0.mlp.down_proj.weight", "F16", (128, 64))[0][2] == (128, 16)
+    assert quantizer.config() == {
+        "group_size": 64, "bits": 4,
+        "language_model.model.layers.0.mlp.down_proj": {"group_size": 64, "bits": 8},
+    }
+
+    with pytest.raises(ValueError):
+        GroupQuantizer(bits=3)
+
+@pytest.mark.parametrize("bits", [4, 8])
+def test_packed_weights_dequantize_within_error_bound(bits):
+    np = pytest.importorskip("numpy")
+    from app.engine.quantization import dequantize_groups, unpack_bits
+
+    rng = np.random.default_rng(0)
+    w = rng.standard_normal((8, 256)).astype(np.float32)
+    quantizer = GroupQuantizer(bits=bits, group_size=64)
+    quantizer.plan("layers.0.weight", "F32", w.shape)
+    packed, scales, biases = quantizer.apply("layers.0.weight", w, "F32")
+
+    assert packed.dtype == np.uint32 and packed.shape == (8, 256 * bits // 32)
+    restored = dequantize_groups(unpack_bits(packed, bits), scales, biases, 64)
+    # 반올림 오차는 그룹 scale의 절반 이내
+    assert np.all(np.abs(restored - w) <= np.repeat(scales, 64, axis=1) / 2 + 1e-6)
+
+    report = quantizer.report()["layers.0.weight"]
+    assert report["bits"] == bits and report["max_abs_error"] == pytest.approx(float(np.abs(restored - w).max()))
+    assert 0 < report["relative_error"] < (0.15 if bits == 4 else 0.01)
+
+def test_quantized_conversion_is_indexed_with_report(tmp_path):
+    pytest.importorskip("numpy")
+    source = tmp_path / "hf"
+    source.mkdir()
+    (source / "config.json").write_text(json.dumps({"model_type": "qwen2_5_vl"}))
+    (source / "tokenizer.json").write_text("{}")
+    write_safetensors(source / "model.safetensors", {
+        "visual.blocks.0.mlp.fc1.weight": ("F16", (16, 64)),
+        "model.layers.0.mlp.up_proj.weight": ("F16", (32, 128)),
+        "model.norm.weight": ("F16", (128,)),
+    })
+
+    output = tmp_path / "out-mlx"
+    stats = convert_model(str(source), str(output), quantizer=GroupQuantizer(bits=4, group_size=64))
+    assert list(stats["report"]) == ["language_model.model.layers.0.mlp.up_proj.weight"]
+    assert json.loads((output / REPORT_FILE).read_text()) == stats["report"]
+
+    info = ModelIndex().scan(str(output))
+    assert info["valid"], info["errors"]
+    assert info["quantization"] == {"bits": 4, "group_size": 64}
+    assert info["parameters"] == 16 * 64 + 32 * 128 + 128
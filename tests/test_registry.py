@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import pytest
+
+from app.engine.registry import ModelRegistry, ModelUnavailable
+
+GiB = 1024 ** 3
+
+def _make_models(tmp_path, sizes):
+    """가중치 크기만 다른 가짜 모델 디렉토리 (희소 파일이라 디스크를 쓰지 않음)"""
+    models = {}
+    for name, size in sizes.items():
+        path = tmp_path / name
+        path.mkdir()
+        with open(path / "model.safetensors", "wb") as f:
+            f.truncate(size)
+        models[name] = str(path)
+    return models
+
+class FakeLoader:
+    def __init__(self, fail=()):
+        self.loaded = []
+        self.unloaded = []
+        self.fail = set(fail)
+
+    async def load(self, handle):
+        await asyncio.sleep(0)
+        if handle.model_id in self.fail:
+            raise RuntimeError("손상된 가중치")
+        handle.session = object()
+        self.loaded.append(handle.model_id)
+
+    def unload(self, handle):
+        self.unloaded.append(handle.model_id)
+
+def test_models_stay_resident_and_evict_lru(tmp_path):
+    models = _make_models(tmp_path, {"a-mlx": 2 * GiB, "b-mlx": 2 * GiB, "c-mlx": 2 * GiB})
+    loader = FakeLoader()
+    registry = ModelRegistry(lambda: models, loader.load, loader.unload, memory_budget=5 * GiB, default_model="a-mlx")
+
+    async def scenario():
+        for name in ("a-mlx", "b-mlx", "a-mlx", "B-MLX"):
+            registry.release(await registry.acquire(name))
+        # 두 모델을 번갈아 요청해도 다시 로드하지 않음
+        assert loader.loaded == ["a-mlx", "b-mlx"]
+
+        # 세 번째 모델은 가장 오래 사용하지 않은 a-mlx를 내려야 들어감
+        registry.release(await registry.acquire("c-mlx"))
+        assert loader.unloaded == ["a-mlx"]
+        assert set(registry.handles) == {"b-mlx", "c-mlx"}
+
+        # 알 수 없는 이름은 기본 모델로
+        handle = await registry.acquire("gpt-4")
+        assert handle.model_id == "a-mlx"
+        registry.release(handle)
+
+    asyncio.run(scenario())
+    assert registry.resident_bytes <= 5 * GiB
+
+def test_busy_models_are_not_evicted(tmp_path):
+    models = _make_models(tmp_path, {"a-mlx": 3 * GiB, "b-mlx": 3 * GiB})
+    loader = FakeLoader()
+    registry = ModelRegistry(lambda: models, loader.load, loader.unload, memory_budget=4 * GiB)
+
+    async def scenario():
+        handle = await registry.acquire("a-mlx")
+        with pytest.raises(ModelUnavailable) as excinfo:
+            await registry.acquire("b-mlx")
+        assert excinfo.value.status_code == 503
+        registry.release(handle)
+        registry.release(await registry.acquire("b-mlx"))
+
+    asyncio.run(scenario())
+    assert loader.unloaded == ["a-mlx"]
+
+def test_failed_load_is_reported_and_retried(tmp_path):
+    models = _make_models(tmp_path, {"a-mlx": GiB})
+    loader = FakeLoader(fail={"a-mlx"})
+    registry = ModelRegistry(lambda: models, loader.load, loader.unload)
+
+    async def scenario():
+        with pytest.raises(ModelUnavailable):
+            await registry.acquire("a-mlx")
+        assert registry.resident_bytes == 0
+        loader.fail.clear()
+        registry.release(await registry.acquire("a-mlx"))
+
+    asyncio.run(scenario())
+    assert loader.loaded == ["a-mlx"]
+
+def test_requests_park_until_model_is_ready(tmp_path):
+    models = _make_models(tmp_path, {"a-mlx": GiB})
+    gate = {}
+
+    async def slow_load(handle):
+        handle.report("weights", 0.5)
+        await gate["event"].wait()
+
+    registry = ModelRegistry(lambda: models, slow_load, max_wait=0.05, max_parked=2)
+
+    async def scenario():
+        gate["event"] = asyncio.Event()
+        handle = registry.preload()
+        await asyncio.sleep(0)
+        assert handle.state == "loading" and handle.phase == "weights"
+
+        # 대기 시간 초과
+        with pytest.raises(ModelUnavailable) as excinfo:
+            await registry.acquire("a-mlx")
+        assert excinfo.value.status_code == 503 and registry.park_timeouts == 1
+
+        # 로드가 끝나면 대기 중이던 요청이 모두 진행
+        registry.max_wait = None
+        waiters = [asyncio.ensure_future(registry.acquire("a-mlx")) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert handle.parked == 2
+        with pytest.raises(ModelUnavailable):
+            await waiters[2]
+        gate["event"].set()
+        handles = await asyncio.gather(*waiters[:2])
+        assert all(h is handle and h.state == "ready" for h in handles)
+        assert handle.parked == 0 and handle.active == 2
+
+    asyncio.run(scenario())
+
+def test_eviction_teardown_does_not_block_event_loop(tmp_path):
+    models = _make_models(tmp_path, {"a-mlx": 3 * GiB, "b-mlx": 3 * GiB})
+    loader = FakeLoader()
+    released = threading.Event()
+    unload_order = []
+
+    def slow_unload(handle):
+        # 워커 스레드 종료 대기처럼 오래 걸리는 해제 (이벤트 루프가 풀어 줄 때까지 대기)
+        unload_order.append(("unload", released.wait(timeout=5)))
+        loader.unload(handle)
+
+    async def load(handle):
+        unload_order.append(("load", handle.model_id))
+        await loader.load(handle)
+
+    registry = ModelRegistry(lambda: models, load, slow_unload, memory_budget=4 * GiB)
+
+    async def scenario():
+        registry.release(await registry.acquire("a-mlx"))
+        swap = asyncio.ensure_future(registry.acquire("b-mlx"))
+        # 해제가 진행되는 동안에도 다른 작업(스트리밍, 헬스 체크)이 실행됨
+        for _ in range(3):
+            await asyncio.sleep(0.01)
+        assert not swap.done() and registry.handles["b-mlx"].phase == "unloading"
+        released.set()
+        registry.release(await swap)
+
+    asyncio.run(scenario())
+    # 이전 모델의 해제가 끝난 뒤에 새 모델을 로드
+    assert unload_order == [("load", "a-mlx"), ("unload", True), ("load", "b-mlx")]
+    assert loader.unloaded == ["a-mlx"] and loader.loaded == ["a-mlx", "b-mlx"]
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+from types import SimpleNamespace
+
+from app.engine.backend import GenerationRequest, TokenOutput
+from app.engine.executor import InferenceExecutor
+from app.engine.scheduler import BatchScheduler, Sequence, merge_usage
+
+class FakeBackend:
+    """mlx_vlm 대신 사용하는 결정적 백엔드: 프롬프트의 각 글자를 토큰 하나로 돌려줌"""
+
+    def __init__(self):
+        self.decode_batches = []
+        self.released = []
+
+    def prefill(self, request):
+        state = {"request": request, "pos": 0}
+        return state, self._next(state)
+
+    def decode(self, states):
+        self.decode_batches.append([state["request"].request_id for state in states])
+        return [self._next(state) for state in states]
+
+    def release(self, state):
+        self.released.append(state["request"].request_id)
+
+    def _next(self, state):
+        prompt = state["request"].prompt
+        if state["pos"] >= len(prompt):
+            return None
+        char = prompt[state["pos"]]
+        state["pos"] += 1
+        return TokenOutput(ord(char), char)
+
+def _run(scheduler):
+    while scheduler.has_work():
+        scheduler.step()
+
+def test_sequences_join_and_leave_at_token_boundaries():
+    backend = FakeBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=4)
+    short = Sequence(GenerationRequest("ab", request_id="short"))
+    long = Sequence(GenerationRequest("abcdef", request_id="long"))
+    scheduler.add(long)
+    scheduler.step()
+    scheduler.add(short)
+    _run(scheduler)
+
+    assert long.text == "abcdef" and long.finish_reason == "stop"
+    assert short.text == "ab" and short.finish_reason == "stop"
+    # 나중에 들어온 시퀀스는 다음 토큰 경계에서 합류하고, 끝나면 배치에서 빠짐
+    assert backend.decode_batches[0] == ["long"]
+    assert backend.decode_batches[1] == ["long", "short"]
+    assert backend.decode_batches[-1] == ["long"]
+    assert sorted(backend.released) == ["long", "short"]
+
+def test_max_tokens_and_batch_size_limit():
+    backend = FakeBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=2)
+    seqs = [Sequence(GenerationRequest("xyz" * 3, max_tokens=4, request_id=f"s{i}")) for i in range(3)]
+    for seq in seqs:
+        scheduler.add(seq)
+    _run(scheduler)
+
+    assert all(seq.text == "xyzx" and seq.finish_reason == "length" for seq in seqs)
+    assert max(len(batch) for batch in backend.decode_batches) == 2
+    assert seqs[2].latency()["queue_wait"] >= seqs[0].latency()["queue_wait"]
+    assert seqs[0].latency()["completion_tokens"] == 4
+
+def test_executor_streams_through_scheduler():
+    executor = InferenceExecutor(max_queue_size=8)
+    executor.attach_scheduler(BatchScheduler(FakeBackend(), max_batch_size=4))
+
+    async def main():
+        seqs = [executor.generate(GenerationRequest(f"hello {i}")) for i in range(3)]
+        return await asyncio.gather(*(seq.wait() for seq in seqs))
+
+    try:
+        assert asyncio.run(main()) == ["hello 0", "hello 1", "hello 2"]
+    finally:
+        executor.shutdown(timeout=5)
+
+class _CountedState(dict):
+    """토큰 사용량 속성을 가진 시퀀스 상태"""
+
+class CountingBackend(FakeBackend):
+    def prefill(self, request):
+        state = _CountedState(request=request, pos=0)
+        state.prompt_tokens, state.image_tokens, state.cached_tokens = 10, 4, 6
+        return state, self._next(state)
+
+def test_usage_and_length_finish_reason():
+    scheduler = BatchScheduler(CountingBackend())
+    seq = Sequence(GenerationRequest("abcdef", max_tokens=3, request_id="usage"))
+    scheduler.add(seq)
+    _run(scheduler)
+
+    assert seq.finish_reason == "length"
+    usage = seq.usage()
+    assert usage["prompt_tokens"] == 10 and usage["completion_tokens"] == 3
+    assert usage["total_tokens"] == 13
+    assert usage["prompt_tokens_details"] == {"cached_tokens": 6, "image_tokens": 4}
+    assert usage["prefill_tokens"] == 4 and usage["decode_tokens"] == 2
+
+class ForkingBackend(CountingBackend):
+    """프리필 횟수를 세고, 상태를 복제할 수 있는 백엔드"""
+
+    def __init__(self):
+        super().__init__()
+        self.prefills = 0
+
+    def prefill(self, request):
+        self.prefills += 1
+        return super().prefill(request)
+
+    def fork(self, state):
+        forked = _CountedState(request=state["request"], pos=0)
+        forked.prompt_tokens, forked.image_tokens, forked.cached_tokens = 10, 4, 10
+        return forked, self._next(forked)
+
+def test_parallel_sampling_shares_prefill():
+    for backend, prefills in ((ForkingBackend(), 1), (CountingBackend(), None)):
+        scheduler = BatchScheduler(backend, max_batch_size=3)
+        blocker = Sequence(GenerationRequest("abcd", request_id="blocker"))
+        seq = Sequence(GenerationRequest("abc", n=3, request_id="multi"))
+        seq.forks = [Sequence(seq.request, index=i) for i in (1, 2)]
+        scheduler.add(blocker)
+        scheduler.step()
+        scheduler.add(seq)
+        scheduler.step()
+        # 배치에 자리가 n개 생길 때까지 함께 기다렸다가 합류
+        assert scheduler.running == [blocker] and list(scheduler.waiting) == [seq]
+        while not blocker.done:
+            scheduler.step()
+        scheduler.step()
+        assert scheduler.running == [seq] + seq.forks
+        _run(scheduler)
+
+        assert [s.text for s in [seq] + seq.forks] == ["abc"] * 3
+        assert [s.id for s in seq.forks] == ["multi.1", "multi.2"]
+        if prefills is not None:
+            assert backend.prefills == 1 + prefills
+        usage = merge_usage([seq] + seq.forks)
+        assert usage["prompt_tokens"] == 10 and usage["completion_tokens"] == 9
+        assert usage["total_tokens"] == 19 and usage["decode_tokens"] == 6
+
+def test_cancelled_sequences_stop_at_next_token():
+    backend = FakeBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=1)
+    running = Sequence(GenerationRequest("abcdefgh", request_id="running"))
+    queued = Sequence(GenerationRequest("xyz", request_id="queued"))
+    scheduler.add(running)
+    scheduler.add(queued)
+    scheduler.step()
+    scheduler.step()
+
+    running.cancel()
+    queued.cancel()
+    scheduler.step()
+    assert not scheduler.has_work()
+    assert running.finish_reason == "cancelled" and running.text == "abc"
+    # 대기 중에 취소된 시퀀스는 프리필하지 않음
+    assert queued.finish_reason == "cancelled" and queued.tokens == []
+    assert backend.released == ["running"]
+
+def test_null_sampling_params_use_defaults():
+    chat = SimpleNamespace(max_tokens=None, temperature=None, top_p=None, n=None, stop=None)
+    request = GenerationRequest.from_chat_request(chat, "abc", request_id="nulls")
+    assert (request.max_tokens, request.temperature, request.top_p) == (800, 0.7, 0.95)
+
+    # temperature 0(탐욕적 디코딩)은 기본값으로 바뀌지 않음
+    chat.temperature = 0.0
+    assert GenerationRequest.from_chat_request(chat, "abc").temperature == 0.0
+
+    backend = FakeBackend()
+    scheduler = BatchScheduler(backend)
+    seq = Sequence(request)
+    scheduler.add(seq)
+    _run(scheduler)
+    assert seq.text == "abc" and seq.finish_reason == "stop"
+
+def test_accept_error_finishes_only_that_sequence():
+    backend = FakeBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=4)
+    # 검증을 거치지 않은 잘못된 요청 (비교에서 TypeError 발생)
+    broken = Sequence(GenerationRequest("abcdef", max_tokens=None, request_id="broken"))
+    healthy = Sequence(GenerationRequest("hello", request_id="healthy"))
+    scheduler.add(broken)
+    scheduler.add(healthy)
+    _run(scheduler)
+
+    assert broken.finish_reason == "error" and isinstance(broken.error, TypeError)
+    # 같은 배치의 다른 시퀀스는 계속 진행되고, 오류 시퀀스의 상태도 해제됨
+    assert healthy.text == "hello" and healthy.finish_reason == "stop"
+    assert sorted(backend.released) == ["broken", "healthy"]
+    assert not scheduler.running
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+from app.engine.session import ModelSession, format_chatml
+
+class FakeTokenizer:
+    """특수 토큰 몇 개만 아는 토크나이저 (문자 하나 = 토큰 하나)"""
+
+    eos_token_id = 2
+    unk_token_id = 0
+    chat_template = None
+    special = {"<|im_end|>": 151645, "<|endoftext|>": 151643}
+
+    def __init__(self):
+        self.encode_calls = 0
+
+    def convert_tokens_to_ids(self, token):
+        return self.special.get(token, self.unk_token_id)
+
+    def encode(self, text, add_special_tokens=True):
+        self.encode_calls += 1
+        return [ord(c) for c in text]
+
+CONVERSATION = [
+    {"role": "user", "content": [{"type": "image"}, {"type": "text", "text": "설명해 주세요"}]}
+]
+
+def test_session_precomputes_config_and_stop_tokens(tmp_path):
+    (tmp_path / "config.json").write_text(json.dumps({"model_type": "qwen2_5_vl", "eos_token_id": 151645}))
+    tokenizer = FakeTokenizer()
+    session = ModelSession("test-mlx", str(tmp_path), None, tokenizer)
+
+    assert session.config["model_type"] == "qwen2_5_vl"
+    assert session.stop_token_ids == {2, 151645, 151643}
+
+    # 요청 경로는 설정 파일이나 토크나이저를 다시 사용하지 않음
+    (tmp_path / "config.json").unlink()
+    calls = tokenizer.encode_calls
+    prompt = session.format_conversation(CONVERSATION)
+    assert tokenizer.encode_calls == calls
+    assert prompt == format_chatml(CONVERSATION)
+
+def test_chatml_format():
+    prompt = format_chatml(CONVERSATION)
+    assert prompt == (
+        "<|im_start|>system\nYou are a helpful assistant.<|im_end|>\n"
+        "<|im_start|>user\n<|vision_start|><|image_pad|><|vision_end|>설명해 주세요<|im_end|>\n"
+        "<|im_start|>assistant\n"
+    )
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from app.engine.backend import GenerationRequest, TokenOutput
+from app.engine.scheduler import BatchScheduler, Sequence
+from app.engine.speculative import AdaptiveDraftLength, PromptLookupProposer, SpeculationStats, accept_greedy
+
+class ChunkedBackend:
+    """디코딩 한 번에 여러 토큰을 확정하는 백엔드 (추측 디코딩 흉내): 프롬프트를 3글자씩 돌려줌"""
+
+    def __init__(self):
+        self.released = []
+
+    def prefill(self, request):
+        state = {"request": request, "pos": 1}
+        return state, TokenOutput(ord(request.prompt[0]), request.prompt[0])
+
+    def decode(self, states):
+        outputs = []
+        for state in states:
+            prompt = state["request"].prompt
+            chunk = [TokenOutput(ord(c), c) for c in prompt[state["pos"]:state["pos"] + 3]]
+            state["pos"] += 3
+            if state["pos"] >= len(prompt):
+                chunk.append(None)
+            outputs.append(chunk)
+        return outputs
+
+    def release(self, state):
+        self.released.append(state["request"].request_id)
+
+def test_greedy_acceptance_and_adaptive_length():
+    assert accept_greedy([5, 6, 7], [5, 6, 9, 1]) == 2
+    assert accept_greedy([5, 6, 7], [5, 6, 7, 8]) == 3
+    assert accept_greedy([5], [4, 5]) == 0
+
+    length = AdaptiveDraftLength(k=4, max_k=5)
+    assert length.update(4, 4) == 5
+    assert length.update(5, 5) == 5
+    assert length.update(5, 3) == 5
+    assert length.update(5, 1) == 4
+    for _ in range(10):
+        length.update(length.k, 0)
+    assert length.k == 1
+
+    fixed = AdaptiveDraftLength(k=3, adaptive=False)
+    assert fixed.update(3, 0) == 3
+
+def test_speculation_stats():
+    stats = SpeculationStats()
+    stats.record("draft", 4, 4, 5, 0.1)
+    stats.record("draft", 4, 0, 1, 0.1)
+    assert stats.stats()["draft"]["speedup"] is None
+    stats.record_plain(0.05)
+    draft = stats.stats()["draft"]
+    assert draft["rounds"] == 2 and draft["drafted_tokens"] == 8 and draft["accepted_tokens"] == 4
+    assert draft["acceptance_rate"] == 0.5 and draft["tokens_per_round"] == 3.0
+    # 0.2초에 6토큰 (토큰 하나씩이면 0.05초에 1토큰)
+    assert abs(draft["speedup"] - 1.5) < 1e-9
+
+def test_prompt_lookup_proposer():
+    # 이미지 자리 표시 토큰(99)은 색인하지 않음
+    lookup = PromptLookupProposer([99, 99, 1, 2, 3, 4, 5, 9, 1, 2], max_ngram=2, num_tokens=3, ignore=(99,))
+    assert lookup.propose(10) == [3, 4, 5]
+    assert lookup.propose(2) == [3, 4]
+    lookup.extend([7])
+    assert lookup.propose(5) == []
+    # 가장 긴 n-gram부터, 가장 최근 위치를 사용
+    lookup.extend([1, 2, 8, 2])
+    assert lookup.propose(3) == [8, 2]
+
+    # 채택률이 떨어지면 cooldown 동안 제안하지 않고 다시 시도
+    lookup = PromptLookupProposer([1, 2, 3, 1, 2], min_acceptance=0.5, cooldown=2)
+    lookup.update(3, 3)
+    lookup.update(3, 0)
+    assert lookup.propose(3) == [3, 1, 2]
+    lookup.update(3, 0)
+    assert lookup.propose(3) == [] and lookup.propose(3) == []
+    assert lookup.propose(3) == [3, 1, 2]
+
+def test_scheduler_accepts_multiple_tokens_per_step():
+    backend = ChunkedBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=4)
+    full = Sequence(GenerationRequest("abcdefg", request_id="full"))
+    capped = Sequence(GenerationRequest("abcdefg", max_tokens=5, request_id="capped"))
+    scheduler.add(full)
+    scheduler.add(capped)
+    while scheduler.has_work():
+        scheduler.step()
+
+    assert full.text == "abcdefg" and full.finish_reason == "stop"
+    # 한 단계에서 확정된 토큰이 max_tokens를 넘으면 나머지는 버림
+    assert capped.text == "abcde" and capped.finish_reason == "length"
+    assert sorted(backend.released) == ["capped", "full"]
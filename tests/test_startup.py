@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+from app.engine.startup import StartupProfiler
+
+def test_profiler_groups_imports_and_phases():
+    profiler = StartupProfiler()
+    sys.modules.pop("colorsys", None)
+    module = profiler.import_module("colorsys")
+    assert module is sys.modules["colorsys"]
+    # 이미 임포트된 모듈은 다시 기록하지 않음
+    profiler.import_module("colorsys")
+
+    with profiler.phase("weights"):
+        pass
+    with profiler.phase("weights"):
+        pass
+
+    report = profiler.report()
+    assert list(report["imports"]) == ["colorsys"]
+    assert list(report["phases"]) == ["weights"]
+    assert report["uptime_seconds"] >= report["phases"]["weights"] >= 0
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from app.engine.backend import GenerationRequest
+from app.engine.scheduler import BatchScheduler, Sequence
+from app.engine.stop_sequences import StopSequenceMatcher
+from tests.test_scheduler import FakeBackend
+
+def _feed(matcher, pieces):
+    return [matcher.feed(piece) for piece in pieces]
+
+def test_matcher_holds_back_only_ambiguous_suffix():
+    matcher = StopSequenceMatcher(["</answer>", "\n\n"])
+    assert _feed(matcher, ["정답: 42", "</ans", "wer> 뒤"]) == ["정답: 42", "", ""]
+    assert matcher.matched == "</answer>"
+
+    # 중단 문자열의 앞부분처럼 보였지만 아니면 보류했던 텍스트를 내보냄
+    matcher = StopSequenceMatcher(["</answer>"])
+    assert _feed(matcher, ["a</an", "d b<", "/"]) == ["a", "</and b", ""]
+    assert matcher.matched is None and matcher.flush() == "</"
+
+    # 여러 토큰에 걸친 중단 문자열과 실패 링크로 찾는 겹친 패턴
+    matcher = StopSequenceMatcher(["abcd", "bc"])
+    assert _feed(matcher, ["xa", "b", "c"]) == ["x", "", "a"]
+    assert matcher.matched == "bc"
+
+    # 같은 위치에서 끝나면 더 긴 중단 문자열 기준으로 자름
+    matcher = StopSequenceMatcher(["END", "D"])
+    assert _feed(matcher, ["fiEN", "D!"]) == ["fi", ""]
+    assert matcher.matched == "END"
+
+def test_scheduler_stops_at_stop_sequence():
+    backend = FakeBackend()
+    scheduler = BatchScheduler(backend)
+    stopped = Sequence(GenerationRequest("hello, world", stop=", w", request_id="stopped"))
+    plain = Sequence(GenerationRequest("hello, wor", stop=["wow", "ld"], request_id="plain"))
+    scheduler.add(stopped)
+    scheduler.add(plain)
+    while scheduler.has_work():
+        scheduler.step()
+
+    assert stopped.text == "hello" and stopped.finish_reason == "stop"
+    # 중단 문자열 직후에 생성이 끝남 (남은 글자는 디코딩하지 않음)
+    assert len(stopped.tokens) == len("hello, w")
+    # 끝까지 중단 문자열이 없으면 보류했던 끝부분도 응답에 포함
+    assert plain.text == "hello, wor" and plain.finish_reason == "stop"
+    assert sorted(backend.released) == ["plain", "stopped"]
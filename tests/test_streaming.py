@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app.engine.streaming import AsyncChannel
+
+def _produce(channel, items, delay=0.0, error=None):
+    """워커 스레드에서 항목을 넣고 정상 종료 또는 예외로 채널을 닫음"""
+    def run():
+        for item in items:
+            channel.put(item)
+            if delay:
+                time.sleep(delay)
+        if error is not None:
+            channel.fail(error)
+        else:
+            channel.close()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+async def _collect(channel, max_batch=64):
+    return [batch async for batch in channel.batches(max_batch)]
+
+def test_items_queued_while_consumer_is_busy_are_batched():
+    async def main():
+        channel = AsyncChannel()
+        # 소비자가 읽기 전에 생산자가 모두 넣고 닫음 (클라이언트가 뒤처진 상황)
+        _produce(channel, list(range(10))).join()
+        await asyncio.sleep(0)
+        return await _collect(channel, max_batch=4)
+
+    assert asyncio.run(main()) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+def test_live_stream_keeps_order_and_ends():
+    async def main():
+        channel = AsyncChannel()
+        thread = _produce(channel, [f"tok{i}" for i in range(50)], delay=0.001)
+        batches = await _collect(channel)
+        thread.join()
+        return batches
+
+    batches = asyncio.run(main())
+    assert [item for batch in batches for item in batch] == [f"tok{i}" for i in range(50)]
+    assert all(batches)
+
+def test_producer_error_is_raised_after_delivered_items():
+    async def main():
+        channel = AsyncChannel()
+        _produce(channel, ["a", "b"], error=ValueError("decode failed")).join()
+        await asyncio.sleep(0)
+        received = []
+        with pytest.raises(ValueError, match="decode failed"):
+            async for batch in channel.batches():
+                received.extend(batch)
+        return received, channel.cancelled
+
+    received, cancelled = asyncio.run(main())
+    assert received == ["a", "b"]
+    # 소비자가 끝나면 생산자가 멈출 수 있도록 표시됨
+    assert cancelled